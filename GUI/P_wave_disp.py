@@ -1,10 +1,12 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
-import matplotlib.animation as animation
+from precompute import damping_mask, ricker_source
+from medium import as_medium, value_at, values_at
+from telemetry import telemetry_for
+from stability import StabilityMonitor, SimulationUnstable
+from nonuniform_grid import DepthAxis
 
 class PWaveDisplacement:
-    def __init__(self, NX, NY, XMIN, XMAX, YMIN, YMAX, t_max, VEL_P, RHO, name, source_x, source_y):
+    def __init__(self, NX, NY, XMIN, XMAX, YMIN, YMAX, t_max, VEL_P, RHO, name, source_x, source_y, dtype=np.float64, reducers=None, y_nodes=None, source=None):
         self.name = name
         self.NX = NX
         self.NY = NY
@@ -13,82 +15,123 @@ class PWaveDisplacement:
         self.PLOT_EVERY = 5
 
         self.DX = (XMAX - XMIN) / NX
-        self.DY = (YMAX - YMIN) / NY 
+        # y_nodes: depths of a stretched grid (nonuniform_grid.py), DY is then its smallest spacing
+        self.depth = DepthAxis(YMIN, YMAX, NY, y_nodes, dtype)
+        self.DY = self.depth.DY
         self.DT = 0.001
         time = np.arange(0, t_max, self.DT)
         self.NT = len(time)
-        self.VEL = VEL_P
-        self.RHO = RHO
+        self.VEL = as_medium(VEL_P, NX, NY)
+        self.RHO = as_medium(RHO, NX, NY)
         self.source_x = source_x
         self.source_y = source_y
 
-        self.K = np.ones((NX, NY)) * 5e9  # Higher K → faster P-wave
-        self.ux = np.zeros((NX, NY))
-        self.uy = np.zeros((NX, NY))
-        self.ux_prev = np.zeros((NX, NY))
-        self.uy_prev = np.zeros((NX, NY))
+        self.K = 5e9  # Higher K → faster P-wave
+        # per-step coefficient, a (1, NY) profile for laterally homogeneous media
+        self.coef = ((self.DT**2 / self.RHO) * self.K).astype(dtype, copy=False)
+        # a sources.py SourceArray replaces the point source at (source_x, source_y)
+        self.source = None
+        if source is not None:
+            source.check_grid(NX, NY)
+            self.source = source.scaled(self.DT**2 / values_at(self.RHO, source.xs, source.ys), dtype)
+        self.ux = np.zeros((NX, NY), dtype)
+        self.uy = np.zeros((NX, NY), dtype)
+        self.ux_prev = np.zeros((NX, NY), dtype)
+        self.uy_prev = np.zeros((NX, NY), dtype)
 
         ABL_WIDTH = 20 #grid point on simulation area's edge for absorbing
-        self.damping = np.ones((NX, NY)) 
-        self.damping[:ABL_WIDTH, :] = np.linspace(0.9, 1.0, ABL_WIDTH)[:, np.newaxis]
-        self.damping[-ABL_WIDTH:, :] = np.linspace(1.0, 0.9, ABL_WIDTH)[:, np.newaxis]
-
-        # preserve the strongest self.damping when overlapping in left and right edge
-        self.damping[:, :ABL_WIDTH] = np.minimum(self.damping[:, :ABL_WIDTH], np.linspace(0.9, 1.0, ABL_WIDTH))
-        self.damping[:, -ABL_WIDTH:] = np.minimum(self.damping[:, -ABL_WIDTH:], np.linspace(1.0, 0.9, ABL_WIDTH))
-
+        self.damping = damping_mask(NX, NY, ABL_WIDTH, dtype)  # shared, read-only
+        self.telemetry = telemetry_for(name + " P-wave displacement", NX * NY)
+        self.monitor = StabilityMonitor(self, ("ux", "uy"))  # aborts runs that blow up
+        self.reducers = list(reducers or [])  # diagnostics.py, updated after every step
+        for reducer in self.reducers:
+            reducer.start(self)
 
     def ricker_wavelet(self, t, f0=20.0):
         return (1.0 - 2.0*(np.pi*f0*t)**2) * np.exp(-(np.pi*f0*t)**2)
     
-    def run_wavelet_eq(self):
-        source_times = np.arange(self.NT) * self.DT # Time values
-        self.source_amp = self.ricker_wavelet(source_times - 0.1, f0=20.0) * 1e6  
+    def run_wavelet_eq(self, f0=20.0):
+        # Ricker source sampled at every time step, shared between runs with the same NT and f0
+        self.source_amp = ricker_source(self.NT, self.DT, f0)
 
     def update_p_wave_only(self,n):
-        if n < len(self.source_amp):
-            self.ux[self.source_x, self.source_y] += self.source_amp[n] * self.DT**2 / self.RHO[self.source_x, self.source_y]
+        self.telemetry.begin()
+        if self.source is not None:
+            self.source.inject(self.ux, n)
+        elif n < len(self.source_amp):
+            self.ux[self.source_x, self.source_y] += self.source_amp[n] * self.DT**2 / value_at(self.RHO, self.source_x, self.source_y)
+        self.telemetry.lap("source")
 
         # ∇·u
-        div_u = np.zeros((self.NX, self.NY))
+        div_u = np.zeros_like(self.ux)
         div_u[1:-1, 1:-1] = (
             (self.ux[2:, 1:-1] - self.ux[:-2, 1:-1]) / (2 * self.DX) + (
-            (self.uy[1:-1, 2:] - self.uy[1:-1, :-2]) / (2 * self.DY)
+            self.depth.d1(self.uy[1:-1])
         ))
 
         # ∇(∇·u)
-        grad_div_x = np.zeros((self.NX, self.NY))
-        grad_div_y = np.zeros((self.NX, self.NY))
+        grad_div_x = np.zeros_like(self.ux)
+        grad_div_y = np.zeros_like(self.ux)
         grad_div_x[1:-1, 1:-1] = (div_u[2:, 1:-1] - div_u[:-2, 1:-1]) / (2 * self.DX)
-        grad_div_y[1:-1, 1:-1] = (div_u[1:-1, 2:] - div_u[1:-1, :-2]) / (2 * self.DY)
+        grad_div_y[1:-1, 1:-1] = self.depth.d1(div_u[1:-1])
 
         ux_new = (
-            2 * self.ux - self.ux_prev + (self.DT**2 / self.RHO) * self.K * grad_div_x
+            2 * self.ux - self.ux_prev + self.coef * grad_div_x
         )
         uy_new = (
-            2 * self.uy - self.uy_prev + (self.DT**2 / self.RHO) * self.K * grad_div_y
+            2 * self.uy - self.uy_prev + self.coef * grad_div_y
         )
+        self.telemetry.lap("stencil")
 
         # Apply damping
         ux_new *= self.damping
         uy_new *= self.damping
+        self.telemetry.lap("damping")
 
         # Update fields
         self.ux_prev = self.ux.copy()
         self.uy_prev = self.uy.copy()
         self.ux = ux_new.copy()
         self.uy = uy_new.copy()
+        self.telemetry.lap("copy")
+        self.monitor.check(self, n)
+        if self.reducers:
+            for reducer in self.reducers:
+                reducer.update(self, n)
+            self.telemetry.lap("diagnostics")
+        self.telemetry.step()
+
+    def run(self, steps=None):
+        """Advance the simulation without plotting, all NT steps by default"""
+        try:
+            for n in range(self.NT if steps is None else steps):
+                self.update_p_wave_only(n)
+        except SimulationUnstable:
+            self.release()
+            raise
+        finally:
+            self.telemetry.finish()
+
+    def release(self):
+        """Drop the field arrays, after an aborted run"""
+        self.ux = self.uy = self.ux_prev = self.uy_prev = None
     
     def update(self, frame):
         for _ in range(self.PLOT_EVERY):
             self.update_p_wave_only(frame * self.PLOT_EVERY + _)
         
-        self.img.set_array(np.sqrt(self.ux**2 + self.uy**2))
+        self.telemetry.begin()
+        self.img.set_array(self.depth.display(np.sqrt(self.ux**2 + self.uy**2)))
+        self.telemetry.lap("artists")
         return [self.img]
 
     def create_figure(self):
+        import matplotlib.pyplot as plt  # only needed for rendering
+        from matplotlib.animation import FuncAnimation
+        import matplotlib.animation as animation
+
         fig, ax = plt.subplots(figsize=(10, 8))
-        self.img = ax.imshow(np.sqrt(self.ux**2 + self.uy**2).T, cmap='seismic', vmin=-1e-5, vmax=1e-5)
+        self.img = ax.imshow(self.depth.display(np.sqrt(self.ux**2 + self.uy**2)).T, cmap='seismic', vmin=-1e-5, vmax=1e-5)
 
         plt.colorbar(self.img, label='Displacement (m)')
         ax.set_title("P Wave Displacement Simulation")
@@ -97,8 +140,15 @@ class PWaveDisplacement:
 
         # Create animation
         ani = FuncAnimation(fig, self.update, frames=self.NT // self.PLOT_EVERY, interval=50, blit=True)
-        ffmpeg_writer = animation.FFMpegWriter(fps=20)
-        ani.save(self.name+'_test_disp_wave1.mp4', writer=ffmpeg_writer)
+        ffmpeg_writer = self.telemetry.writer(animation.FFMpegWriter(fps=20))
+        try:
+            ani.save(self.name+'_test_disp_wave1.mp4', writer=ffmpeg_writer)
+        except SimulationUnstable:
+            plt.close(fig)
+            self.release()
+            raise
+        finally:
+            self.telemetry.finish()
 
 
 
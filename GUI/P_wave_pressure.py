@@ -1,10 +1,12 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
-import matplotlib.animation as animation
+from precompute import damping_mask, ricker_source
+from medium import as_medium, interior
+from telemetry import telemetry_for
+from stability import StabilityMonitor, SimulationUnstable
+from nonuniform_grid import DepthAxis
 
 class PWavePressure():
-    def __init__(self, NX, NY, XMIN, XMAX, YMIN, YMAX, t_max, VEL_P, RHO, name, source_x, source_y):
+    def __init__(self, NX, NY, XMIN, XMAX, YMIN, YMAX, t_max, VEL_P, RHO, name, source_x, source_y, dtype=np.float64, reducers=None, y_nodes=None, source=None):
         self.name = name
         self.NX = NX
         self.NY = NY
@@ -15,40 +17,54 @@ class PWavePressure():
         self.PLOT_EVERY = 5
 
         self.DX = (XMAX - XMIN) / NX
-        self.DY = (YMAX - YMIN) / NY
+        # y_nodes: depths of a stretched grid (nonuniform_grid.py), DY is then its smallest spacing
+        self.depth = DepthAxis(YMIN, YMAX, NY, y_nodes, dtype)
+        self.DY = self.depth.DY
         self.DT = 0.001
         time = np.arange(0, t_max, self.DT)
         self.NT = len(time)
-        self.VEL = VEL_P
-        self.RHO = RHO
+        self.VEL = as_medium(VEL_P, NX, NY)
+        self.RHO = as_medium(RHO, NX, NY)
         self.source_x = source_x
         self.source_y = source_y
 
-        self.phi = np.zeros((NX, NY))  # Pressure field (current)
-        self.psi = np.zeros((NX, NY))  # Pressure field (previous)
-        self.vx = np.zeros((NX, NY))  # x-component of particle velocity
-        self.vy = np.zeros((NX, NY))  # y-component of particle velocity
+        # per-step coefficient of the interior points, a (1, NY-2) profile for laterally homogeneous media
+        self.coef = (interior(self.VEL)**2 * self.DT**2 / self.DX**2).astype(dtype, copy=False)
+        if y_nodes is not None:
+            self.coef_y = (interior(self.VEL)**2 * self.DT**2).astype(dtype, copy=False)  # times d2/dy2
+        # a sources.py SourceArray replaces the point source at (source_x, source_y)
+        self.source = None
+        if source is not None:
+            source.check_grid(NX, NY)
+            self.source = source.scaled(1, dtype)
 
-        ABL_WIDTH = 20 #grid point on simulation area's edge for absorbing
-        self.damping = np.ones((NX, NY)) 
-        self.damping[:ABL_WIDTH, :] = np.linspace(0.9, 1.0, ABL_WIDTH)[:, np.newaxis]
-        self.damping[-ABL_WIDTH:, :] = np.linspace(1.0, 0.9, ABL_WIDTH)[:, np.newaxis]
-
-        # preserve the strongest self.damping when overlapping in left and right edge
-        self.damping[:, :ABL_WIDTH] = np.minimum(self.damping[:, :ABL_WIDTH], np.linspace(0.9, 1.0, ABL_WIDTH))
-        self.damping[:, -ABL_WIDTH:] = np.minimum(self.damping[:, -ABL_WIDTH:], np.linspace(1.0, 0.9, ABL_WIDTH))
+        self.phi = np.zeros((NX, NY), dtype)  # Pressure field (current)
+        self.psi = np.zeros((NX, NY), dtype)  # Pressure field (previous)
+        self.vx = np.zeros((NX, NY), dtype)  # x-component of particle velocity
+        self.vy = np.zeros((NX, NY), dtype)  # y-component of particle velocity
 
+        ABL_WIDTH = 20 #grid point on simulation area's edge for absorbing
+        self.damping = damping_mask(NX, NY, ABL_WIDTH, dtype)  # shared, read-only
+        self.telemetry = telemetry_for(name + " P-wave pressure", NX * NY)
+        self.monitor = StabilityMonitor(self, ("phi",))  # aborts runs that blow up
+        self.reducers = list(reducers or [])  # diagnostics.py, updated after every step
+        for reducer in self.reducers:
+            reducer.start(self)
 
     def ricker_wavelet(self, t, f0=20.0):
         return (1.0 - 2.0*(np.pi*f0*t)**2) * np.exp(-(np.pi*f0*t)**2)
     
-    def run_wavelet_eq(self):
-        source_times = np.arange(self.NT) * self.DT # Time values
-        self.source_amp = self.ricker_wavelet(source_times - 0.1, f0=20.0) * 1e6  
+    def run_wavelet_eq(self, f0=20.0):
+        # Ricker source sampled at every time step, shared between runs with the same NT and f0
+        self.source_amp = ricker_source(self.NT, self.DT, f0)
 
     def update_wave(self,n):
-        if n < len(self.source_amp):
+        self.telemetry.begin()
+        if self.source is not None:
+            self.source.inject(self.phi, n)
+        elif n < len(self.source_amp):
             self.phi[self.source_x, self.source_y] += self.source_amp[n]
+        self.telemetry.lap("source")
         
         # Update particle velocities (vx, vy)
         # vx[1:-1, 1:-1] -= (DT/RHO[1:-1, 1:-1]) * (phi[2:, 1:-1] - phi[:-2, 1:-1]) / (2*DX)
@@ -56,39 +72,83 @@ class PWavePressure():
         
         # Update pressure field based on the final p_{i,j}^{n+1} formula
         phi_new = self.phi.copy()
-        phi_new[1:-1, 1:-1] = (
-            2*self.phi[1:-1, 1:-1] - self.psi[1:-1, 1:-1] +
-            (self.VEL[1:-1, 1:-1]**2 * self.DT**2 / self.DX**2) * (
-                
-                self.phi[2:, 1:-1] + self.phi[:-2, 1:-1] +
-                self.phi[1:-1, 2:] + self.phi[1:-1, :-2] -
-                4*self.phi[1:-1, 1:-1]
+        if self.depth.nodes is not None:
+            # stretched depth spacing, the y part of the Laplacian has its own stencil
+            phi_new[1:-1, 1:-1] = (
+                2*self.phi[1:-1, 1:-1] - self.psi[1:-1, 1:-1] +
+                self.coef * (self.phi[2:, 1:-1] + self.phi[:-2, 1:-1] - 2*self.phi[1:-1, 1:-1]) +
+                self.coef_y * self.depth.d2(self.phi[1:-1])
+            )
+        else:
+            phi_new[1:-1, 1:-1] = (
+                2*self.phi[1:-1, 1:-1] - self.psi[1:-1, 1:-1] +
+                self.coef * (
+                    self.phi[2:, 1:-1] + self.phi[:-2, 1:-1] +
+                    self.phi[1:-1, 2:] + self.phi[1:-1, :-2] -
+                    4*self.phi[1:-1, 1:-1]
+                )
             )
-        )
+        self.telemetry.lap("stencil")
         # apply damping
         phi_new *= self.damping
+        self.telemetry.lap("damping")
 
         # Update fields
         self.psi = self.phi.copy()
         self.phi = phi_new.copy()
+        self.telemetry.lap("copy")
+        self.monitor.check(self, n)
+        if self.reducers:
+            for reducer in self.reducers:
+                reducer.update(self, n)
+            self.telemetry.lap("diagnostics")
+        self.telemetry.step()
+
+    def run(self, steps=None):
+        """Advance the simulation without plotting, all NT steps by default"""
+        try:
+            for n in range(self.NT if steps is None else steps):
+                self.update_wave(n)
+        except SimulationUnstable:
+            self.release()
+            raise
+        finally:
+            self.telemetry.finish()
+
+    def release(self):
+        """Drop the field arrays, after an aborted run"""
+        self.phi = self.psi = self.vx = self.vy = None
     
     def update(self,frame):
         """Update function for animation"""
         for _ in range(self.PLOT_EVERY):
             self.update_wave(frame * self.PLOT_EVERY + _)
         
-        self.img.set_array(self.phi.T)
+        self.telemetry.begin()
+        self.img.set_array(self.depth.display(self.phi).T)
+        self.telemetry.lap("artists")
         return [self.img]
 
     def create_figure(self):
+        import matplotlib.pyplot as plt  # only needed for rendering
+        from matplotlib.animation import FuncAnimation
+        import matplotlib.animation as animation
+
         fig, ax = plt.subplots(figsize=(10, 8))
-        self.img = ax.imshow(self.phi.T, extent=[self.XMIN, self.XMAX, self.YMAX, self.YMIN], cmap='seismic', vmin=-1e4, vmax=1e4)
+        self.img = ax.imshow(self.depth.display(self.phi).T, extent=[self.XMIN, self.XMAX, self.YMAX, self.YMIN], cmap='seismic', vmin=-1e4, vmax=1e4)
         plt.colorbar(self.img, label='Pressure (Pa)')
         ax.set_title("2D Seismic Wave Propagation")
         ax.set_xlabel("Distance (m)")
         ax.set_ylabel("Depth (m)")
 
         ani = FuncAnimation(fig, self.update, frames=self.NT//self.PLOT_EVERY, interval=50, blit=True)
-        ffmpeg_writer = animation.FFMpegWriter(fps=20)
-        ani.save(self.name+'_test_p_wave1.mp4', writer=ffmpeg_writer)
+        ffmpeg_writer = self.telemetry.writer(animation.FFMpegWriter(fps=20))
+        try:
+            ani.save(self.name+'_test_p_wave1.mp4', writer=ffmpeg_writer)
+        except SimulationUnstable:
+            plt.close(fig)
+            self.release()
+            raise
+        finally:
+            self.telemetry.finish()
 
@@ -1,12 +1,13 @@
 import numpy as np
 import math
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
-import matplotlib.animation as animation
-from scipy.ndimage import gaussian_filter
+from precompute import damping_mask, ricker_source
+from medium import as_medium, interior, block, value_at, values_at
+from telemetry import telemetry_for
+from stability import StabilityMonitor, SimulationUnstable
+from nonuniform_grid import DepthAxis
 
 class SWave():
-    def __init__(self, NX, NY, XMIN, XMAX, YMIN, YMAX, t_max, VEL_S, RHO, name, source_x, source_y):
+    def __init__(self, NX, NY, XMIN, XMAX, YMIN, YMAX, t_max, VEL_S, RHO, name, source_x, source_y, dtype=np.float64, reducers=None, y_nodes=None, DT=0.001, source=None):
         self.name = name
         self.NX = NX
         self.NY = NY
@@ -17,40 +18,55 @@ class SWave():
         self.PLOT_EVERY = 5
 
         self.DX = (XMAX - XMIN) / NX
-        self.DY = (YMAX - YMIN) / NY
-        self.DT = 0.001
+        # y_nodes: depths of a stretched grid (nonuniform_grid.py), DY is then its smallest spacing
+        self.depth = DepthAxis(YMIN, YMAX, NY, y_nodes, dtype)
+        self.DY = self.depth.DY
+        self.DT = DT
         time = np.arange(0, t_max, self.DT)
         self.NT = len(time)
-        self.VS = VEL_S
-        self.RHO = RHO
-        self.MU = self.RHO * self.VS**2  # Shear modulus
+        self.VS = as_medium(VEL_S, NX, NY)
+        self.RHO = as_medium(RHO, NX, NY)
+        self.MU = (self.RHO * self.VS**2).astype(dtype, copy=False)  # Shear modulus
         self.source_x = source_x
         self.source_y = source_y
 
-        self.ux = np.zeros((NX, NY))
-        self.uy = np.zeros((NX, NY))
-        self.ux_prev = np.zeros((NX, NY))
-        self.uy_prev = np.zeros((NX, NY)) 
-        self.tau_xy = np.zeros((NX, NY)) # shear stress
+        # per-step coefficient of the interior points, a (1, NY-2) profile for laterally homogeneous media
+        self.coef = (self.DT**2 / interior(self.RHO)).astype(dtype, copy=False)
+        # a sources.py SourceArray replaces the point source at (source_x, source_y)
+        self.source = None
+        if source is not None:
+            source.check_grid(NX, NY)
+            self.source = source.scaled(self.DT**2 / values_at(self.RHO, source.xs, source.ys), dtype)
+
+        self.ux = np.zeros((NX, NY), dtype)
+        self.uy = np.zeros((NX, NY), dtype)
+        self.ux_prev = np.zeros((NX, NY), dtype)
+        self.uy_prev = np.zeros((NX, NY), dtype) 
+        self.tau_xy = np.zeros((NX, NY), dtype) # shear stress
 
         ABL_WIDTH = 20 #grid point on simulation area's edge for absorbing
-        self.damping = np.ones((NX, NY)) 
-        self.damping[:ABL_WIDTH, :] = np.linspace(0.9, 1.0, ABL_WIDTH)[:, np.newaxis]
-        self.damping[-ABL_WIDTH:, :] = np.linspace(1.0, 0.9, ABL_WIDTH)[:, np.newaxis]
-        self.damping[:, :ABL_WIDTH] = np.minimum(self.damping[:, :ABL_WIDTH], np.linspace(0.9, 1.0, ABL_WIDTH))
-        self.damping[:, -ABL_WIDTH:] = np.minimum(self.damping[:, -ABL_WIDTH:], np.linspace(1.0, 0.9, ABL_WIDTH))
+        self.damping = damping_mask(NX, NY, ABL_WIDTH, dtype)  # shared, read-only
+        self.telemetry = telemetry_for(name + " S-wave", NX * NY)
+        self.monitor = StabilityMonitor(self, ("ux", "uy"))  # aborts runs that blow up
+        self.reducers = list(reducers or [])  # diagnostics.py, updated after every step
+        for reducer in self.reducers:
+            reducer.start(self)
 
     def ricker_wavelet(self,t, f0=15.0):
         return (1.0 - 2.0*(np.pi*f0*t)**2) * np.exp(-(np.pi*f0*t)**2)
     
-    def run_wavelet_eq(self):
-        source_times = np.arange(self.NT) * self.DT # Time values
-        self.source_amp = self.ricker_wavelet(source_times - 0.1, f0=15.0) * 1e6  
+    def run_wavelet_eq(self, f0=15.0):
+        # Ricker source sampled at every time step, shared between runs with the same NT and f0
+        self.source_amp = ricker_source(self.NT, self.DT, f0)
 
     def update_wave(self,n):        
         # Add source (vertical force)
-        if n < len(self.source_amp):
-            self.uy[self.source_x, self.source_y] += self.source_amp[n] * self.DT**2 / self.RHO[self.source_x, self.source_y]
+        self.telemetry.begin()
+        if self.source is not None:
+            self.source.inject(self.uy, n)
+        elif n < len(self.source_amp):
+            self.uy[self.source_x, self.source_y] += self.source_amp[n] * self.DT**2 / value_at(self.RHO, self.source_x, self.source_y)
+        self.telemetry.lap("source")
         
         # Calculate spatial derivatives
         dux_dx = np.zeros_like(self.ux)
@@ -60,9 +76,9 @@ class SWave():
         
         # Central differences for derivatives
         dux_dx[1:-1, 1:-1] = (self.ux[2:, 1:-1] - self.ux[:-2, 1:-1]) / (2*self.DX)
-        dux_dy[1:-1, 1:-1] = (self.ux[1:-1, 2:] - self.ux[1:-1, :-2]) / (2*self.DY)
+        dux_dy[1:-1, 1:-1] = self.depth.d1(self.ux[1:-1])
         duy_dx[1:-1, 1:-1] = (self.uy[2:, 1:-1] - self.uy[:-2, 1:-1]) / (2*self.DX)
-        duy_dy[1:-1, 1:-1] = (self.uy[1:-1, 2:] - self.uy[1:-1, :-2]) / (2*self.DY)
+        duy_dy[1:-1, 1:-1] = self.depth.d1(self.uy[1:-1])
         
         tau_xy_now = self.MU * (duy_dx + dux_dy)
         self.tau_xy[:, :] = tau_xy_now
@@ -73,46 +89,81 @@ class SWave():
         # x-component
         ux_new[1:-1, 1:-1] = (
             2*self.ux[1:-1, 1:-1] - self.ux_prev[1:-1, 1:-1] +
-            (self.DT**2 / self.RHO[1:-1, 1:-1]) * (
-                (tau_xy_now[1:-1, 2:] - tau_xy_now[1:-1, :-2]) / (2*self.DY)  # ∂τ_xy/∂y
+            self.coef * (
+                self.depth.d1(tau_xy_now[1:-1])  # ∂τ_xy/∂y
             )
         )
         
         # y-component
         uy_new[1:-1, 1:-1] = (
             2*self.uy[1:-1, 1:-1] - self.uy_prev[1:-1, 1:-1] +
-            (self.DT**2 / self.RHO[1:-1, 1:-1]) * (
+            self.coef * (
                 (tau_xy_now[2:, 1:-1] - tau_xy_now[:-2, 1:-1]) / (2*self.DX)  # ∂τ_xy/∂x
             )
         )
+        self.telemetry.lap("stencil")
         
         ux_new *= self.damping
         uy_new *= self.damping
+        self.telemetry.lap("damping")
         
         self.ux_prev = self.ux.copy()
         self.uy_prev = self.uy.copy()
         self.ux = ux_new.copy()
         self.uy = uy_new.copy()
+        self.telemetry.lap("copy")
+        self.monitor.check(self, n)
+        if self.reducers:
+            for reducer in self.reducers:
+                reducer.update(self, n)
+            self.telemetry.lap("diagnostics")
+        self.telemetry.step()
+
+    def run(self, steps=None):
+        """Advance the simulation without plotting, all NT steps by default"""
+        try:
+            for n in range(self.NT if steps is None else steps):
+                self.update_wave(n)
+        except SimulationUnstable:
+            self.release()
+            raise
+        finally:
+            self.telemetry.finish()
+
+    def release(self):
+        """Drop the field arrays, after an aborted run"""
+        self.ux = self.uy = self.ux_prev = self.uy_prev = self.tau_xy = None
 
     def create_figure_displacement(self):
+        import matplotlib.pyplot as plt  # only needed for rendering
+        from matplotlib.animation import FuncAnimation
+        import matplotlib.animation as animation
+
         fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 6))
 
-        self.img1 = ax1.imshow(self.ux.T, extent=[self.XMIN, self.XMAX, self.YMAX, self.YMIN], cmap='seismic', vmin=-1e-6, vmax=1e-6)
+        self.img1 = ax1.imshow(self.depth.display(self.ux).T, extent=[self.XMIN, self.XMAX, self.YMAX, self.YMIN], cmap='seismic', vmin=-1e-6, vmax=1e-6)
         plt.colorbar(self.img1, ax=ax1, label='Horizontal Displacement (m)')
         ax1.set_title("Horizontal Displacement (SH-Wave)")
         ax1.set_xlabel("Distance (m)")
         ax1.set_ylabel("Depth (m)")
 
         # Vertical displacement plot
-        self.img2 = ax2.imshow(self.uy.T, extent=[self.XMIN, self.XMAX, self.YMAX, self.YMIN], cmap='seismic', vmin=-1e-6, vmax=1e-6)
+        self.img2 = ax2.imshow(self.depth.display(self.uy).T, extent=[self.XMIN, self.XMAX, self.YMAX, self.YMIN], cmap='seismic', vmin=-1e-6, vmax=1e-6)
         plt.colorbar(self.img2, ax=ax2, label='Vertical Displacement (m)')
         ax2.set_title("Vertical Displacement (SV-Wave)")
         ax2.set_xlabel("Distance (m)")
         ax2.set_ylabel("Depth (m)")
 
         ani = FuncAnimation(fig, self.update, frames=self.NT//self.PLOT_EVERY, interval=50, blit=True)
-        ffmpeg_writer = animation.FFMpegWriter(fps=20)
-        ani.save(self.name+'_test_s_wave1.mp4', writer=ffmpeg_writer)
+        ffmpeg_writer = self.telemetry.writer(animation.FFMpegWriter(fps=20))
+        try:
+            ani.save(self.name+'_test_s_wave1.mp4', writer=ffmpeg_writer)
+        except SimulationUnstable:
+            plt.close(fig)
+            self.release()
+            raise
+        finally:
+            self.telemetry.finish()
 
 
     def update(self,frame):
@@ -120,21 +171,27 @@ class SWave():
         for _ in range(self.PLOT_EVERY):
             self.update_wave(frame * self.PLOT_EVERY + _)
         
+        self.telemetry.begin()
         current_max = max(np.max(np.abs(self.ux)), np.max(np.abs(self.uy)))
         vlimit = current_max if current_max > 0 else 1e-6
         
-        self.img1.set_array(self.ux.T)
+        self.img1.set_array(self.depth.display(self.ux).T)
         self.img1.set_clim(vmin=-vlimit, vmax=vlimit)
         
-        self.img2.set_array(self.uy.T)
+        self.img2.set_array(self.depth.display(self.uy).T)
         self.img2.set_clim(vmin=-vlimit, vmax=vlimit)
+        self.telemetry.lap("artists")
         
         return [self.img1, self.img2]
 
 
     def create_figure_stress(self):
+        import matplotlib.pyplot as plt  # only needed for rendering
+        from matplotlib.animation import FuncAnimation
+        import matplotlib.animation as animation
+
         fig, ax = plt.subplots(figsize=(10, 8))
-        self.img = ax.imshow(self.tau_xy.T, extent=[self.XMIN, self.XMAX, self.YMAX, self.YMIN], 
+        self.img = ax.imshow(self.depth.display(self.tau_xy).T, extent=[self.XMIN, self.XMAX, self.YMAX, self.YMIN], 
                         cmap='seismic', vmin=-1e4, vmax=1e4)
 
         plt.colorbar(self.img, label='Shear Stress (Pa)', pad=0.01)
@@ -144,26 +201,36 @@ class SWave():
         ax.grid(False)
 
         ani_stress = FuncAnimation(fig, self.update_stress, frames=self.NT//self.PLOT_EVERY, interval=50, blit=True)
-        ffmpeg_writer = animation.FFMpegWriter(fps=20)
-        ani_stress.save(self.name+'_test_s_wave_stress_2.mp4', writer=ffmpeg_writer)
+        ffmpeg_writer = self.telemetry.writer(animation.FFMpegWriter(fps=20))
+        try:
+            ani_stress.save(self.name+'_test_s_wave_stress_2.mp4', writer=ffmpeg_writer)
+        except SimulationUnstable:
+            plt.close(fig)
+            self.release()
+            raise
+        finally:
+            self.telemetry.finish()
 
     def update_stress(self,frame):
         for _ in range(self.PLOT_EVERY):
             self.update_wave(frame * self.PLOT_EVERY + _)
+        from scipy.ndimage import gaussian_filter  # only the stress video smooths
+        self.telemetry.begin()
         tau_smoothed = gaussian_filter(self.tau_xy, sigma=1.0)
-        self.img.set_array(tau_smoothed.T)
+        self.telemetry.lap("smoothing")
+        self.img.set_array(self.depth.display(tau_smoothed).T)
         self.img.set_clim(-np.max(np.abs(tau_smoothed)), np.max(np.abs(tau_smoothed)))  # Auto-scale
+        self.telemetry.lap("artists")
         return [self.img]
     
-    def get_seismic_moment(self):
+    def get_seismic_moment(self, rupture_radius=5):
         # Rupture zone (ex: 10x10)
-        rupture_radius = 5
         x_start, x_end = self.source_x - rupture_radius, self.source_x + rupture_radius
         y_start, y_end = self.source_y - rupture_radius, self.source_y + rupture_radius
 
         ux_rupture = self.ux[x_start:x_end, y_start:y_end] #x displacement in rupture zone
         uy_rupture = self.uy[x_start:x_end, y_start:y_end] #y displacement in rupture zone
-        mu_rupture = self.MU[x_start:x_end, y_start:y_end] #mu in rupture zone
+        mu_rupture = block(self.MU, x_start, x_end, y_start, y_end) #mu in rupture zone
 
         # total movement/displacement per point
         u_magnitude = np.sqrt(ux_rupture**2 + uy_rupture**2)
@@ -0,0 +1,155 @@
+"""
+Headless S-wave runs for every event of a catalog query. Run from the GUI folder, e.g.:
+    python batch_run.py "2024-01-01" "2024-02-01" --min-magnitude 6 --workers 4 --out results.csv
+Each event gets a real-data model (CRUST1.0 + IASP91), an S-wave simulation and its
+seismic moment, moment magnitude and energy. Results are appended to the CSV as the
+runs finish.
+"""
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+from catalog_fetch import fetch_dataframe
+from catalog_store import CatalogStore
+from realdata_process import RealDataBatch
+from result_cache import ResultCache, hash_inputs
+from S_wave import SWave
+
+RESULT_COLUMNS = ["id", "time", "latitude", "longitude", "depth", "observed_magnitude",
+                  "M0", "simulated_Mw", "energy", "runtime_s", "status"]
+
+
+def limit_memory(max_bytes):
+    """Process pool initializer: cap the address space of the worker (Unix only)"""
+    if not max_bytes:
+        return
+    try:
+        import resource
+    except ImportError:
+        print("Memory limit not supported on this platform, running without it")
+        return
+    resource.setrlimit(resource.RLIMIT_AS, (max_bytes, max_bytes))
+
+
+def simulate_event(job):
+    """S-wave run of one event, returns its moment, magnitude, energy and runtime"""
+    start = time.perf_counter()
+    NX, NY, XMIN, XMAX, YMIN, YMAX, t_max = job["grid"]
+    source_x, source_y = job["source"]
+    wave = SWave(NX, NY, XMIN, XMAX, YMIN, YMAX, t_max, job["VEL_S"], job["RHO"], job["id"], source_x, source_y)
+    wave.run_wavelet_eq()
+    wave.run()
+    M0 = wave.get_seismic_moment()
+    Mw = wave.get_moment_magnitude_scale()
+    return {
+        "M0": M0,
+        "simulated_Mw": Mw,
+        "energy": wave.get_energy_released(),
+        "runtime_s": time.perf_counter() - start,
+        "status": "ok",
+    }
+
+
+def build_jobs(events, grid):
+    """One job per event, with its depth profiles from a single vectorized model build"""
+    NX, NY, XMIN, XMAX, YMIN, YMAX, t_max = grid
+    batch = RealDataBatch.from_dataframe(events, NX, NY, XMIN, XMAX, YMIN, YMAX)
+    batch.process()
+    batch.calculate()
+
+    jobs = []
+    for i in range(len(events)):
+        jobs.append({
+            "id": str(batch.ids[i]),
+            "grid": grid,
+            # (NY,) depth profiles, the solver broadcasts them over x
+            "VEL_S": batch.vs[i],
+            "RHO": batch.rho[i],
+            "source": (int(batch.source_x[i]), int(batch.source_y[i])),
+        })
+    return jobs
+
+
+def run_batch(events, grid, out_path, workers=None, max_bytes=None, cache=None):
+    """
+    Simulate every event of a catalog dataframe over a process pool, max_bytes of
+    memory per worker. Finished runs are written to out_path right away; with a
+    ResultCache, events that were already simulated with the same model are not run again.
+    """
+    jobs = build_jobs(events, grid)
+    rows = {}
+    for i, (_, event) in enumerate(events.iterrows()):
+        rows[jobs[i]["id"]] = {
+            "id": jobs[i]["id"],
+            "time": event["time"],
+            "latitude": event["latitude"],
+            "longitude": event["longitude"],
+            "depth": event["depth"],
+            "observed_magnitude": event["magnitude"],
+        }
+
+    with open(out_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+        writer.writeheader()
+        done = []
+
+        def finish(job, result):
+            rows[job["id"]].update(result)
+            writer.writerow(rows[job["id"]])
+            f.flush()
+            print(f"{job['id']}: {result['status']} ({len(done) + 1}/{len(jobs)})")
+            done.append(job["id"])
+
+        pending = []
+        for job in jobs:
+            key = hash_inputs("s_wave_batch", {k: job[k] for k in ("grid", "VEL_S", "RHO", "source")})
+            entry = cache.get(key) if cache is not None else None
+            if entry is not None:
+                finish(job, entry["values"])
+            else:
+                pending.append((job, key))
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=limit_memory, initargs=(max_bytes,)) as pool:
+            futures = {pool.submit(simulate_event, job): (job, key) for job, key in pending}
+            for future in as_completed(futures):
+                job, key = futures[future]
+                try:
+                    result = future.result()
+                except MemoryError:
+                    result = {"runtime_s": np.nan, "status": "memory limit exceeded"}
+                except Exception as e:
+                    result = {"runtime_s": np.nan, "status": f"error: {e}"}
+                if cache is not None and result["status"] == "ok":
+                    cache.put(key, values=result)
+                finish(job, result)
+
+    return [rows[job["id"]] for job in jobs]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="S-wave simulation for every event of a catalog query")
+    parser.add_argument("start", help="start time, e.g. '2024-01-01 00:00'")
+    parser.add_argument("end", help="end time")
+    parser.add_argument("--min-magnitude", type=float, default=None)
+    parser.add_argument("--region", type=float, nargs=4, metavar=("MIN_LAT", "MAX_LAT", "MIN_LON", "MAX_LON"), default=None)
+    parser.add_argument("--grid", type=float, nargs=6, metavar=("NX", "NY", "XMIN", "XMAX", "YMIN", "YMAX"),
+                        default=(200, 400, 0.0, 2000.0, 0.0, 4000.0))
+    parser.add_argument("--t-max", type=float, default=4.0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--memory-mb", type=float, default=4096, help="memory limit per worker, 0 for none")
+    parser.add_argument("--out", default="batch_results.csv")
+    parser.add_argument("--no-cache", action="store_true", help="rerun events that were simulated before")
+    args = parser.parse_args()
+
+    store = CatalogStore(fetcher=fetch_dataframe)
+    events = store.query(args.start, args.end, min_magnitude=args.min_magnitude, region=args.region)
+    print(f"{len(events)} events between {args.start} and {args.end}")
+
+    NX, NY, XMIN, XMAX, YMIN, YMAX = args.grid
+    grid = (int(NX), int(NY), XMIN, XMAX, YMIN, YMAX, args.t_max)
+    cache = None if args.no_cache else ResultCache()
+    run_batch(events, grid, args.out, args.workers, int(args.memory_mb * 1024 * 1024), cache)
+    print(f"Results written to {args.out}")
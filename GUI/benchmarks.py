@@ -0,0 +1,521 @@
+"""
+Benchmarks for the simulator. Run from the GUI folder, e.g.:
+    python benchmarks.py seismogram
+    python benchmarks.py section
+    python benchmarks.py gather
+    python benchmarks.py catalog
+    python benchmarks.py nested     (exit code 1 if the refined patch loses accuracy)
+
+Solver, pipeline, render, source and startup benchmarks store their results as JSON (with the git
+commit), so two commits can be compared:
+    python benchmarks.py solvers --json base.json
+    python benchmarks.py sources
+    python benchmarks.py startup
+    python benchmarks.py all --sizes 200x200,400x400 --dtypes float64,float32 --json new.json
+    python benchmarks.py compare base.json new.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from unittest import mock
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")  # benchmarks never open a window
+import matplotlib.animation as animation
+
+from seismogram import Seismogram
+
+
+def best_of(fn, repeat=3):
+    """Best wall clock time (in seconds) of repeat calls of fn"""
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def layered_column(NY, n_layers, rng):
+    """Random layered vp, vs, rho depth column with an S-wave-free (fluid) top layer"""
+    tops = np.sort(rng.choice(np.arange(1, NY), size=n_layers - 1, replace=False))
+    layer_idx = np.searchsorted(tops, np.arange(NY), side="right")
+    vp = rng.uniform(1500, 6500, n_layers)[layer_idx]
+    vs = rng.uniform(300, 3600, n_layers)[layer_idx]
+    vs[layer_idx == 0] = 0  # water on top
+    rho = rng.uniform(1000, 3000, n_layers)[layer_idx]
+    return vp, vs, rho
+
+
+def bench_seismogram(sizes=(1000, 10000, 100000), t_max=10.0, repeat=3):
+    rng = np.random.default_rng(0)
+    print(f"{'NY':>8} {'NT':>8} {'time (ms)':>10} {'Msamples/s':>11}")
+    for NY in sizes:
+        vp, vs, rho = layered_column(NY, max(2, NY // 100), rng)
+        # single column model, DX = 1 m depth steps
+        seismogram = Seismogram(1, NY, 0.0, 1.0, t_max, vp[None, :], vs[None, :], rho[None, :], "bench", 0)
+        seconds = best_of(seismogram.compute, repeat)
+        print(f"{NY:>8} {seismogram.NT:>8} {seconds * 1e3:>10.2f} {NY / seconds / 1e6:>11.2f}")
+
+
+def bench_section(NX=200, NY=400, t_max=4.0, repeat=3):
+    rng = np.random.default_rng(0)
+    columns = [layered_column(NY, 8, rng) for _ in range(NX)]
+    vp, vs, rho = (np.stack(c) for c in zip(*columns))
+    seismogram = Seismogram(NX, NY, 0.0, 2000.0, t_max, vp, vs, rho, "bench", NX // 2)
+
+    single = best_of(seismogram.compute, repeat)
+    section = best_of(seismogram.compute_section, repeat)
+    print(f"single trace: {single * 1e3:.2f} ms")
+    print(f"section ({NX} traces): {section * 1e3:.2f} ms = {section / single:.1f} single traces")
+
+
+def bench_gather(offset_counts=(10, 100, 500), NY=2000, t_max=4.0, repeat=3):
+    rng = np.random.default_rng(0)
+    vp, vs, rho = layered_column(NY, 20, rng)
+    seismogram = Seismogram(1, NY, 0.0, 2.0, t_max, vp[None, :], vs[None, :], rho[None, :], "bench", 0)
+    print(f"{'offsets':>8} {'time (ms)':>10}")
+    for n_offsets in offset_counts:
+        offsets = np.linspace(0, 3000, n_offsets)
+        seconds = best_of(lambda: seismogram.compute_gather(offsets), repeat)
+        print(f"{n_offsets:>8} {seconds * 1e3:>10.2f}")
+
+
+def bench_catalog(n_events=30000, latency=0.2, connections=(1, 4, 8), repeat=1):
+    # stand-in ComCat server with a fixed per-request latency, no network needed
+    from catalog_fetch import fetch_dataframe
+    from comcat_standin import StandInComCat, synthetic_catalog
+
+    events = synthetic_catalog("2024-01-01", "2025-01-01", n_events)
+    with StandInComCat(events, latency=latency) as standin:
+        print(f"{'connections':>11} {'time (s)':>9} {'events':>8}")
+        for max_connections in connections:
+            result = []
+            seconds = best_of(lambda: result.append(fetch_dataframe(
+                "2024-01-01", "2025-01-01", base_url=standin.url, slices=16, max_connections=max_connections
+            )), repeat)
+            print(f"{max_connections:>11} {seconds:>9.2f} {len(result[-1]):>8}")
+
+
+def peak_memory(fn):
+    """Peak memory (in bytes) allocated while fn runs, numpy arrays included"""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def solver_model(NX, NY, medium, rng):
+    """vp, vs, rho as (NY,) depth profiles, or laterally varying (NX, NY) grids for medium='grid'"""
+    vp, vs, rho = layered_column(NY, 8, rng)
+    vs[vs == 0] = 300  # no fluid layer, every solver sees the same kind of model
+    if medium == "profile":
+        return vp, vs, rho
+    # the same layering, 20 % faster from left to right
+    ramp = np.linspace(1.0, 1.2, NX)[:, np.newaxis]
+    return vp * ramp, vs * ramp, np.broadcast_to(rho, (NX, NY)).copy()
+
+
+def make_solver(kind, NX, NY, medium, dtype, t_max=1.0, seed=0):
+    """Solver of the given kind on a 2000 m x 2000 m grid, with its source wavelet ready"""
+    from P_wave_disp import PWaveDisplacement
+    from P_wave_pressure import PWavePressure
+    from S_wave import SWave
+
+    vp, vs, rho = solver_model(NX, NY, medium, np.random.default_rng(seed))
+    grid = (NX, NY, 0.0, 2000.0, 0.0, 2000.0, t_max)
+    if kind == "p_wave_disp":
+        solver = PWaveDisplacement(*grid, vp, rho, "bench", NX//4, NY//2, dtype=dtype)
+        step = solver.update_p_wave_only
+    elif kind == "p_wave_pressure":
+        solver = PWavePressure(*grid, vp, rho, "bench", NX//4, NY//2, dtype=dtype)
+        step = solver.update_wave
+    else:
+        solver = SWave(*grid, vs, rho, "bench", NX//4, NY//2, dtype=dtype)
+        step = solver.update_wave
+    solver.run_wavelet_eq()
+    return solver, step
+
+
+SOLVER_KINDS = ["p_wave_disp", "p_wave_pressure", "s_wave"]
+
+
+def bench_solvers(sizes=((200, 200), (400, 400)), dtypes=("float64", "float32"), media=("profile", "grid"),
+                  steps=50, repeat=3):
+    """Time per step and Mcell-updates/s of every solver, and its peak memory over the steps"""
+    records = []
+    print(f"{'solver':>16} {'grid':>10} {'dtype':>8} {'medium':>8} {'ms/step':>8} {'Mcell/s':>8} {'peak MB':>8}")
+    for kind in SOLVER_KINDS:
+        for NX, NY in sizes:
+            for dtype in dtypes:
+                for medium in media:
+                    def steps_from_start():
+                        solver, step = make_solver(kind, NX, NY, medium, dtype)
+                        for n in range(steps):
+                            step(n)
+
+                    solver, step = make_solver(kind, NX, NY, medium, dtype)
+                    counter = iter(range(steps * repeat))
+                    # best of repeat blocks of steps, the first steps (source on) included
+                    seconds = best_of(lambda: [step(next(counter)) for _ in range(steps)], repeat) / steps
+                    peak = peak_memory(steps_from_start)
+                    record = {
+                        "suite": "solvers", "name": kind, "NX": NX, "NY": NY, "dtype": dtype, "medium": medium,
+                        "seconds": seconds, "mcell_updates_per_s": NX * NY / seconds / 1e6, "peak_bytes": peak,
+                    }
+                    records.append(record)
+                    print(f"{kind:>16} {f'{NX}x{NY}':>10} {dtype:>8} {medium:>8} {seconds * 1e3:>8.2f} "
+                          f"{record['mcell_updates_per_s']:>8.1f} {peak / 2**20:>8.1f}")
+    return records
+
+
+def bench_pipeline(sizes=(1000, 10000), NX=200, t_max=10.0, repeat=3):
+    """Seismogram.compute and RealDataProcess.process/calculate, one call each"""
+    records = []
+    rng = np.random.default_rng(0)
+    print(f"{'step':>28} {'NY':>8} {'time (ms)':>10} {'peak MB':>8}")
+
+    def add(name, NY, fn):
+        seconds = best_of(fn, repeat)
+        peak = peak_memory(fn)
+        records.append({"suite": "pipeline", "name": name, "NX": NX, "NY": NY, "seconds": seconds, "peak_bytes": peak})
+        print(f"{name:>28} {NY:>8} {seconds * 1e3:>10.2f} {peak / 2**20:>8.1f}")
+
+    for NY in sizes:
+        vp, vs, rho = layered_column(NY, max(2, NY // 100), rng)
+        seismogram = Seismogram(NX, NY, 0.0, 2000.0, t_max, vp, vs, rho, "bench", NX // 2)
+        add("Seismogram.compute", NY, seismogram.compute)
+
+    try:
+        from realdata_process import RealDataProcess
+        for NY in sizes:
+            real_data = RealDataProcess(35.0, 139.0, 10.0, NX, NY, 0.0, 20000.0, 0.0, 60000.0)
+            add("RealDataProcess.process", NY, real_data.process)
+            add("RealDataProcess.calculate", NY, real_data.calculate)
+    except (ImportError, OSError) as e:
+        # CRUST1.0 (or obspy) not available on this machine
+        print(f"RealDataProcess skipped: {e}")
+    return records
+
+
+class FrameGrabber(animation.AbstractMovieWriter):
+    """
+    Stands in for FFMpegWriter: every frame is rendered to an RGBA buffer exactly like
+    the ffmpeg writer does before piping it, but nothing is encoded, so ffmpeg is not
+    needed and only the drawing is timed.
+    """
+    def __init__(self, fps=20, **kwargs):
+        super().__init__(fps=fps)
+        self.frames = 0
+        FrameGrabber.last = self
+
+    def setup(self, fig, outfile, dpi=None):
+        super().setup(fig, outfile, dpi)
+
+    def grab_frame(self, **savefig_kwargs):
+        self.fig.savefig(io.BytesIO(), format="rgba", dpi=self.dpi)
+        self.frames += 1
+
+    def finish(self):
+        pass
+
+
+RENDER_PATHS = ["p_wave_disp", "p_wave_pressure", "s_wave_displacement", "s_wave_stress",
+                "seismogram_combined", "seismogram_separated"]
+
+
+def bench_render(sizes=((200, 200),), dtypes=("float64",), media=("profile",), t_max=0.1):
+    """Frames per second of the video paths (solver steps + drawing), without encoding"""
+    import matplotlib.pyplot as plt
+
+    records = []
+    # no memory peak here, tracing every matplotlib allocation would dominate the timing
+    print(f"{'path':>22} {'grid':>10} {'dtype':>8} {'medium':>8} {'frames':>7} {'frames/s':>9}")
+    for path in RENDER_PATHS:
+        for NX, NY in sizes:
+            for dtype in dtypes:
+                for medium in media:
+                    def render():
+                        if path.startswith("seismogram"):
+                            vp, vs, rho = solver_model(NX, NY, medium, np.random.default_rng(0))
+                            window = Seismogram(NX, NY, 0.0, 2000.0, t_max, vp, vs, rho, "bench", NX // 2)
+                            window.compute()
+                            draw = window.create_combined_figure if path == "seismogram_combined" else window.create_separated_figure
+                        elif path.startswith("s_wave"):
+                            window, _ = make_solver("s_wave", NX, NY, medium, dtype, t_max=t_max)
+                            draw = window.create_figure_displacement if path == "s_wave_displacement" else window.create_figure_stress
+                        else:
+                            window, _ = make_solver(path, NX, NY, medium, dtype, t_max=t_max)
+                            draw = window.create_figure
+                        with mock.patch.object(animation, "FFMpegWriter", FrameGrabber):
+                            draw()
+                        plt.close("all")
+
+                    start = time.perf_counter()
+                    render()
+                    seconds = time.perf_counter() - start
+                    frames = FrameGrabber.last.frames
+                    record = {
+                        "suite": "render", "name": path, "NX": NX, "NY": NY, "dtype": dtype, "medium": medium,
+                        "frames": frames, "seconds": seconds / frames, "frames_per_s": frames / seconds,
+                    }
+                    records.append(record)
+                    print(f"{path:>22} {f'{NX}x{NY}':>10} {dtype:>8} {medium:>8} {frames:>7} {record['frames_per_s']:>9.1f}")
+    return records
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(path, records):
+    results = {
+        "commit": git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "numpy": np.__version__, "cpus": os.cpu_count()},
+        "results": records,
+    }
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"{len(records)} results of commit {results['commit']} written to {path}")
+
+
+RECORD_KEYS = ["suite", "name", "NX", "NY", "dtype", "medium"]
+
+
+def compare_results(base_path, new_path, threshold=0.1):
+    """
+    Print the time ratio new/base of every benchmark present in both files and return
+    the ones that got slower by more than threshold (0.1 = 10 %).
+    """
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    key = lambda record: tuple(record.get(k) for k in RECORD_KEYS)
+    base_records = {key(record): record for record in base["results"]}
+
+    print(f"base {base.get('commit')}  new {new.get('commit')}")
+    print(f"{'benchmark':>52} {'base (ms)':>10} {'new (ms)':>10} {'ratio':>7}")
+    regressions = []
+    for record in new["results"]:
+        old = base_records.get(key(record))
+        if old is None:
+            continue
+        ratio = record["seconds"] / old["seconds"]
+        label = " ".join(str(v) for v in key(record)[1:] if v is not None)
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append((label, ratio))
+            flag = "  slower"
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"{label:>52} {old['seconds'] * 1e3:>10.3f} {record['seconds'] * 1e3:>10.3f} {ratio:>7.2f}{flag}")
+    return regressions
+
+
+def bench_sources(counts=(1, 10, 100, 1000), NX=400, NY=400, steps=50, repeat=3):
+    """S-wave time per step with a SourceArray of n sub-sources, and the injection alone"""
+    from S_wave import SWave
+    from sources import SourceArray
+
+    records = []
+    rng = np.random.default_rng(0)
+    vp, vs, rho = solver_model(NX, NY, "profile", rng)
+    print(f"{'sub-sources':>12} {'ms/step':>8} {'inject us':>10}")
+    for n in counts:
+        NT = steps * repeat
+        source = SourceArray(rng.integers(25, NX - 25, n), rng.integers(25, NY - 25, n), rng.standard_normal((NT, n)) * 1e6)
+        solver = SWave(NX, NY, 0.0, 2000.0, 0.0, 2000.0, NT * 0.001, vs, rho, "bench", NX//4, NY//2, source=source)
+        counter = iter(range(NT))
+        seconds = best_of(lambda: [solver.update_wave(next(counter)) for _ in range(steps)], repeat) / steps
+        field = np.zeros((NX, NY))
+        inject = best_of(lambda: [solver.source.inject(field, k) for k in range(steps)], repeat) / steps
+        records.append({"suite": "sources", "name": f"s_wave_{n}", "NX": NX, "NY": NY, "dtype": "float64",
+                        "medium": "profile", "seconds": seconds, "inject_seconds": inject})
+        print(f"{n:>12} {seconds * 1e3:>8.2f} {inject * 1e6:>10.1f}")
+    return records
+
+
+def receiver_traces(solver, ratio, receivers):
+    """uy at the receivers every ratio steps of a solver with its wavelet ready"""
+    traces = {receiver: [] for receiver in receivers}
+    for n in range(solver.NT):
+        solver.update_wave(n)
+        if (n + 1) % ratio == 0:
+            for x, y in receivers:
+                traces[(x, y)].append(solver.uy[x * ratio, y * ratio])
+    return {receiver: np.array(trace) for receiver, trace in traces.items()}
+
+
+def bench_nested(NX=120, NY=120, size=1200.0, ratio=3, t_max=0.4, offsets=(10, 20, 30), f0=15.0):
+    """
+    uy traces of NestedSWave and of the coarse SWave alone on the x and y axes through the
+    source, as relative L2 errors against an SWave refined ratio times everywhere, with the
+    run times. The grid is size m wide and deep; the patch reaches 20 cells from the source,
+    the farther receivers see the waves that left it. Returns the (medium, axis) pairs on
+    which the nested grid is less accurate than the coarse one on average.
+    """
+    from S_wave import SWave
+    from nested_grid import NestedSWave
+    from precompute import ricker_source
+
+    source_x, source_y = NX // 2, NY // 2
+    axes = {"x": [(source_x + d, source_y) for d in offsets], "y": [(source_x, source_y + d) for d in offsets]}
+    receivers = axes["x"] + axes["y"]
+    depth = np.arange(NY) / NY
+    models = {"uniform": np.full(NY, 2000.0), "layered": np.where(depth < 0.52, 1500.0, 2500.0)}
+    worse = []
+    print(f"{'medium':>8} {'receiver':>9} {'coarse':>7} {'nested':>7}")
+    for medium, vs in models.items():
+        rho = np.full(NY, 2500.0)
+        # the material of the nearest coarse point, as on the coarse grid
+        rows = np.arange(NY * ratio)
+        rows = np.minimum(rows // ratio + (rows % ratio > ratio // 2), NY - 1)
+        reference = SWave(NX * ratio, NY * ratio, 0.0, size, 0.0, size, t_max, vs[rows], rho[rows], "bench",
+                          source_x * ratio, source_y * ratio, DT=0.001 / ratio)
+        reference.source_amp = ricker_source(reference.NT, reference.DT, f0) * ratio**2
+        start = time.perf_counter()
+        expected = receiver_traces(reference, ratio, receivers)
+        seconds = {"refined": time.perf_counter() - start}
+
+        errors = {}
+        for kind, solver_class in (("coarse", SWave), ("nested", NestedSWave)):
+            solver = solver_class(NX, NY, 0.0, size, 0.0, size, t_max, vs, rho, "bench", source_x, source_y)
+            solver.run_wavelet_eq(f0)
+            start = time.perf_counter()
+            traces = receiver_traces(solver, 1, receivers)
+            seconds[kind] = time.perf_counter() - start
+            errors[kind] = {receiver: np.linalg.norm(traces[receiver] - expected[receiver]) / np.linalg.norm(expected[receiver])
+                            for receiver in receivers}
+        for axis, points in axes.items():
+            for (x, y), d in zip(points, offsets):
+                print(f"{medium:>8} {axis}+{d:<7} {errors['coarse'][(x, y)]:>7.3f} {errors['nested'][(x, y)]:>7.3f}")
+            if np.mean([errors["nested"][p] for p in points]) > np.mean([errors["coarse"][p] for p in points]):
+                worse.append((medium, axis))
+        print(f"{medium:>8} {'seconds':>9} {seconds['coarse']:>7.2f} {seconds['nested']:>7.2f}  refined everywhere {seconds['refined']:.2f}")
+    for medium, axis in worse:
+        print(f"nested grid less accurate than the coarse grid on the {axis} axis ({medium})")
+    return worse
+
+
+STARTUP_MODULES = ["main", "main2", "P_wave_disp", "P_wave_pressure", "S_wave", "seismogram", "realdata_process",
+                   "show_video", "catalog_store", "cli"]
+HEAVY_MODULES = ["matplotlib", "scipy", "cv2", "PIL", "netCDF4", "obspy", "geopy", "pandas", "libcomcat"]
+
+
+def run_fresh(code):
+    """Run code in a new interpreter from the GUI folder, (wall seconds, stdout) or (None, error)"""
+    start = time.time()
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode:
+        return None, (result.stderr.strip().splitlines() or ["failed"])[-1]
+    return start, result.stdout
+
+
+def bench_startup(modules=STARTUP_MODULES, repeat=3):
+    """
+    Import time of every module in a fresh interpreter, with the heavy dependencies it
+    loads, and the time from starting Python to the first drawn window of main/main2
+    (skipped without a display).
+    """
+    records = []
+    print(f"{'import':>18} {'ms':>8}  heavy modules loaded")
+    for module in modules:
+        code = (f"import json, sys, time; start = time.perf_counter(); import {module}; "
+                f"print(json.dumps([time.perf_counter() - start, [m for m in {HEAVY_MODULES!r} if m in sys.modules]]))")
+        times, heavy, error = [], [], None
+        for _ in range(repeat):
+            start, output = run_fresh(code)
+            if start is None:
+                error = output
+                break
+            seconds, heavy = json.loads(output)
+            times.append(seconds)
+        if error:
+            print(f"{module:>18} {'-':>8}  skipped: {error}")
+            continue
+        records.append({"suite": "startup", "name": f"import {module}", "seconds": min(times), "heavy": heavy})
+        print(f"{module:>18} {min(times) * 1e3:>8.1f}  {', '.join(heavy) or '-'}")
+
+    for module in ("main", "main2"):
+        code = f"import time, {module}; app = {module}.MainApp(); app.update(); print(time.time())"
+        times, error = [], None
+        for _ in range(repeat):
+            start, output = run_fresh(code)
+            if start is None:
+                error = output
+                break
+            times.append(float(output) - start)
+        if error:
+            print(f"first window of {module}: skipped ({error})")
+            continue
+        records.append({"suite": "startup", "name": f"first window {module}", "seconds": min(times)})
+        print(f"first window of {module}: {min(times) * 1e3:.0f} ms")
+    return records
+
+
+def parse_sizes(text):
+    """'200x200,400x400' -> ((200, 200), (400, 400))"""
+    return tuple(tuple(int(n) for n in size.split("x")) for size in text.split(","))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulator benchmarks")
+    parser.add_argument("suite", choices=["seismogram", "section", "gather", "catalog",
+                                          "solvers", "pipeline", "render", "sources", "startup", "nested", "all", "compare"])
+    parser.add_argument("files", nargs="*", help="compare: base.json new.json")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sizes", type=parse_sizes, default=((200, 200), (400, 400)), help="NXxNY grids, e.g. 200x200,400x400")
+    parser.add_argument("--dtypes", default="float64,float32")
+    parser.add_argument("--media", default="profile,grid", help="profile (layered) and/or grid (laterally varying)")
+    parser.add_argument("--steps", type=int, default=50, help="solver steps per timing")
+    parser.add_argument("--json", help="write the results of solvers/pipeline/render/all to this file")
+    parser.add_argument("--threshold", type=float, default=0.1, help="compare: relative slowdown reported as regression")
+    args = parser.parse_args()
+    dtypes = tuple(args.dtypes.split(","))
+    media = tuple(args.media.split(","))
+
+    if args.suite == "seismogram":
+        bench_seismogram(repeat=args.repeat)
+    elif args.suite == "section":
+        bench_section(repeat=args.repeat)
+    elif args.suite == "gather":
+        bench_gather(repeat=args.repeat)
+    elif args.suite == "catalog":
+        bench_catalog(repeat=args.repeat)
+    elif args.suite == "nested":
+        raise SystemExit(1 if bench_nested() else 0)
+    elif args.suite == "compare":
+        if len(args.files) != 2:
+            parser.error("compare needs base.json and new.json")
+        regressions = compare_results(*args.files, threshold=args.threshold)
+        raise SystemExit(1 if regressions else 0)
+    else:
+        records = []
+        if args.suite in ("solvers", "all"):
+            records += bench_solvers(args.sizes, dtypes, media, args.steps, args.repeat)
+        if args.suite in ("pipeline", "all"):
+            records += bench_pipeline(repeat=args.repeat)
+        if args.suite in ("render", "all"):
+            records += bench_render(args.sizes[:1], dtypes, media)
+        if args.suite in ("sources", "all"):
+            records += bench_sources(steps=args.steps, repeat=args.repeat)
+        if args.suite in ("startup", "all"):
+            records += bench_startup(repeat=args.repeat)
+        if args.json:
+            save_results(args.json, records)
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import os
+import queue
+import threading
+import urllib.parse
+import urllib.request
+import numpy as np
+import pandas as pd
+
+from catalog_store import COLUMNS, from_ms, to_ms, geojson_to_dataframe
+
+COMCAT_URL = os.environ.get("COMCAT_URL", "https://earthquake.usgs.gov/fdsnws/event/1/query")
+COMCAT_LIMIT = 20000  # most events ComCat returns for one request
+
+
+def time_slices(start_ms, end_ms, n_slices):
+    """Split [start_ms, end_ms) into n_slices contiguous (start_ms, end_ms) ranges"""
+    edges = np.unique(np.linspace(start_ms, end_ms, n_slices + 1).astype(np.int64))
+    return list(zip(edges[:-1].tolist(), edges[1:].tolist()))
+
+
+def iso_time(ms):
+    return from_ms(ms).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
+
+
+def _get_json(url, timeout):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        if response.status == 204:  # FDSN "no data"
+            return {"features": []}
+        return json.load(response)
+
+
+async def _fetch_slice(start_ms, end_ms, semaphore, on_rows, options):
+    query = {
+        "format": "geojson",
+        "starttime": iso_time(start_ms),
+        "endtime": iso_time(end_ms),
+        "orderby": "time",
+        "limit": options["limit"],
+        **options["params"],
+    }
+    url = f"{options['base_url']}?{urllib.parse.urlencode(query)}"
+
+    for attempt in range(options["retries"] + 1):
+        try:
+            # urllib blocks, so every request runs in a worker thread; the semaphore
+            # bounds how many connections are open at once
+            async with semaphore:
+                geojson = await asyncio.to_thread(_get_json, url, options["timeout"])
+            break
+        except OSError:
+            if attempt == options["retries"]:
+                raise
+            await asyncio.sleep(0.5 * 2 ** attempt)
+
+    if len(geojson.get("features", [])) >= options["limit"] and end_ms - start_ms > 1:
+        # the slice hit the server limit, so it may be truncated: split it in half
+        middle = (start_ms + end_ms) // 2
+        parts = await asyncio.gather(
+            _fetch_slice(start_ms, middle, semaphore, on_rows, options),
+            _fetch_slice(middle, end_ms, semaphore, on_rows, options),
+        )
+        return pd.concat(parts, ignore_index=True)
+
+    dataframe = geojson_to_dataframe(geojson)
+    # the endpoint treats endtime as inclusive, keep [start, end) so slices do not overlap
+    dataframe = dataframe[dataframe["time"] < from_ms(end_ms)].reset_index(drop=True)
+    if on_rows is not None:
+        on_rows(dataframe, start_ms, end_ms)
+    return dataframe
+
+
+async def fetch_ranges(ranges, on_rows=None, slices=8, max_connections=4, base_url=COMCAT_URL,
+                       limit=COMCAT_LIMIT, timeout=60, retries=2, **params):
+    """
+    Fetch the events of every (start, end) range concurrently. Each range is split into
+    `slices` time slices and at most max_connections requests are in flight at a time.
+    on_rows(dataframe, start_ms, end_ms) is called for every slice as soon as it has
+    arrived, which is complete for [start_ms, end_ms). Extra keyword arguments are passed
+    to the endpoint (e.g. minmagnitude=5). Returns all events, newest first.
+    """
+    options = {"base_url": base_url, "limit": limit, "timeout": timeout, "retries": retries, "params": params}
+    semaphore = asyncio.Semaphore(max_connections)
+    tasks = [
+        _fetch_slice(slice_start, slice_end, semaphore, on_rows, options)
+        for start, end in ranges
+        for slice_start, slice_end in time_slices(to_ms(start), to_ms(end), slices)
+    ]
+    parts = await asyncio.gather(*tasks)
+    if not parts:
+        return pd.DataFrame(columns=COLUMNS)
+    dataframe = pd.concat(parts, ignore_index=True).drop_duplicates("id")
+    return dataframe.sort_values("time", ascending=False, ignore_index=True)
+
+
+def fetch_dataframe(start, end, **kwargs):
+    """Blocking fetch of [start, end), usable as the fetcher of a CatalogStore"""
+    return asyncio.run(fetch_ranges([(start, end)], **kwargs))
+
+
+class BackgroundFetch():
+    """
+    Runs fetch_ranges in a background thread and hands every slice to on_rows on the Tk
+    thread (polled with widget.after), so the window stays responsive and the table fills
+    while the download is still running. on_done(dataframe) or on_error(exception) is
+    called at the end.
+    """
+    def __init__(self, widget, ranges, on_rows, on_done, on_error=None, poll_ms=50, **kwargs):
+        self.widget = widget
+        self.on_rows = on_rows
+        self.on_done = on_done
+        self.on_error = on_error
+        self.poll_ms = poll_ms
+        self.queue = queue.Queue()
+        self.cancelled = False
+
+        self.thread = threading.Thread(target=self._run, args=(ranges, kwargs), daemon=True)
+        self.thread.start()
+        self.widget.after(self.poll_ms, self._poll)
+
+    def _run(self, ranges, kwargs):
+        def on_rows(dataframe, start_ms, end_ms):
+            self.queue.put(("rows", (dataframe, start_ms, end_ms)))
+
+        try:
+            result = asyncio.run(fetch_ranges(ranges, on_rows=on_rows, **kwargs))
+            self.queue.put(("done", result))
+        except Exception as e:
+            self.queue.put(("error", e))
+
+    def cancel(self):
+        # the requests already in flight finish in the background, their rows are dropped
+        self.cancelled = True
+
+    def _poll(self):
+        if self.cancelled or not self.widget.winfo_exists():
+            return
+        while True:
+            try:
+                kind, payload = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "rows":
+                self.on_rows(*payload)
+            elif kind == "done":
+                self.on_done(payload)
+                return
+            else:
+                if self.on_error is not None:
+                    self.on_error(payload)
+                return
+        self.widget.after(self.poll_ms, self._poll)
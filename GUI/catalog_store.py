@@ -0,0 +1,236 @@
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+import pandas as pd
+
+# same columns as libcomcat's get_summary_data_frame
+COLUMNS = ["id", "time", "location", "latitude", "longitude", "depth", "magnitude",
+           "alert", "url", "eventtype", "significance"]
+
+DEFAULT_CATALOG_PATH = os.environ.get(
+    "SEISMIC_CATALOG_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "earthquake_catalog.sqlite")
+)
+# ComCat lists events some time after they happen; ranges closer to now than this are
+# never recorded as complete, so they are fetched again later
+REPORTING_DELAY_MS = 6 * 3600 * 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id TEXT PRIMARY KEY,
+    time INTEGER NOT NULL,
+    location TEXT,
+    latitude REAL,
+    longitude REAL,
+    depth REAL,
+    magnitude REAL,
+    alert TEXT,
+    url TEXT,
+    eventtype TEXT,
+    significance REAL
+);
+CREATE INDEX IF NOT EXISTS events_time ON events (time);
+CREATE INDEX IF NOT EXISTS events_lat_lon ON events (latitude, longitude);
+CREATE INDEX IF NOT EXISTS events_magnitude ON events (magnitude, time);
+CREATE TABLE IF NOT EXISTS fetched_ranges (
+    start_ms INTEGER NOT NULL,
+    end_ms INTEGER NOT NULL
+);
+"""
+
+
+def to_ms(value):
+    """Epoch milliseconds (UTC) of a datetime, pandas Timestamp or epoch ms number"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize("UTC")
+    return int(timestamp.value // 1_000_000)
+
+
+def from_ms(value):
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc).replace(tzinfo=None)
+
+
+def comcat_fetch(start, end):
+    """All ComCat events in [start, end) as a summary dataframe (needs network)"""
+    from libcomcat.dataframes import get_summary_data_frame
+    from libcomcat.search import search
+
+    return get_summary_data_frame(search(starttime=start, endtime=end))
+
+
+def geojson_to_dataframe(geojson):
+    """Summary dataframe from a ComCat FDSN GeoJSON FeatureCollection (dict or str)"""
+    if isinstance(geojson, str):
+        geojson = json.loads(geojson)
+    rows = []
+    for feature in geojson.get("features", []):
+        props = feature["properties"]
+        longitude, latitude, depth = feature["geometry"]["coordinates"][:3]
+        rows.append({
+            "id": feature["id"],
+            "time": from_ms(props["time"]),
+            "location": props.get("place"),
+            "latitude": latitude,
+            "longitude": longitude,
+            "depth": depth,
+            "magnitude": props.get("mag"),
+            "alert": props.get("alert"),
+            "url": props.get("url"),
+            "eventtype": props.get("type"),
+            "significance": props.get("sig"),
+        })
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+class CatalogStore():
+    """
+    Local earthquake catalog in SQLite. Every fetched event is kept, together with the
+    time ranges that have been fetched completely, so repeated or overlapping queries
+    only go to the network for the part that is not stored yet.
+    """
+    def __init__(self, path=DEFAULT_CATALOG_PATH, fetcher=comcat_fetch):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self.fetcher = fetcher
+
+    def close(self):
+        self.connection.close()
+
+    def insert_dataframe(self, dataframe):
+        """Insert (or update) the events of a summary dataframe"""
+        if dataframe is None or len(dataframe) == 0:
+            return 0
+        frame = dataframe.reindex(columns=COLUMNS)
+        frame = frame.astype(object).where(frame.notna(), None)
+        rows = [
+            (row[0], to_ms(row[1]), *row[2:])
+            for row in frame.itertuples(index=False, name=None)
+        ]
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO events ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                rows
+            )
+        return len(rows)
+
+    def load_file(self, path, start=None, end=None):
+        """
+        Populate the store from a CSV export of a summary dataframe or a ComCat GeoJSON
+        file. If start and end are given, that time range is recorded as complete.
+        """
+        if path.endswith(".csv"):
+            dataframe = pd.read_csv(path, parse_dates=["time"])
+        else:
+            with open(path) as f:
+                dataframe = geojson_to_dataframe(json.load(f))
+        count = self.insert_dataframe(dataframe)
+        if start is not None and end is not None:
+            self.mark_fetched(start, end)
+        return count
+
+    def fetched_ranges(self):
+        return self.connection.execute("SELECT start_ms, end_ms FROM fetched_ranges ORDER BY start_ms").fetchall()
+
+    def mark_fetched(self, start, end):
+        """
+        Record [start, end) as completely stored, merging overlapping ranges. Only up to
+        REPORTING_DELAY_MS before now, later events may still be reported.
+        """
+        start_ms = to_ms(start)
+        end_ms = min(to_ms(end), int(time.time() * 1000) - REPORTING_DELAY_MS)
+        if end_ms <= start_ms:
+            return
+        ranges = self.fetched_ranges() + [(start_ms, end_ms)]
+        ranges.sort()
+        merged = [list(ranges[0])]
+        for range_start, range_end in ranges[1:]:
+            if range_start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], range_end)
+            else:
+                merged.append([range_start, range_end])
+        with self.connection:
+            self.connection.execute("DELETE FROM fetched_ranges")
+            self.connection.executemany("INSERT INTO fetched_ranges VALUES (?, ?)", merged)
+
+    def missing_ranges(self, start, end):
+        """Parts of [start, end) that have not been fetched yet, as (start_ms, end_ms) pairs"""
+        start_ms, end_ms = to_ms(start), to_ms(end)
+        gaps = []
+        cursor = start_ms
+        for range_start, range_end in self.fetched_ranges():
+            if range_end <= cursor:
+                continue
+            if range_start >= end_ms:
+                break
+            if range_start > cursor:
+                gaps.append((cursor, range_start))
+            cursor = max(cursor, range_end)
+        if cursor < end_ms:
+            gaps.append((cursor, end_ms))
+        return gaps
+
+    def fill(self, start, end):
+        """Fetch and store the missing parts of [start, end)"""
+        for gap_start, gap_end in self.missing_ranges(start, end):
+            self.insert_dataframe(self.fetcher(from_ms(gap_start), from_ms(gap_end)))
+            self.mark_fetched(gap_start, gap_end)
+
+    def event(self, event_id):
+        """Stored event as a dict (like a row of the summary dataframe), or None"""
+        row = self.connection.execute(f"SELECT {', '.join(COLUMNS)} FROM events WHERE id = ?", (event_id,)).fetchone()
+        if row is None:
+            return None
+        event = dict(zip(COLUMNS, row))
+        event["time"] = from_ms(event["time"])
+        return event
+
+    def query(self, start, end, min_magnitude=None, max_magnitude=None, region=None, fetch=True):
+        """
+        Events in [start, end) as a summary dataframe (newest first, like ComCat).
+        Magnitude bounds and region = (min_lat, max_lat, min_lon, max_lon) are evaluated
+        by SQLite on the indexed columns. With fetch=False only stored events are used.
+        """
+        if fetch and self.fetcher is not None:
+            self.fill(start, end)
+
+        conditions = ["time >= ?", "time < ?"]
+        params = [to_ms(start), to_ms(end)]
+        if min_magnitude is not None:
+            conditions.append("magnitude >= ?")
+            params.append(min_magnitude)
+        if max_magnitude is not None:
+            conditions.append("magnitude <= ?")
+            params.append(max_magnitude)
+        if region is not None:
+            min_lat, max_lat, min_lon, max_lon = region
+            conditions.append("latitude BETWEEN ? AND ?")
+            params += [min_lat, max_lat]
+            if min_lon <= max_lon:
+                conditions.append("longitude BETWEEN ? AND ?")
+            else:
+                # region crossing the antimeridian
+                conditions.append("(longitude >= ? OR longitude <= ?)")
+            params += [min_lon, max_lon]
+
+        rows = self.connection.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM events WHERE {' AND '.join(conditions)} ORDER BY time DESC",
+            params
+        ).fetchall()
+        dataframe = pd.DataFrame(rows, columns=COLUMNS)
+        dataframe["time"] = pd.to_datetime(dataframe["time"], unit="ms")
+        return dataframe
+
+
+if __name__ == "__main__":
+    # python catalog_store.py events.csv [start end]  -> populate the local catalog from a file
+    store = CatalogStore(fetcher=None)
+    count = store.load_file(sys.argv[1], *sys.argv[2:4])
+    print(f"Stored {count} events in {DEFAULT_CATALOG_PATH}")
@@ -0,0 +1,151 @@
+import tkinter as tk
+from tkinter import ttk
+import numpy as np
+import pandas as pd
+
+
+class VirtualTable(tk.Frame):
+    """
+    Treeview based table for very large dataframes. Only the rows that fit in the window
+    exist as Treeview items: scrolling, sorting and filtering work on an index array over
+    the dataframe columns and then refill those few items. The selection is remembered
+    by event id, so it survives scrolling, sorting, filtering and reloads.
+
+    columns is a list of (dataframe column, heading); the column "index" shows the row
+    position in the dataframe.
+    """
+    def __init__(self, master, columns, id_column="id", row_height=20):
+        super().__init__(master)
+        self.columns = columns
+        self.id_column = id_column
+        self.row_height = row_height
+        self.dataframe = pd.DataFrame(columns=[name for name, _ in columns if name != "index"] + [id_column])
+        self.arrays = {}
+        self.order = np.zeros(0, dtype=np.int64)  # dataframe rows in display order
+        self.top = 0  # position in self.order of the first visible row
+        self.n_visible = 20
+        self.sort_column = None
+        self.sort_ascending = True
+        self.filters = {}
+        self.selected_id = None
+
+        self.tree = ttk.Treeview(self, columns=[name for name, _ in columns], show="headings",
+                                 selectmode="browse", height=self.n_visible)
+        for name, heading in columns:
+            self.tree.heading(name, text=heading, command=lambda name=name: self.sort_by(name))
+        self.tree.pack(side="left", fill="both", expand=True)
+
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(3))
+        self.tree.bind("<Prior>", lambda e: self.scroll(-self.n_visible))
+        self.tree.bind("<Next>", lambda e: self.scroll(self.n_visible))
+
+    def set_data(self, dataframe):
+        """Show a new dataframe, keeping sort order, filters and the selected event"""
+        self.dataframe = dataframe.reset_index(drop=True)
+        self.arrays = {name: self.dataframe[name].to_numpy() for name in self.dataframe.columns}
+        self.refresh()
+
+    def append(self, dataframe):
+        """Add rows at the end of the dataframe (e.g. a newly downloaded slice)"""
+        if len(self.dataframe) == 0:
+            self.set_data(dataframe)
+        else:
+            self.set_data(pd.concat([self.dataframe, dataframe], ignore_index=True))
+
+    def set_filter(self, column, minimum=None, maximum=None):
+        """Only show rows with minimum <= column <= maximum (None = no bound)"""
+        if minimum is None and maximum is None:
+            self.filters.pop(column, None)
+        else:
+            self.filters[column] = (minimum, maximum)
+        self.top = 0
+        self.refresh()
+
+    def sort_by(self, column):
+        """Sort by a column, clicking the same heading again reverses the order"""
+        if self.sort_column == column:
+            self.sort_ascending = not self.sort_ascending
+        else:
+            self.sort_column, self.sort_ascending = column, True
+        for name, heading in self.columns:
+            arrow = (" ▲" if self.sort_ascending else " ▼") if name == column else ""
+            self.tree.heading(name, text=heading + arrow)
+        self.refresh()
+
+    def refresh(self):
+        # filters and sorting only touch the columns, never Treeview items
+        mask = np.ones(len(self.dataframe), dtype=bool)
+        for column, (minimum, maximum) in self.filters.items():
+            values = self.arrays[column].astype(float)
+            if minimum is not None:
+                mask &= values >= minimum
+            if maximum is not None:
+                mask &= values <= maximum
+        order = np.flatnonzero(mask)
+
+        if self.sort_column == "index":
+            order = order if self.sort_ascending else order[::-1]
+        elif self.sort_column is not None and len(order):
+            keys = self.dataframe[self.sort_column].iloc[order].reset_index(drop=True)
+            ranks = keys.sort_values(ascending=self.sort_ascending, kind="stable", na_position="last").index
+            order = order[ranks.to_numpy()]
+
+        self.order = order
+        self.render()
+
+    def render(self):
+        """Fill the Treeview with the rows in the visible window"""
+        self.top = max(0, min(self.top, len(self.order) - self.n_visible))
+        rows = self.order[self.top:self.top + self.n_visible]
+
+        self.tree.delete(*self.tree.get_children())
+        for row in rows:
+            values = [row if name == "index" else self.arrays[name][row] for name, _ in self.columns]
+            self.tree.insert("", "end", iid=str(row), values=values)
+            if self.selected_id is not None and self.arrays[self.id_column][row] == self.selected_id:
+                self.tree.selection_set(str(row))
+
+        if len(self.order):
+            self.scrollbar.set(self.top / len(self.order), (self.top + len(rows)) / len(self.order))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def yview(self, *args):
+        # scrollbar protocol: ("moveto", fraction) or ("scroll", n, "units" | "pages")
+        if args[0] == "moveto":
+            self.top = int(round(float(args[1]) * len(self.order)))
+            self.render()
+        elif args[0] == "scroll":
+            self.scroll(int(args[1]) * (self.n_visible if args[2] == "pages" else 1))
+
+    def scroll(self, n_rows):
+        self.top += n_rows
+        self.render()
+        return "break"
+
+    def on_resize(self, event):
+        n_visible = max(1, event.height // self.row_height - 1)  # one row for the headings
+        if n_visible != self.n_visible:
+            self.n_visible = n_visible
+            self.render()
+
+    def on_select(self, event):
+        selection = self.tree.selection()
+        if selection:  # refilling the items also clears the selection, keep the remembered id
+            self.selected_id = self.arrays[self.id_column][int(selection[0])]
+
+    def selected(self):
+        """Event id of the selected row, or None"""
+        return self.selected_id
+
+    def row_of(self, event_id):
+        """Dataframe row position of an event id, or None"""
+        rows = np.flatnonzero(self.arrays.get(self.id_column, np.zeros(0)) == event_id)
+        return int(rows[0]) if len(rows) else None
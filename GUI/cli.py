@@ -0,0 +1,323 @@
+"""
+Headless entry point: runs one simulation described by a JSON or TOML config file,
+without a display. Run from the GUI folder:
+    python -m cli config.json
+
+Config keys:
+    grid     NX, NY, XMIN, XMAX, YMIN, YMAX, t_max
+    layers   [[from, to, material], ...] with materials from materials.py, or
+    event    {"latitude", "longitude", "depth"} or {"id"} of an event in the local catalog
+    lateral  true for a laterally varying real-data model (default false)
+    solver   p_wave_disp, p_wave_pressure, s_wave_displacement, s_wave_stress,
+             seismogram_combined or seismogram_separated
+    outputs  any of "fields" (final arrays as .npz) and "video" (mp4, needs ffmpeg)
+    source   [x, y] grid index (default: NX//4, NY//2 for layers, the event location otherwise)
+    dtype    float64 (default) or float32
+    diagnostics   true to add in-loop diagnostics of the wave solvers (peak displacement,
+             energy, boundary loss, rupture slip and moment) to the values and fields
+    fault    {"start": [x, y], "end": [x, y], "rupture_velocity": m/s (default 2500)}, a line
+             fault rupturing from start instead of the point source (wave solvers)
+    refine   odd refinement ratio (e.g. 3) of a finer patch around the source for the
+             S-wave solvers (nested_grid.py), seismic moment taken on the patch
+    check_memory  refuse runs whose estimated peak memory exceeds the budget (default true)
+    name, output_dir, cache (default true)
+
+Prints one JSON object with the results on stdout (solver messages go to stderr).
+Exit codes: 0 success, 1 simulation failed, 2 invalid config.
+"""
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import time
+import numpy as np
+
+os.environ.setdefault("MPLBACKEND", "Agg")  # videos are rendered off screen
+
+from materials import check_layers, layer_profiles
+from medium import as_medium
+from memory_planner import describe, plan_run, suggest
+from result_cache import ResultCache
+
+SOLVERS = ["p_wave_disp", "p_wave_pressure", "s_wave_displacement", "s_wave_stress",
+           "seismogram_combined", "seismogram_separated"]
+OUTPUTS = ["fields", "video"]
+DTYPES = ["float64", "float32"]
+GRID_KEYS = ["NX", "NY", "XMIN", "XMAX", "YMIN", "YMAX", "t_max"]
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_CONFIG = 2
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def load_config(path):
+    if path.endswith(".toml"):
+        import tomllib
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    with open(path) as f:
+        return json.load(f)
+
+
+def parse_grid(config):
+    grid = config.get("grid")
+    if not isinstance(grid, dict) or any(key not in grid for key in GRID_KEYS):
+        raise ConfigError(f"'grid' must set {', '.join(GRID_KEYS)}")
+    try:
+        return (int(grid["NX"]), int(grid["NY"]), float(grid["XMIN"]), float(grid["XMAX"]),
+                float(grid["YMIN"]), float(grid["YMAX"]), float(grid["t_max"]))
+    except (TypeError, ValueError) as e:
+        raise ConfigError(f"Invalid grid value: {e}")
+
+
+def build_model(config, grid):
+    """(VEL_P, VEL_S, RHO, source_x, source_y) from the layers or the event of a config"""
+    NX, NY, XMIN, XMAX, YMIN, YMAX, t_max = grid
+    if ("layers" in config) == ("event" in config):
+        raise ConfigError("Set exactly one of 'layers' and 'event'")
+
+    if "layers" in config:
+        try:
+            layers = [(int(from_val), int(to_val), material) for from_val, to_val, material in config["layers"]]
+            check_layers(layers, NY)
+        except (TypeError, ValueError) as e:
+            raise ConfigError(f"Invalid layers: {e}")
+        VEL_P, VEL_S = layer_profiles(layers, NY)
+        RHO = np.full(NY, 1000.0)  # constant, like the synthetic GUI
+        source_x, source_y = NX//4, NY//2
+    else:
+        event = config["event"]
+        if "id" in event:
+            from catalog_store import CatalogStore
+            event = CatalogStore(fetcher=None).event(event["id"])
+            if event is None:
+                raise ConfigError(f"Event {config['event']['id']} is not in the local catalog")
+        if any(key not in event for key in ("latitude", "longitude", "depth")):
+            raise ConfigError("'event' needs an id or latitude, longitude and depth")
+
+        from realdata_process import RealDataProcess
+        real_data_processing = RealDataProcess(event["latitude"], event["longitude"], event["depth"], NX, NY, XMIN, XMAX, YMIN, YMAX)
+        real_data_processing.process()
+        if config.get("lateral", False):
+            real_data_processing.calculate_section()
+        else:
+            real_data_processing.calculate()
+        VEL_P, VEL_S, RHO = real_data_processing.VEL_P, real_data_processing.VEL_S, real_data_processing.RHO
+        source_x, source_y = real_data_processing.source_x, real_data_processing.source_y
+
+    if "source" in config:
+        source_x, source_y = (int(v) for v in config["source"])
+    if not (0 < source_x < NX - 1 and 0 < source_y < NY - 1):
+        raise ConfigError(f"Source ({source_x}, {source_y}) is outside the grid interior")
+
+    return (as_medium(VEL_P, NX, NY), as_medium(VEL_S, NX, NY), as_medium(RHO, NX, NY),
+            int(source_x), int(source_y))
+
+
+def simulate(solver, grid, model, name, video, dtype="float64", diagnostics=False, refine=None, fault=None):
+    """Run one solver headless, or through its animation when a video is wanted"""
+    NX, NY, XMIN, XMAX, YMIN, YMAX, t_max = grid
+    VEL_P, VEL_S, RHO, source_x, source_y = model
+    if solver.startswith("seismogram") or not diagnostics:
+        reducers = []
+    else:
+        from diagnostics import default_reducers
+        reducers = default_reducers("s_wave" if solver.startswith("s_wave") else solver)
+    source = None
+    if fault:
+        from sources import line_fault
+        DT = 0.001
+        source = line_fault(fault["start"], fault["end"], len(np.arange(0, t_max, DT)), DT, (XMAX - XMIN) / NX, (YMAX - YMIN) / NY,
+                            f0=15.0 if solver.startswith("s_wave") else 20.0, rupture_velocity=fault.get("rupture_velocity", 2500.0))
+
+    if solver == "p_wave_disp":
+        from P_wave_disp import PWaveDisplacement
+        window = PWaveDisplacement(NX, NY, XMIN, XMAX, YMIN, YMAX, t_max, VEL_P, RHO, name, source_x, source_y, dtype=dtype, reducers=reducers,
+                                   source=source)
+        window.run_wavelet_eq()
+        window.create_figure() if video else window.run()
+        return with_diagnostics({"arrays": {"ux": window.ux, "uy": window.uy}, "files": {"video": name+"_test_disp_wave1.mp4"} if video else {}}, reducers)
+
+    if solver == "p_wave_pressure":
+        from P_wave_pressure import PWavePressure
+        window = PWavePressure(NX, NY, XMIN, XMAX, YMIN, YMAX, t_max, VEL_P, RHO, name, source_x, source_y, dtype=dtype, reducers=reducers,
+                               source=source)
+        window.run_wavelet_eq()
+        window.create_figure() if video else window.run()
+        return with_diagnostics({"arrays": {"phi": window.phi}, "files": {"video": name+"_test_p_wave1.mp4"} if video else {}}, reducers)
+
+    if solver in ("s_wave_displacement", "s_wave_stress"):
+        if refine:
+            from nested_grid import NestedSWave
+            try:
+                window = NestedSWave(NX, NY, XMIN, XMAX, YMIN, YMAX, t_max, VEL_S, RHO, name, source_x, source_y,
+                                     ratio=refine, dtype=dtype, reducers=reducers)
+            except ValueError as e:  # source too close to the edges for the patch
+                raise ConfigError(f"Invalid 'refine': {e}")
+        else:
+            from S_wave import SWave
+            window = SWave(NX, NY, XMIN, XMAX, YMIN, YMAX, t_max, VEL_S, RHO, name, source_x, source_y, dtype=dtype, reducers=reducers,
+                           source=source)
+        window.run_wavelet_eq()
+        if not video:
+            window.run()
+        elif solver == "s_wave_displacement":
+            window.create_figure_displacement()
+        else:
+            window.create_figure_stress()
+        values = {
+            "seismic_moment": window.get_seismic_moment(),
+            "magnitude": window.get_moment_magnitude_scale() if window.M0 > 0 else None,
+        }
+        values["energy"] = window.get_energy_released() if values["magnitude"] is not None else None
+        video_file = name+"_test_s_wave1.mp4" if solver == "s_wave_displacement" else name+"_test_s_wave_stress_2.mp4"
+        return with_diagnostics({"values": values, "arrays": {"ux": window.ux, "uy": window.uy, "tau_xy": window.tau_xy},
+                                 "files": {"video": video_file} if video else {}}, reducers)
+
+    from seismogram import Seismogram
+    window = Seismogram(NX, NY, XMIN, XMAX, t_max, VEL_P, VEL_S, RHO, name, source_x)
+    window.compute()
+    if video:
+        window.create_combined_figure() if solver == "seismogram_combined" else window.create_separated_figure()
+    else:
+        window.telemetry.finish()
+    video_file = name+"_combined_seismogram.mp4" if solver == "seismogram_combined" else name+"_separated_seismogram.mp4"
+    arrays = {"time": window.time, "p": window.seismogram_p, "s": window.seismogram_s, "combined": window.combined_seismogram}
+    return {"arrays": arrays, "files": {"video": video_file} if video else {}}
+
+
+def with_diagnostics(result, reducers):
+    """Result of simulate() with the values and arrays of the diagnostics reducers added"""
+    from diagnostics import summarize
+    values, arrays = summarize(reducers)
+    result.setdefault("values", {}).update(values)
+    result["arrays"].update(arrays)
+    return result
+
+
+def json_value(value):
+    """JSON friendly scalar: numpy types unwrapped, NaN and infinity as null"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def run_config(config):
+    """Run the simulation of a config dict and return the JSON result"""
+    grid = parse_grid(config)
+    solver = config.get("solver")
+    if solver not in SOLVERS:
+        raise ConfigError(f"'solver' must be one of {', '.join(SOLVERS)}")
+    outputs = config.get("outputs", [])
+    if any(output not in OUTPUTS for output in outputs):
+        raise ConfigError(f"'outputs' may contain {', '.join(OUTPUTS)}")
+    dtype = config.get("dtype", "float64")
+    if dtype not in DTYPES:
+        raise ConfigError(f"'dtype' must be one of {', '.join(DTYPES)}")
+    refine = config.get("refine")
+    if refine is not None and (not solver.startswith("s_wave") or not isinstance(refine, int) or refine < 1 or refine % 2 == 0):
+        raise ConfigError("'refine' must be an odd integer and needs an S-wave solver")
+    fault = config.get("fault")
+    if fault is not None:
+        if solver.startswith("seismogram") or refine:
+            raise ConfigError("'fault' needs a wave solver without 'refine'")
+        if not isinstance(fault, dict) or not all(len(fault.get(key, [])) == 2 for key in ("start", "end")):
+            raise ConfigError("'fault' needs 'start' and 'end' grid indices [x, y]")
+    name = config.get("name", "cli")
+    output_dir = config.get("output_dir", ".")
+    video = "video" in outputs
+
+    plan = plan_run(solver, grid[0], grid[1], grid[6], dtype, lateral=config.get("lateral", False), video=video,
+                    snapshots=1 if "fields" in outputs else 0)
+    if plan["status"] == "refuse" and config.get("check_memory", True):
+        options = "; ".join(describe(option) for option in suggest(plan))
+        raise ConfigError(f"Not enough memory for {describe(plan)}" + (f". Fits: {options}" if options else ""))
+
+    model = build_model(config, grid)
+    start = time.perf_counter()
+    inputs = {
+        "grid": grid,
+        "VEL_P": model[0],
+        "VEL_S": model[1],
+        "RHO": model[2],
+        "source": model[3:],
+    }
+    if dtype != "float64":
+        inputs["dtype"] = dtype  # float64 runs share their cache entries with the GUI
+    diagnostics = bool(config.get("diagnostics", False))
+    if diagnostics:
+        inputs["diagnostics"] = True
+    if refine:
+        inputs["refine"] = refine
+    if fault:
+        inputs["fault"] = fault
+    compute = lambda: simulate(solver, grid, model, name, video, dtype, diagnostics, refine, fault)
+    if config.get("cache", True):
+        # the GUI kinds always carry a video, headless runs are stored separately
+        result = ResultCache().run(solver if video else solver + "_headless", inputs, compute)
+    else:
+        result = compute()
+
+    os.makedirs(output_dir, exist_ok=True)
+    files = {}
+    if "fields" in outputs:
+        files["fields"] = os.path.join(output_dir, f"{name}_{solver}.npz")
+        np.savez(files["fields"], **result.get("arrays", {}))
+    if video:
+        files["video"] = os.path.join(output_dir, f"{name}_{solver}.mp4")
+        if os.path.abspath(result["files"]["video"]) != os.path.abspath(files["video"]):
+            shutil.copy2(result["files"]["video"], files["video"])
+
+    return {
+        "status": "ok",
+        "solver": solver,
+        "name": name,
+        "grid": dict(zip(GRID_KEYS, grid)),
+        "source": list(model[3:]),
+        "dtype": dtype,
+        "estimate": {"peak_mb": plan["peak_bytes"] / 2**20, "runtime_s": plan["runtime_s"]},
+        "values": {key: json_value(value) for key, value in result.get("values", {}).items()},
+        "files": files,
+        "runtime_s": time.perf_counter() - start,
+    }
+
+
+def error_result(e):
+    return {"status": "error", "error": f"{type(e).__name__}: {e}"}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a seismic simulation from a JSON or TOML config file")
+    parser.add_argument("config")
+    args = parser.parse_args(argv)
+
+    try:
+        config = load_config(args.config)
+    except (OSError, ValueError) as e:  # missing file, JSON/TOML syntax error
+        print(json.dumps(error_result(e), indent=2))
+        return EXIT_CONFIG
+
+    try:
+        # keep stdout for the JSON result, anything the solvers print goes to stderr
+        with contextlib.redirect_stdout(sys.stderr):
+            result = run_config(config)
+        code = EXIT_OK
+    except ConfigError as e:
+        result, code = error_result(e), EXIT_CONFIG
+    except Exception as e:
+        result, code = error_result(e), EXIT_FAILED
+
+    print(json.dumps(result, indent=2))
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Local stand-in for the ComCat FDSN event endpoint, serving a fixed set of events as
+GeoJSON, to exercise the catalog fetcher without network access. Run from the GUI folder:
+    python comcat_standin.py [events.csv] [--port 8080] [--latency 0.05]
+and point the fetcher at it with base_url=... or the COMCAT_URL environment variable.
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+
+from catalog_store import COLUMNS, to_ms
+
+
+def synthetic_catalog(start, end, n_events, seed=0):
+    """Random summary dataframe of n_events events between start and end"""
+    rng = np.random.default_rng(seed)
+    times = np.sort(rng.integers(to_ms(start), to_ms(end), n_events))
+    return pd.DataFrame({
+        "id": [f"st{i:08d}" for i in range(n_events)],
+        "time": pd.to_datetime(times, unit="ms"),
+        "location": "Stand-in region",
+        "latitude": rng.uniform(-60, 60, n_events),
+        "longitude": rng.uniform(-180, 180, n_events),
+        "depth": rng.uniform(0, 100, n_events),
+        "magnitude": np.round(rng.exponential(0.8, n_events) + 2.0, 1),
+        "alert": None,
+        "url": "",
+        "eventtype": "earthquake",
+        "significance": rng.integers(0, 1000, n_events),
+    }, columns=COLUMNS)
+
+
+class StandInComCat():
+    """
+    Threaded HTTP server answering FDSN event queries (format=geojson) with starttime,
+    endtime, minmagnitude, maxmagnitude, orderby and limit, like the real endpoint
+    (endtime inclusive). latency adds a fixed delay to every response.
+    """
+    def __init__(self, dataframe, port=0, latency=0.0):
+        dataframe = dataframe.reindex(columns=COLUMNS)
+        self.times = np.array([to_ms(t) for t in dataframe["time"]], dtype=np.int64)
+        self.dataframe = dataframe
+        self.latency = latency
+        self.requests = 0
+
+        # GeoJSON features are built once, a request only selects from them
+        self.features = []
+        for i, row in enumerate(dataframe.itertuples(index=False)):
+            self.features.append({
+                "type": "Feature",
+                "id": row.id,
+                "properties": {
+                    "time": int(self.times[i]),
+                    "place": row.location,
+                    "mag": None if pd.isna(row.magnitude) else float(row.magnitude),
+                    "alert": row.alert,
+                    "url": row.url,
+                    "type": row.eventtype,
+                    "sig": None if pd.isna(row.significance) else int(row.significance),
+                },
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [float(row.longitude), float(row.latitude), float(row.depth)],
+                },
+            })
+
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                standin.requests += 1
+                if standin.latency:
+                    time.sleep(standin.latency)
+                query = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(self.path).query))
+                body = json.dumps(standin.feature_collection(query)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/fdsnws/event/1/query"
+
+    def feature_collection(self, query):
+        mask = np.ones(len(self.times), dtype=bool)
+        if "starttime" in query:
+            mask &= self.times >= to_ms(query["starttime"])
+        if "endtime" in query:
+            mask &= self.times <= to_ms(query["endtime"])
+        if "minmagnitude" in query:
+            mask &= self.dataframe["magnitude"].to_numpy() >= float(query["minmagnitude"])
+        if "maxmagnitude" in query:
+            mask &= self.dataframe["magnitude"].to_numpy() <= float(query["maxmagnitude"])
+
+        rows = np.flatnonzero(mask)
+        rows = rows[np.argsort(self.times[rows], kind="stable")]
+        if query.get("orderby", "time") == "time":
+            rows = rows[::-1]
+        rows = rows[:int(query.get("limit", 20000))]
+
+        features = [self.features[i] for i in rows]
+        return {"type": "FeatureCollection", "metadata": {"count": len(features)}, "features": features}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the ComCat event endpoint")
+    parser.add_argument("events", nargs="?", help="CSV export of a summary dataframe (default: synthetic events)")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.events:
+        events = pd.read_csv(args.events, parse_dates=["time"])
+    else:
+        events = synthetic_catalog("2024-01-01", "2025-01-01", 10000)
+    standin = StandInComCat(events, args.port, args.latency)
+    print(f"Serving {len(events)} events at {standin.url}")
+    standin.server.serve_forever()
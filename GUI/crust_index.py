@@ -0,0 +1,131 @@
+import os
+import numpy as np
+
+# CRUST1.0 layers (top to bottom) and their average thickness in meters
+CRUST_LAYERS = [
+    ("water", 3000),
+    ("ice", 2000),
+    ("upper_sediments", 2000),
+    ("middle_sediments", 3000),
+    ("lower_sediments", 5000),
+    ("upper_crust", 10000),
+    ("middle_crust", 15000),
+    ("lower_crust", 20000),
+]
+PROPERTIES = ("vp", "vs", "rho")
+
+DEFAULT_SOURCE_DIR = os.environ.get("CRUST_SOURCE_DIR", ".")
+DEFAULT_INDEX_PATH = os.environ.get("CRUST_INDEX_PATH", "CRUST1.0-index.npy")
+
+
+def coords_path(index_path):
+    return os.path.splitext(index_path)[0] + "-coords.npz"
+
+
+def build_crust_index(source_dir=DEFAULT_SOURCE_DIR, index_path=DEFAULT_INDEX_PATH):
+    """
+    One time conversion of the three CRUST1.0 netCDF files into a single contiguous
+    (lat x lon x layer x {vp, vs, rho}) array in the files' own units (km/s, g/cm^3),
+    plus the latitude/longitude vectors. Missing layers and masked cells are NaN.
+    """
+    import netCDF4 as nc  # only needed for the conversion
+
+    datasets = [nc.Dataset(os.path.join(source_dir, f"CRUST1.0-{prop}.r0.1.nc")) for prop in PROPERTIES]
+    try:
+        latitudes = np.asarray(datasets[0].variables['latitude'][:], dtype=float)
+        longitudes = np.asarray(datasets[0].variables['longitude'][:], dtype=float)
+
+        data = np.full((len(latitudes), len(longitudes), len(CRUST_LAYERS), len(PROPERTIES)), np.nan, dtype=np.float32)
+        for p, (prop, dataset) in enumerate(zip(PROPERTIES, datasets)):
+            for l, (layer, _) in enumerate(CRUST_LAYERS):
+                variable = dataset.variables.get(f"{layer}_{prop}", None)
+                if variable is not None:
+                    data[:, :, l, p] = np.ma.filled(np.ma.asarray(variable[:], dtype=np.float32), np.nan)
+    finally:
+        for dataset in datasets:
+            dataset.close()
+
+    np.save(index_path, data)
+    np.savez(coords_path(index_path), latitude=latitudes, longitude=longitudes)
+
+
+class CrustIndex():
+    def __init__(self, index_path=DEFAULT_INDEX_PATH):
+        # memory mapped: only the pages of the cells that are looked up get read
+        self.data = np.load(index_path, mmap_mode='r')
+        with np.load(coords_path(index_path)) as coords:
+            self.latitudes = coords['latitude']
+            self.longitudes = coords['longitude']
+
+        # CRUST1.0 is a regular grid, so a cell index is a single division
+        self.lat0, self.dlat = self.latitudes[0], self.latitudes[1] - self.latitudes[0]
+        self.lon0, self.dlon = self.longitudes[0], self.longitudes[1] - self.longitudes[0]
+        if not (np.allclose(np.diff(self.latitudes), self.dlat) and np.allclose(np.diff(self.longitudes), self.dlon)):
+            raise ValueError(f"{index_path} is not on a regular latitude/longitude grid")
+
+        self.thickness = np.array([thickness for _, thickness in CRUST_LAYERS], dtype=float)
+        self.layer_tops = np.concatenate([[0.0], np.cumsum(self.thickness)[:-1]])
+
+    def cell(self, latitude, longitude):
+        """Nearest cell (lat_idx, lon_idx) of a point, scalars or arrays, in O(1)"""
+        # ceil(x - 0.5) rounds ties down, like argmin over the coordinate vector
+        lat_idx = np.ceil((np.asarray(latitude, dtype=float) - self.lat0) / self.dlat - 0.5).astype(np.int64)
+        lat_idx = np.clip(lat_idx, 0, len(self.latitudes) - 1)
+
+        # longitudes wrap around, so -170 and 190 land in the same cell
+        lon_idx = np.ceil((np.asarray(longitude, dtype=float) - self.lon0) / self.dlon - 0.5).astype(np.int64)
+        lon_idx = np.mod(lon_idx, len(self.longitudes))
+        return lat_idx, lon_idx
+
+    def values(self, lat_idx, lon_idx):
+        """(..., layer, {vp, vs, rho}) in m/s and kg/m^3 for the given cell indices"""
+        return np.asarray(self.data[lat_idx, lon_idx], dtype=float) * 1000
+
+    def bilinear(self, latitude, longitude):
+        """
+        (..., layer, {vp, vs, rho}) bilinearly interpolated between the four surrounding
+        cell centers, for arrays of points in one batched read. Missing (NaN) neighbours
+        are left out and the remaining weights renormalized.
+        """
+        lat_pos = (np.asarray(latitude, dtype=float) - self.lat0) / self.dlat
+        lat_i0 = np.clip(np.floor(lat_pos).astype(np.int64), 0, len(self.latitudes) - 2)
+        lat_t = np.clip(lat_pos - lat_i0, 0.0, 1.0)  # clamped beyond the outermost centers
+
+        lon_pos = (np.asarray(longitude, dtype=float) - self.lon0) / self.dlon
+        lon_floor = np.floor(lon_pos)
+        lon_t = lon_pos - lon_floor
+        lon_j0 = np.mod(lon_floor.astype(np.int64), len(self.longitudes))
+        lon_j1 = np.mod(lon_j0 + 1, len(self.longitudes))
+
+        # (4, n_points, layer, prop) corners and matching weights
+        corners = self.values(
+            np.stack([lat_i0, lat_i0, lat_i0 + 1, lat_i0 + 1]),
+            np.stack([lon_j0, lon_j1, lon_j0, lon_j1])
+        )
+        weights = np.stack([(1 - lat_t) * (1 - lon_t), (1 - lat_t) * lon_t, lat_t * (1 - lon_t), lat_t * lon_t])
+        weights = np.broadcast_to(weights[..., np.newaxis, np.newaxis], corners.shape)
+
+        known = np.isfinite(corners)
+        total = np.sum(np.where(known, weights, 0.0), axis=0)
+        weighted = np.sum(np.where(known, corners * weights, 0.0), axis=0)
+        result = np.full(total.shape, np.nan)
+        np.divide(weighted, total, out=result, where=total > 0)
+        return result
+
+
+_crust_index = None
+
+
+def get_crust_index(index_path=DEFAULT_INDEX_PATH, source_dir=DEFAULT_SOURCE_DIR):
+    """Process wide CRUST1.0 index, converted from the netCDF files on first use"""
+    global _crust_index
+    if _crust_index is None:
+        if not os.path.exists(index_path):
+            build_crust_index(source_dir, index_path)
+        _crust_index = CrustIndex(index_path)
+    return _crust_index
+
+
+if __name__ == "__main__":
+    build_crust_index()
+    print(f"CRUST1.0 index written to {DEFAULT_INDEX_PATH}")
@@ -0,0 +1,183 @@
+import numpy as np
+from medium import block
+
+# Running quantities computed while a solver steps, so moment and energy estimates do not
+# need stored snapshots. Pass instances to a solver (reducers=[...]); it calls start(solver)
+# once and update(solver, n) after every time step, result() gives the values at any time.
+# Energies are per meter of the (out of plane) third dimension, in J/m.
+
+
+class Reducer():
+    every = 1  # steps between two updates
+
+    def start(self, solver):
+        pass
+
+    def update(self, solver, n):
+        pass
+
+    def result(self):
+        return {}
+
+
+def displacement_fields(solver):
+    """(ux, uy) of a displacement solver, (phi,) of the pressure solver"""
+    return (solver.ux, solver.uy) if hasattr(solver, "ux") else (solver.phi,)
+
+
+def require_displacement(solver, reducer):
+    if not hasattr(solver, "ux"):
+        raise ValueError(f"{type(reducer).__name__} needs a displacement solver (PWaveDisplacement or SWave)")
+
+
+def energy_densities(solver, inv_mu=None):
+    """
+    Kinetic and strain energy density (J/m^3) of the current step. Velocities are the
+    backward difference of the displacement; strain energy is tau^2 / (2 mu) for the
+    S-wave solver (inv_mu = 1/mu, 0 in fluids) and K (div u)^2 / 2 for the P-wave one.
+    """
+    vx = (solver.ux - solver.ux_prev) / solver.DT
+    vy = (solver.uy - solver.uy_prev) / solver.DT
+    kinetic = 0.5 * solver.RHO * (vx**2 + vy**2)
+
+    if hasattr(solver, "tau_xy"):
+        strain = 0.5 * solver.tau_xy**2 * inv_mu
+    else:
+        div_u = np.zeros_like(solver.ux)
+        div_u[1:-1, 1:-1] = (
+            (solver.ux[2:, 1:-1] - solver.ux[:-2, 1:-1]) / (2 * solver.DX) +
+            solver.depth.d1(solver.uy[1:-1])
+        )
+        strain = 0.5 * solver.K * div_u**2
+    return kinetic, strain
+
+
+class PeakDisplacement(Reducer):
+    """Largest displacement magnitude (pressure for PWavePressure) every grid point reached"""
+    def __init__(self, every=1):
+        self.every = every
+
+    def start(self, solver):
+        fields = displacement_fields(solver)
+        self.name = "peak_displacement" if len(fields) == 2 else "peak_pressure"
+        # squared magnitudes in preallocated buffers, the square root is taken once in result()
+        self.peak_squared = np.zeros(fields[0].shape, fields[0].dtype)
+        self.buffers = [np.empty_like(field) for field in fields]
+
+    def update(self, solver, n):
+        if n % self.every:
+            return
+        squared = self.buffers[0]
+        for field, buffer in zip(displacement_fields(solver), self.buffers):
+            np.multiply(field, field, out=buffer)
+        for buffer in self.buffers[1:]:
+            squared += buffer
+        np.maximum(self.peak_squared, squared, out=self.peak_squared)
+
+    def result(self):
+        peak = np.sqrt(self.peak_squared)
+        return {self.name: peak, self.name + "_max": float(peak.max())}
+
+
+class EnergyBudget(Reducer):
+    """
+    Kinetic, strain and total energy every `every` steps, and the energy removed by the
+    absorbing boundary: in the damping layer a step scales the fields by d, so the energy
+    the fields had before damping was e / d^2 and e (1/d^2 - 1) left the model.
+    """
+    def __init__(self, every=5):
+        self.every = every
+
+    def start(self, solver):
+        require_displacement(solver, self)
+        self.DT = solver.DT
+        # a (NY,) profile on stretched grids (nonuniform_grid.py), whose cells differ in height
+        self.cell_area = solver.DX * solver.depth.heights
+        self.absorbing = solver.damping < 1
+        area = np.broadcast_to(self.cell_area, solver.damping.shape)[self.absorbing]
+        self.loss_factor = (1 / solver.damping[self.absorbing].astype(float)**2 - 1) * area
+        self.inv_mu = None
+        if hasattr(solver, "tau_xy"):
+            # fluids (mu = 0) store no strain energy
+            self.inv_mu = np.divide(1.0, solver.MU, out=np.zeros(solver.MU.shape), where=solver.MU > 0)
+        self.steps, self.kinetic, self.strain, self.boundary_loss = [], [], [], []
+        self.absorbed = 0.0
+
+    def update(self, solver, n):
+        if n % self.every:
+            return
+        kinetic, strain = energy_densities(solver, self.inv_mu)
+        density = kinetic + strain
+        # sampled every `every` steps, so every sample stands for that many steps of loss
+        self.absorbed += self.every * float(np.sum(density[self.absorbing] * self.loss_factor))
+        self.steps.append(n)
+        self.kinetic.append(float(np.sum(kinetic * self.cell_area)))
+        self.strain.append(float(np.sum(strain * self.cell_area)))
+        self.boundary_loss.append(self.absorbed)
+
+    def result(self):
+        kinetic, strain = np.array(self.kinetic), np.array(self.strain)
+        total = kinetic + strain
+        return {
+            "energy_time": np.array(self.steps) * self.DT,
+            "kinetic_energy": kinetic,
+            "strain_energy": strain,
+            "total_energy": total,
+            "boundary_loss": np.array(self.boundary_loss),
+            "max_total_energy": float(total.max()) if len(total) else 0.0,
+            "final_total_energy": float(total[-1]) if len(total) else 0.0,
+            "boundary_loss_total": self.absorbed,
+        }
+
+
+class RuptureSlip(Reducer):
+    """
+    Peak and time-integrated slip (displacement magnitude) in the (2 radius)^2 rupture
+    zone around the source. The seismic moment uses the peak slip of every point instead
+    of the final snapshot that SWave.get_seismic_moment looks at.
+    """
+    def __init__(self, radius=5):
+        self.radius = radius
+
+    def start(self, solver):
+        require_displacement(solver, self)
+        x_start, x_end = solver.source_x - self.radius, solver.source_x + self.radius
+        y_start, y_end = solver.source_y - self.radius, solver.source_y + self.radius
+        self.window = (slice(x_start, x_end), slice(y_start, y_end))
+        self.DT = solver.DT
+        self.area = ((2 * self.radius) * solver.DX)**2
+        # shear modulus of the zone, only the S-wave solver has one
+        self.mu_avg = float(np.mean(block(solver.MU, x_start, x_end, y_start, y_end))) if hasattr(solver, "MU") else None
+        shape = solver.ux[self.window].shape
+        self.peak_slip = np.zeros(shape)
+        self.integrated_slip = np.zeros(shape)
+
+    def update(self, solver, n):
+        slip = np.hypot(solver.ux[self.window], solver.uy[self.window])
+        np.maximum(self.peak_slip, slip, out=self.peak_slip)
+        self.integrated_slip += slip * self.DT
+
+    def result(self):
+        mean_slip = float(np.mean(self.peak_slip))
+        return {
+            "peak_slip": self.peak_slip,
+            "integrated_slip": self.integrated_slip,
+            "mean_peak_slip": mean_slip,
+            "rupture_moment": self.mu_avg * mean_slip * self.area if self.mu_avg is not None else None,
+        }
+
+
+def default_reducers(solver_kind):
+    """The reducers that apply to a solver ("p_wave_disp", "p_wave_pressure" or "s_wave")"""
+    if solver_kind == "p_wave_pressure":
+        return [PeakDisplacement()]
+    return [PeakDisplacement(), EnergyBudget(), RuptureSlip()]
+
+
+def summarize(reducers):
+    """Results of all reducers, split into (scalar values, arrays)"""
+    values, arrays = {}, {}
+    for reducer in reducers:
+        for key, value in reducer.result().items():
+            (arrays if isinstance(value, np.ndarray) else values)[key] = value
+    return values, arrays
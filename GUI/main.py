@@ -1,41 +1,10 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import numpy as np
-from P_wave_disp import PWaveDisplacement
-from P_wave_pressure import PWavePressure
-from S_wave import SWave
-from seismogram import Seismogram
-from show_video import VideoPlayer
-
-# ===== Materials List =====
-materials = [
-    "Air", "Water", "Ice", "Oil", "Vegetal Soil", "Dry Sands", "Wet Sands",
-    "Saturated Shales and Clays", "Porous and Saturated Sandstones", "Marls",
-    "Chalk", "Coal", "Salt", "Anhydrites", "Limestones", "Dolomites",
-    "Granite", "Basalt", "Gneiss"
-]
-
-materials_dict = {
-    "Air" : (343, 0),
-    "Water" : (1500,0), 
-    "Ice" : (3800, 1900), 
-    "Oil" : (1250, 0), 
-    "Vegetal Soil" :(700, 300), 
-    "Dry Sands":(1200, 500), 
-    "Wet Sands":(2000,600),
-    "Saturated Shales and Clays" :(2500,800), 
-    "Porous and Saturated Sandstones" :(3500,1800), 
-    "Marls":(3000, 1500),
-    "Chalk":(2600, 1300), 
-    "Coal":(2700, 1400), 
-    "Salt":(5500,3100), 
-    "Anhydrites":(5500, 3100), 
-    "Limestones":(6000, 3300), 
-    "Dolomites":(6500,3600),
-    "Granite":(6000, 3300), 
-    "Basalt":(6000, 3400), 
-    "Gneiss":(5200, 3200)
-}
+from result_cache import ResultCache
+from stability import SimulationUnstable
+from memory_planner import plan_run, suggest, describe
+from materials import materials, layer_profiles, check_layers
 
 # ===== Main Application Class =====
 class MainApp(tk.Tk):
@@ -90,6 +59,8 @@ class MainApp(tk.Tk):
         self.has_submit_input = False
         self.has_submit_material = False
         self.material_list = []
+        self.cache = ResultCache()
+        self.dtype = "float64"  # float32 when the grid only fits that way
 
         self.create_widgets()
 
@@ -163,57 +134,106 @@ class MainApp(tk.Tk):
         """Update the material submission status."""
         self.has_submit_material = True
         text = ""
-        self.VEL_P = np.zeros((self.NX, self.NY))
-        self.VEL_S = np.zeros((self.NX, self.NY))
+        # layers only vary with depth, so the materials are stored as NY depth profiles
+        self.VEL_P, self.VEL_S = layer_profiles(self.material_list, self.NY)
         self.source_x, self.source_y = self.NX//4, self.NY//2  # Source position
-        self.rho = np.ones((self.NX, self.NY)) * 1000.0       #constant
+        self.rho = np.full(self.NY, 1000.0)       #constant
 
         for (fromval, toval, material) in self.material_list:
             text += f"Layer ({fromval} to {toval}): {material}\n"
-            self.VEL_P[:, fromval:toval] = materials_dict[material][0]
-            self.VEL_S[:, fromval:toval] = materials_dict[material][1]
 
         self.material_status_label.config(text=f"Material Status: Submitted\n{text}", fg="green")
 
 
+    def simulation_inputs(self):
+        """Everything that determines the simulation output, used as the cache key"""
+        inputs = {
+            "grid": (self.NX, self.NY, self.XMIN, self.XMAX, self.YMIN, self.YMAX, self.t_max),
+            "VEL_P": self.VEL_P,
+            "VEL_S": self.VEL_S,
+            "RHO": self.rho,
+            "source": (self.source_x, self.source_y),
+        }
+        if self.dtype != "float64":
+            inputs["dtype"] = self.dtype  # float64 runs keep their existing cache entries
+        return inputs
+
+    def run_simulation(self, kind, compute):
+        """Cached run of compute(), None (after telling the user) if the simulation blew up"""
+        try:
+            return self.cache.run(kind, self.simulation_inputs(), compute)
+        except SimulationUnstable as e:
+            messagebox.showerror("Simulation Unstable", str(e))
+            return None
+
+    def show_video(self, path):
+        # the solvers, the video player (cv2, PIL) and the real data model (obspy, geopy) are
+        # imported when first used, so the main window opens without loading them
+        from show_video import VideoPlayer
+        return VideoPlayer(self, path)
+
     def open_Pwave_displacement(self):
         if not self.has_submit_input or not self.has_submit_material: 
             messagebox.showerror("Error", "Please submit the input and materials first.")
             return
 
-        window = PWaveDisplacement(self.NX, self.NY, self.XMIN, self.XMAX, self.YMIN, self.YMAX, self.t_max, self.VEL_P, self.rho, "synthethic", self.source_x, self.source_y)
-        window.run_wavelet_eq()
-        window.create_figure()
+        def compute():
+            from P_wave_disp import PWaveDisplacement
+            window = PWaveDisplacement(self.NX, self.NY, self.XMIN, self.XMAX, self.YMIN, self.YMAX, self.t_max, self.VEL_P, self.rho, "synthethic", self.source_x, self.source_y, dtype=self.dtype)
+            window.run_wavelet_eq()
+            window.create_figure()
+            return {"arrays": {"ux": window.ux, "uy": window.uy}, "files": {"video": "synthethic_test_disp_wave1.mp4"}}
 
-        video_window = VideoPlayer(self, "synthethic_test_disp_wave1.mp4")
+        result = self.run_simulation("p_wave_disp", compute)
+        if result is None:
+            return
+        video_window = self.show_video(result["files"]["video"])
 
     def open_Pwave_pressure(self):
         if not self.has_submit_input or not self.has_submit_material: 
             messagebox.showerror("Error", "Please submit the input and materials first.")
             return
 
-        window = PWavePressure(self.NX, self.NY, self.XMIN, self.XMAX, self.YMIN, self.YMAX, self.t_max, self.VEL_P,self.rho, "synthethic", self.source_x, self.source_y)
-        window.run_wavelet_eq()
-        window.create_figure()
+        def compute():
+            from P_wave_pressure import PWavePressure
+            window = PWavePressure(self.NX, self.NY, self.XMIN, self.XMAX, self.YMIN, self.YMAX, self.t_max, self.VEL_P,self.rho, "synthethic", self.source_x, self.source_y, dtype=self.dtype)
+            window.run_wavelet_eq()
+            window.create_figure()
+            return {"arrays": {"phi": window.phi}, "files": {"video": "synthethic_test_p_wave1.mp4"}}
 
-        video_window = VideoPlayer(self, "synthethic_test_p_wave1.mp4")
+        result = self.run_simulation("p_wave_pressure", compute)
+        if result is None:
+            return
+        video_window = self.show_video(result["files"]["video"])
     
     def open_Swave_displacement(self):
         if not self.has_submit_input or not self.has_submit_material: 
             messagebox.showerror("Error", "Please submit the input and materials first.")
             return
 
-        window = SWave(self.NX, self.NY, self.XMIN, self.XMAX, self.YMIN, self.YMAX, self.t_max, self.VEL_S, self.rho,"synthethic", self.source_x, self.source_y)
-        window.run_wavelet_eq()
-        window.create_figure_displacement()
-
-        seismic_moment = window.get_seismic_moment()
-        magnitude = window.get_moment_magnitude_scale()
-        energy = window.get_energy_released()
+        def compute():
+            from S_wave import SWave
+            window = SWave(self.NX, self.NY, self.XMIN, self.XMAX, self.YMIN, self.YMAX, self.t_max, self.VEL_S, self.rho,"synthethic", self.source_x, self.source_y, dtype=self.dtype)
+            window.run_wavelet_eq()
+            window.create_figure_displacement()
+
+            values = {
+                "seismic_moment": window.get_seismic_moment(),
+                "magnitude": window.get_moment_magnitude_scale(),
+                "energy": window.get_energy_released(),
+            }
+            return {"values": values, "arrays": {"ux": window.ux, "uy": window.uy}, "files": {"video": "synthethic_test_s_wave1.mp4"}}
+
+        result = self.run_simulation("s_wave_displacement", compute)
+        if result is None:
+            return
+        seismic_moment = result["values"]["seismic_moment"]
+        magnitude = result["values"]["magnitude"]
+        energy = result["values"]["energy"]
         self.info_label.config(text=f"Seismic moment = {seismic_moment} \nMagnitude = {magnitude} \nEnergy Released= {energy}")
         print(f"Seismic moment = {seismic_moment} \nMagnitude = {magnitude} \nEnergy Released= {energy}")
 
-        video_window = VideoPlayer(self, "synthethic_test_s_wave1.mp4")
+        video_window = self.show_video(result["files"]["video"])
 
 
     def open_Swave_pressure(self):
@@ -221,33 +241,47 @@ class MainApp(tk.Tk):
             messagebox.showerror("Error", "Please submit the input and materials first.")
             return
 
-        window = SWave(self.NX, self.NY, self.XMIN, self.XMAX, self.YMIN, self.YMAX, self.t_max, self.VEL_S, self.rho, "synthethic", self.source_x, self.source_y)
-        window.run_wavelet_eq()
-        window.create_figure_stress()
+        def compute():
+            from S_wave import SWave
+            window = SWave(self.NX, self.NY, self.XMIN, self.XMAX, self.YMIN, self.YMAX, self.t_max, self.VEL_S, self.rho, "synthethic", self.source_x, self.source_y, dtype=self.dtype)
+            window.run_wavelet_eq()
+            window.create_figure_stress()
+            return {"arrays": {"tau_xy": window.tau_xy}, "files": {"video": "synthethic_test_s_wave_stress_2.mp4"}}
 
-        video_window = VideoPlayer(self, "synthethic_test_s_wave_stress_2.mp4")
+        result = self.run_simulation("s_wave_stress", compute)
+        if result is None:
+            return
+        video_window = self.show_video(result["files"]["video"])
 
     def open_seis_combined(self):
         if not self.has_submit_input or not self.has_submit_material: 
             messagebox.showerror("Error", "Please submit the input and materials first.")
             return
 
-        window = Seismogram(self.NX, self.NY, self.XMIN, self.XMAX, self.t_max, self.VEL_P, self.VEL_S, self.rho, "synthethic", self.source_x)
-        window.compute()
-        window.create_combined_figure()
+        def compute():
+            from seismogram import Seismogram
+            window = Seismogram(self.NX, self.NY, self.XMIN, self.XMAX, self.t_max, self.VEL_P, self.VEL_S, self.rho, "synthethic", self.source_x)
+            window.compute()
+            window.create_combined_figure()
+            return {"arrays": {"combined": window.combined_seismogram}, "files": {"video": "synthethic_combined_seismogram.mp4"}}
 
-        video_window = VideoPlayer(self, "synthethic_combined_seismogram.mp4")
+        result = self.cache.run("seismogram_combined", self.simulation_inputs(), compute)
+        video_window = self.show_video(result["files"]["video"])
 
     def open_seis_separated(self):
         if not self.has_submit_input or not self.has_submit_material: 
             messagebox.showerror("Error", "Please submit the input and materials first.")
             return
 
-        window = Seismogram(self.NX, self.NY, self.XMIN, self.XMAX, self.t_max, self.VEL_P, self.VEL_S, self.rho,"synthethic", self.source_x)
-        window.compute()
-        window.create_separated_figure()
+        def compute():
+            from seismogram import Seismogram
+            window = Seismogram(self.NX, self.NY, self.XMIN, self.XMAX, self.t_max, self.VEL_P, self.VEL_S, self.rho,"synthethic", self.source_x)
+            window.compute()
+            window.create_separated_figure()
+            return {"arrays": {"p": window.seismogram_p, "s": window.seismogram_s}, "files": {"video": "synthethic_separated_seismogram.mp4"}}
 
-        video_window = VideoPlayer(self, "synthethic_separated_seismogram.mp4")
+        result = self.cache.run("seismogram_separated", self.simulation_inputs(), compute)
+        video_window = self.show_video(result["files"]["video"])
 
     
 
@@ -297,6 +331,9 @@ class InputFrame(tk.Frame):
             self.master.master.t_max = float(self.entries["t_max"].get())
             self.master.master.density = float(self.entries["density"].get())
 
+            if not self.check_memory():
+                return
+
             print("NX =", self.master.master.NX)
             print("NY =", self.master.master.NY)
             print("XMIN =", self.master.master.XMIN)
@@ -312,6 +349,27 @@ class InputFrame(tk.Frame):
         except ValueError:
             messagebox.showerror("Error", "Please enter valid numeric values.")
 
+    def check_memory(self):
+        """Refuse grids whose heaviest run (S-wave video) does not fit in memory, offering one that does"""
+        app = self.master.master
+        app.dtype = "float64"
+        plan = plan_run("s_wave_displacement", app.NX, app.NY, app.t_max)
+        if plan["status"] == "warn":
+            return messagebox.askokcancel("Large Simulation", f"S-wave simulation with {describe(plan)}.\n\nContinue?")
+        if plan["status"] == "refuse":
+            options = suggest(plan)
+            if not options:
+                messagebox.showerror("Not Enough Memory", f"S-wave simulation with {describe(plan)}.")
+                return False
+            option = options[0]
+            if not messagebox.askyesno("Not Enough Memory", f"S-wave simulation with {describe(plan)}.\n\nUse {describe(option)} instead?"):
+                return False
+            app.NX, app.NY, app.dtype = option["NX"], option["NY"], option["dtype"]
+            for key in ("nx", "ny"):
+                self.entries[key].delete(0, tk.END)
+                self.entries[key].insert(0, str(option[key.upper()]))
+        return True
+
 
 class InputWindow(tk.Toplevel):
     def __init__(self, master):
@@ -388,24 +446,14 @@ class MaterialFrame(tk.Frame):
 
     def validate_and_send(self):
         try:
-            maximum_layer = 0
-            minimum_layer = self.NY
-
             for i, (from_entry, to_entry, dropdown) in enumerate(self.rows):
                 from_val = int(from_entry.get())
                 to_val = int(to_entry.get())
-                maximum_layer = max(to_val, maximum_layer)
-                minimum_layer = min(from_val, minimum_layer)
-
-                if to_val > self.NY:
-                    raise ValueError(f"Row {i+1}: 'To' height ({to_val}) exceeds NY ({self.NY})")
-
                 material = dropdown.get()
                 print(f"Layer {i+1}: From {from_val} To {to_val} - {material}")
                 self.master.master.material_list.append((from_val, to_val, material))
 
-            if maximum_layer < self.NY or minimum_layer > 0:
-                raise ValueError(f"All vertical layer height up to NY must have material specification.")
+            check_layers(self.master.master.material_list, self.NY)
 
             messagebox.showinfo("Success", "All layers are valid and printed to console.")
             self.master.master.update_material_status()  # Update the status in the main app
@@ -1,16 +1,11 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import numpy as np
-from libcomcat.dataframes import get_summary_data_frame
-from libcomcat.search import search, get_event_by_id
 from datetime import datetime
-import netCDF4 as nc
-from P_wave_disp import PWaveDisplacement
-from P_wave_pressure import PWavePressure
-from S_wave import SWave
-from seismogram import Seismogram
-from show_video import VideoPlayer
-from realdata_process import RealDataProcess
+from result_cache import ResultCache
+from stability import SimulationUnstable
+from memory_planner import plan_run, suggest, describe
+from medium import as_medium
 
 # ===== Main Application Class =====
 class MainApp(tk.Tk):
@@ -65,6 +60,10 @@ class MainApp(tk.Tk):
         self.has_submit_input = False
         self.has_submit_material = False
         self.material_list = []
+        self.lateral_section = False
+        self.cache = ResultCache()
+        self.dtype = "float64"  # float32 when the grid only fits that way
+        self._catalog = None  # local event catalog, opened by the first event search
 
         self.create_widgets()
 
@@ -124,6 +123,26 @@ class MainApp(tk.Tk):
         else:
             messagebox.showerror("Error", "Real Data Window is already open.")
 
+    def check_memory(self, lateral=False):
+        """
+        Plan the heaviest run (S-wave video) on the submitted grid, lateral with the grids of a
+        laterally varying model. Asks before large runs and offers a grid that fits when it
+        does not, switching NX, NY and dtype to it; False when the user declines.
+        """
+        plan = plan_run("s_wave_displacement", self.NX, self.NY, self.t_max, self.dtype, lateral=lateral)
+        if plan["status"] == "warn":
+            return messagebox.askokcancel("Large Simulation", f"S-wave simulation with {describe(plan)}.\n\nContinue?")
+        if plan["status"] == "refuse":
+            options = suggest(plan)
+            if not options:
+                messagebox.showerror("Not Enough Memory", f"S-wave simulation with {describe(plan)}.")
+                return False
+            option = options[0]
+            if not messagebox.askyesno("Not Enough Memory", f"S-wave simulation with {describe(plan)}.\n\nUse {describe(option)} instead?"):
+                return False
+            self.NX, self.NY, self.dtype = option["NX"], option["NY"], option["dtype"]
+        return True
+
     def update_input_status(self):
         """Update the input submission status."""
         self.has_submit_input = True
@@ -137,80 +156,163 @@ class MainApp(tk.Tk):
         text = f"Location: {self.data_dict['location']} \nLatitude: {self.data_dict['latitude']} \nLongitude: {self.data_dict['longitude']} \nDepth: {self.data_dict['depth']} \nMagnitude: {self.data_dict['magnitude']}"
         self.material_status_label.config(text=f"Material Status: Submitted\n{text}", fg="green")
 
-        real_data_processing = RealDataProcess(self.data_dict['latitude'], self.data_dict['longitude'], self.data_dict['depth'], self.NX, self.NY, self.XMIN, self.XMAX, self.YMIN, self.YMAX)
-        real_data_processing.process()
-        real_data_processing.calculate()
-        self.source_x = real_data_processing.source_x
-        self.source_y = real_data_processing.source_y
-        self.VEL_S = real_data_processing.VEL_S
-        self.VEL_P = real_data_processing.VEL_P
-        self.RHO = real_data_processing.RHO
+        def compute():
+            from realdata_process import RealDataProcess
+            real_data_processing = RealDataProcess(self.data_dict['latitude'], self.data_dict['longitude'], self.data_dict['depth'], self.NX, self.NY, self.XMIN, self.XMAX, self.YMIN, self.YMAX)
+            real_data_processing.process()
+            if self.lateral_section:
+                real_data_processing.calculate_section()
+            else:
+                real_data_processing.calculate()
+            values = {"source_x": real_data_processing.source_x, "source_y": real_data_processing.source_y}
+            # (1, NY) profiles unless the model varies laterally
+            arrays = {
+                "VEL_P": as_medium(real_data_processing.VEL_P, self.NX, self.NY),
+                "VEL_S": as_medium(real_data_processing.VEL_S, self.NX, self.NY),
+                "RHO": as_medium(real_data_processing.RHO, self.NX, self.NY),
+            }
+            return {"values": values, "arrays": arrays}
+
+        event = (self.data_dict['latitude'], self.data_dict['longitude'], self.data_dict['depth'])
+        grid = (self.NX, self.NY, self.XMIN, self.XMAX, self.YMIN, self.YMAX)
+        model = self.cache.run("real_data_model", {"event": event, "grid": grid, "lateral": self.lateral_section}, compute)
+        self.source_x = model["values"]["source_x"]
+        self.source_y = model["values"]["source_y"]
+        self.VEL_S = model["arrays"]["VEL_S"]
+        self.VEL_P = model["arrays"]["VEL_P"]
+        self.RHO = model["arrays"]["RHO"]
+
+    def simulation_inputs(self):
+        """Everything that determines the simulation output, used as the cache key"""
+        inputs = {
+            "grid": (self.NX, self.NY, self.XMIN, self.XMAX, self.YMIN, self.YMAX, self.t_max),
+            "VEL_P": self.VEL_P,
+            "VEL_S": self.VEL_S,
+            "RHO": self.RHO,
+            "source": (self.source_x, self.source_y),
+        }
+        if self.dtype != "float64":
+            inputs["dtype"] = self.dtype  # float64 runs keep their existing cache entries
+        return inputs
+
+    def run_simulation(self, kind, compute):
+        """Cached run of compute(), None (after telling the user) if the simulation blew up"""
+        try:
+            return self.cache.run(kind, self.simulation_inputs(), compute)
+        except SimulationUnstable as e:
+            messagebox.showerror("Simulation Unstable", str(e))
+            return None
+
+    @property
+    def catalog(self):
+        if self._catalog is None:
+            from catalog_store import CatalogStore  # pandas, only needed for the event search
+            self._catalog = CatalogStore()
+        return self._catalog
+
+    def show_video(self, path):
+        # the solvers, the video player (cv2, PIL) and the real data model (obspy, geopy) are
+        # imported when first used, so the main window opens without loading them
+        from show_video import VideoPlayer
+        return VideoPlayer(self, path)
 
     def open_Pwave_displacement(self):
         if not self.has_submit_input or not self.has_submit_material: 
             messagebox.showerror("Error", "Please submit the input and materials first.")
             return
 
-        window = PWaveDisplacement(self.NX, self.NY, self.XMIN, self.XMAX, self.YMIN, self.YMAX, self.t_max, self.VEL_P, self.RHO, "real",self.source_x, self.source_y)
-        window.run_wavelet_eq()
-        window.create_figure()
+        def compute():
+            from P_wave_disp import PWaveDisplacement
+            window = PWaveDisplacement(self.NX, self.NY, self.XMIN, self.XMAX, self.YMIN, self.YMAX, self.t_max, self.VEL_P, self.RHO, "real",self.source_x, self.source_y, dtype=self.dtype)
+            window.run_wavelet_eq()
+            window.create_figure()
+            return {"arrays": {"ux": window.ux, "uy": window.uy}, "files": {"video": "real_test_disp_wave1.mp4"}}
 
-        video_window = VideoPlayer(self, "real_test_disp_wave1.mp4")
+        result = self.run_simulation("p_wave_disp", compute)
+        if result is None:
+            return
+        video_window = self.show_video(result["files"]["video"])
 
     def open_Pwave_pressure(self):
         if not self.has_submit_input or not self.has_submit_material: 
             messagebox.showerror("Error", "Please submit the input and materials first.")
             return
 
-        window = PWavePressure(self.NX, self.NY, self.XMIN, self.XMAX, self.YMIN, self.YMAX, self.t_max, self.VEL_P, self.RHO, "real",self.source_x, self.source_y)
-        window.run_wavelet_eq()
-        window.create_figure()
+        def compute():
+            from P_wave_pressure import PWavePressure
+            window = PWavePressure(self.NX, self.NY, self.XMIN, self.XMAX, self.YMIN, self.YMAX, self.t_max, self.VEL_P, self.RHO, "real",self.source_x, self.source_y, dtype=self.dtype)
+            window.run_wavelet_eq()
+            window.create_figure()
+            return {"arrays": {"phi": window.phi}, "files": {"video": "real_test_p_wave1.mp4"}}
 
-        video_window = VideoPlayer(self, "real_test_p_wave1.mp4")
+        result = self.run_simulation("p_wave_pressure", compute)
+        if result is None:
+            return
+        video_window = self.show_video(result["files"]["video"])
     
     def open_Swave_displacement(self):
         if not self.has_submit_input or not self.has_submit_material: 
             messagebox.showerror("Error", "Please submit the input and materials first.")
             return
 
-        window = SWave(self.NX, self.NY, self.XMIN, self.XMAX, self.YMIN, self.YMAX, self.t_max, self.VEL_S,self.RHO, "real",self.source_x, self.source_y)
-        window.run_wavelet_eq()
-        window.create_figure_displacement()
+        def compute():
+            from S_wave import SWave
+            window = SWave(self.NX, self.NY, self.XMIN, self.XMAX, self.YMIN, self.YMAX, self.t_max, self.VEL_S,self.RHO, "real",self.source_x, self.source_y, dtype=self.dtype)
+            window.run_wavelet_eq()
+            window.create_figure_displacement()
+            return {"arrays": {"ux": window.ux, "uy": window.uy}, "files": {"video": "real_test_s_wave1.mp4"}}
 
-        video_window = VideoPlayer(self, "real_test_s_wave1.mp4")
+        result = self.run_simulation("s_wave_displacement", compute)
+        if result is None:
+            return
+        video_window = self.show_video(result["files"]["video"])
 
     def open_Swave_pressure(self):
         if not self.has_submit_input or not self.has_submit_material: 
             messagebox.showerror("Error", "Please submit the input and materials first.")
             return
 
-        window = SWave(self.NX, self.NY, self.XMIN, self.XMAX, self.YMIN, self.YMAX, self.t_max, self.VEL_S, self.RHO, "real",self.source_x, self.source_y)
-        window.run_wavelet_eq()
-        window.create_figure_stress()
+        def compute():
+            from S_wave import SWave
+            window = SWave(self.NX, self.NY, self.XMIN, self.XMAX, self.YMIN, self.YMAX, self.t_max, self.VEL_S, self.RHO, "real",self.source_x, self.source_y, dtype=self.dtype)
+            window.run_wavelet_eq()
+            window.create_figure_stress()
+            return {"arrays": {"tau_xy": window.tau_xy}, "files": {"video": "real_test_s_wave_stress_2.mp4"}}
 
-        video_window = VideoPlayer(self, "real_test_s_wave_stress_2.mp4")
+        result = self.run_simulation("s_wave_stress", compute)
+        if result is None:
+            return
+        video_window = self.show_video(result["files"]["video"])
 
     def open_seis_combined(self):
         if not self.has_submit_input or not self.has_submit_material: 
             messagebox.showerror("Error", "Please submit the input and materials first.")
             return
 
-        window = Seismogram(self.NX, self.NY, self.XMIN, self.XMAX, self.t_max, self.VEL_P, self.VEL_S, self.RHO, "real",self.source_x)
-        window.compute()
-        window.create_combined_figure()
+        def compute():
+            from seismogram import Seismogram
+            window = Seismogram(self.NX, self.NY, self.XMIN, self.XMAX, self.t_max, self.VEL_P, self.VEL_S, self.RHO, "real",self.source_x)
+            window.compute()
+            window.create_combined_figure()
+            return {"arrays": {"combined": window.combined_seismogram}, "files": {"video": "real_combined_seismogram.mp4"}}
 
-        video_window = VideoPlayer(self, "real_combined_seismogram.mp4")
+        result = self.cache.run("seismogram_combined", self.simulation_inputs(), compute)
+        video_window = self.show_video(result["files"]["video"])
 
     def open_seis_separated(self):
         if not self.has_submit_input or not self.has_submit_material: 
             messagebox.showerror("Error", "Please submit the input and materials first.")
             return
 
-        window = Seismogram(self.NX, self.NY, self.XMIN, self.XMAX, self.t_max, self.VEL_P, self.VEL_S,self.RHO, "real",self.source_x)
-        window.compute()
-        window.create_separated_figure()
+        def compute():
+            from seismogram import Seismogram
+            window = Seismogram(self.NX, self.NY, self.XMIN, self.XMAX, self.t_max, self.VEL_P, self.VEL_S,self.RHO, "real",self.source_x)
+            window.compute()
+            window.create_separated_figure()
+            return {"arrays": {"p": window.seismogram_p, "s": window.seismogram_s}, "files": {"video": "real_separated_seismogram.mp4"}}
 
-        video_window = VideoPlayer(self, "real_separated_seismogram.mp4")
+        result = self.cache.run("seismogram_separated", self.simulation_inputs(), compute)
+        video_window = self.show_video(result["files"]["video"])
 
     def on_close(self):
         self.destroy()  # This will close all windows and end the mainloop
@@ -261,6 +363,9 @@ class InputFrame(tk.Frame):
             self.master.master.YMAX = float(self.entries["ymax"].get())
             self.master.master.t_max = float(self.entries["t_max"].get())
 
+            if not self.check_memory():
+                return
+
             print("NX =", self.master.master.NX)
             print("NY =", self.master.master.NY)
             print("XMIN =", self.master.master.XMIN)
@@ -275,6 +380,17 @@ class InputFrame(tk.Frame):
         except ValueError:
             messagebox.showerror("Error", "Please enter valid numeric values.")
 
+    def check_memory(self):
+        """Refuse grids whose heaviest run (S-wave video) does not fit in memory, offering one that does"""
+        app = self.master.master
+        app.dtype = "float64"  # a new grid, float32 only when it does not fit otherwise
+        if not app.check_memory():
+            return False
+        for key in ("nx", "ny"):
+            self.entries[key].delete(0, tk.END)
+            self.entries[key].insert(0, str(getattr(app, key.upper())))
+        return True
+
 
 class InputWindow(tk.Toplevel):
     def __init__(self, master):
@@ -312,6 +428,7 @@ class MaterialWindow(tk.Toplevel):
         self.title("Real Data Window")
         self.geometry("800x600")
         self.dataframe = None  # To store the generated dataframe
+        self.fetch = None  # Running background catalog download
 
         self.create_widgets()
 
@@ -326,42 +443,46 @@ class MaterialWindow(tk.Toplevel):
         self.end_entry = tk.Entry(self, width=25)
         self.end_entry.grid(row=1, column=1, padx=10, pady=5)
 
-        # Generate button
-        generate_btn = tk.Button(self, text="Generate Dataframe", command=self.generate_dataframe)
-        generate_btn.grid(row=2, column=0, columnspan=2, pady=10)
-
-        # Frame to hold the Treeview and scrollbars
-        tree_frame = tk.Frame(self)
-        tree_frame.grid(row=3, column=0, columnspan=2, padx=10, pady=10, sticky="nsew")
-
-        # Treeview to display the dataframe
-        self.tree = ttk.Treeview(tree_frame, columns=("Index", "ID", "Latitude", "Longitude", "Location", "Magnitude"), show="headings")
-        self.tree.heading("Index", text="Index")
-        self.tree.heading("ID", text="ID")
-        self.tree.heading("Latitude", text="Latitude")
-        self.tree.heading("Longitude", text="Longitude")
-        self.tree.heading("Location", text="Location")
-        self.tree.heading("Magnitude", text="Magnitude")
-        self.tree.pack(side="left", fill="both", expand=True)
-
-        # Add vertical scrollbar
-        v_scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)
-        v_scrollbar.pack(side="right", fill="y")
-        self.tree.configure(yscrollcommand=v_scrollbar.set)
+        # Generate button and magnitude/depth filters
+        controls = tk.Frame(self)
+        controls.grid(row=2, column=0, columnspan=2, pady=10)
+        generate_btn = tk.Button(controls, text="Generate Dataframe", command=self.generate_dataframe)
+        generate_btn.pack(side="left", padx=10)
+        tk.Label(controls, text="Min Magnitude").pack(side="left")
+        self.min_mag_entry = tk.Entry(controls, width=6)
+        self.min_mag_entry.pack(side="left", padx=5)
+        tk.Label(controls, text="Max Depth (km)").pack(side="left")
+        self.max_depth_entry = tk.Entry(controls, width=6)
+        self.max_depth_entry.pack(side="left", padx=5)
+        filter_btn = tk.Button(controls, text="Apply Filter", command=self.apply_filter)
+        filter_btn.pack(side="left", padx=10)
+
+        # Table of events, only the visible rows are created so large catalogs stay fast
+        from catalog_table import VirtualTable
+        self.table = VirtualTable(self, columns=[
+            ("index", "Index"), ("id", "ID"), ("latitude", "Latitude"), ("longitude", "Longitude"),
+            ("location", "Location"), ("magnitude", "Magnitude"), ("depth", "Depth")
+        ])
+        self.table.grid(row=3, column=0, columnspan=2, padx=10, pady=10, sticky="nsew")
 
         # Add horizontal scrollbar
-        h_scrollbar = ttk.Scrollbar(self, orient="horizontal", command=self.tree.xview)
+        h_scrollbar = ttk.Scrollbar(self, orient="horizontal", command=self.table.tree.xview)
         h_scrollbar.grid(row=4, column=0, columnspan=2, sticky="ew")
-        self.tree.configure(xscrollcommand=h_scrollbar.set)
+        self.table.tree.configure(xscrollcommand=h_scrollbar.set)
 
         # Row selection input
-        tk.Label(self, text="Enter Row Index:").grid(row=5, column=0, padx=10, pady=5, sticky="w")
+        tk.Label(self, text="Enter Row Index (or click a row):").grid(row=5, column=0, padx=10, pady=5, sticky="w")
         self.row_entry = tk.Entry(self, width=10)
         self.row_entry.grid(row=5, column=1, padx=10, pady=5, sticky="w")
 
+        # Lateral structure option
+        self.lateral_var = tk.BooleanVar(value=False)
+        lateral_check = tk.Checkbutton(self, text="Laterally varying model (CRUST1.0 along a great-circle profile)", variable=self.lateral_var)
+        lateral_check.grid(row=6, column=0, columnspan=2, padx=10, pady=5, sticky="w")
+
         # Select button
         select_btn = tk.Button(self, text="Select Row", command=self.select_row)
-        select_btn.grid(row=6, column=0, columnspan=2, pady=10)
+        select_btn.grid(row=7, column=0, columnspan=2, pady=10)
 
         # Configure grid weights
         self.grid_rowconfigure(3, weight=1)
@@ -374,34 +495,90 @@ class MaterialWindow(tk.Toplevel):
             start_datetime = datetime.strptime(self.start_entry.get(), "%Y-%m-%d %H:%M")
             end_datetime = datetime.strptime(self.end_entry.get(), "%Y-%m-%d %H:%M")
 
-            # Generate the dataframe
-            summary_events = search(starttime=start_datetime, endtime=end_datetime)
-            self.dataframe = get_summary_data_frame(summary_events)
-
-            # Clear the Treeview
-            for row in self.tree.get_children():
-                self.tree.delete(row)
-
-            # Populate the Treeview with the dataframe
-            for index, row in self.dataframe.iterrows():
-                self.tree.insert("", "end", values=(index, row["id"], row["latitude"], row["longitude"], row["location"], row["magnitude"]))
+            if self.fetch is not None:
+                self.fetch.cancel()
+                self.fetch = None
+
+            # Events already in the local catalog show up right away, the missing time
+            # ranges are downloaded in the background and stream into the table
+            catalog = self.master.catalog
+            self.dataframe = catalog.query(start_datetime, end_datetime, fetch=False)
+            self.show_dataframe()
+
+            missing = catalog.missing_ranges(start_datetime, end_datetime)
+            if missing:
+                from catalog_fetch import BackgroundFetch
+                from catalog_store import from_ms
+                self.fetch = BackgroundFetch(
+                    self,
+                    [(from_ms(start), from_ms(end)) for start, end in missing],
+                    on_rows=self.add_rows,
+                    on_done=lambda _: self.finish_fetch(start_datetime, end_datetime),
+                    on_error=self.fetch_failed
+                )
 
         except ValueError:
             messagebox.showerror("Error", "Invalid datetime format. Please use YYYY-MM-DD HH:MM.")
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {e}")
 
+    def show_dataframe(self):
+        self.table.set_data(self.dataframe)
+        self.dataframe = self.table.dataframe
+
+    def add_rows(self, dataframe, start_ms, end_ms):
+        """One time slice has arrived: store it and append it to the table"""
+        self.master.catalog.insert_dataframe(dataframe)
+        self.master.catalog.mark_fetched(start_ms, end_ms)
+        self.table.append(dataframe)
+        self.dataframe = self.table.dataframe
+
+    def finish_fetch(self, start_datetime, end_datetime):
+        # reload in catalog order (newest first) once everything is stored
+        self.fetch = None
+        self.dataframe = self.master.catalog.query(start_datetime, end_datetime, fetch=False)
+        self.show_dataframe()
+
+    def fetch_failed(self, error):
+        self.fetch = None
+        messagebox.showerror("Error", f"Fetching the catalog failed: {error}")
+
+    def apply_filter(self):
+        """Filter the table by magnitude and depth (empty entries = no limit)"""
+        try:
+            min_mag = self.min_mag_entry.get().strip()
+            max_depth = self.max_depth_entry.get().strip()
+            self.table.set_filter("magnitude", minimum=float(min_mag) if min_mag else None)
+            self.table.set_filter("depth", maximum=float(max_depth) if max_depth else None)
+        except ValueError:
+            messagebox.showerror("Error", "Invalid filter value.")
+
     def select_row(self):
         """Handle row selection based on user input."""
         try:
-            # Get the selected row index
-            row_index = int(self.row_entry.get())
             if self.dataframe is None:
                 raise ValueError("No dataframe generated yet.")
 
+            # Get the selected row index, a typed index wins over the clicked row
+            row_text = self.row_entry.get().strip()
+            if row_text:
+                row_index = int(row_text)
+            else:
+                # the clicked row is remembered by event id, so it stays valid while
+                # the table is sorted, filtered or reloaded
+                row_index = self.table.row_of(self.table.selected())
+                if row_index is None:
+                    raise ValueError("No row selected.")
+
             # Get the row data
             selected_row = self.dataframe.iloc[row_index]
+            # a laterally varying model adds full (NX, NY) grids, plan the grid again with them
+            if self.lateral_var.get():
+                if not self.master.check_memory(lateral=True):
+                    return
+                self.master.update_input_status()  # the grid may have been reduced
             self.master.data_dict = selected_row.to_dict()
+            self.master.lateral_section = self.lateral_var.get()
             messagebox.showinfo("Row Selected", f"Selected Row:\n{selected_row.to_dict()}")
             self.master.update_material_status()
             self.destroy()
@@ -0,0 +1,58 @@
+import numpy as np
+
+# ===== Materials List =====
+materials = [
+    "Air", "Water", "Ice", "Oil", "Vegetal Soil", "Dry Sands", "Wet Sands",
+    "Saturated Shales and Clays", "Porous and Saturated Sandstones", "Marls",
+    "Chalk", "Coal", "Salt", "Anhydrites", "Limestones", "Dolomites",
+    "Granite", "Basalt", "Gneiss"
+]
+
+# (P-wave velocity, S-wave velocity) in m/s
+materials_dict = {
+    "Air" : (343, 0),
+    "Water" : (1500,0),
+    "Ice" : (3800, 1900),
+    "Oil" : (1250, 0),
+    "Vegetal Soil" :(700, 300),
+    "Dry Sands":(1200, 500),
+    "Wet Sands":(2000,600),
+    "Saturated Shales and Clays" :(2500,800),
+    "Porous and Saturated Sandstones" :(3500,1800),
+    "Marls":(3000, 1500),
+    "Chalk":(2600, 1300),
+    "Coal":(2700, 1400),
+    "Salt":(5500,3100),
+    "Anhydrites":(5500, 3100),
+    "Limestones":(6000, 3300),
+    "Dolomites":(6500,3600),
+    "Granite":(6000, 3300),
+    "Basalt":(6000, 3400),
+    "Gneiss":(5200, 3200)
+}
+
+
+def check_layers(layers, NY):
+    """Raise ValueError unless the (from, to, material) layers are valid and cover 0..NY"""
+    maximum_layer = 0
+    minimum_layer = NY
+    for i, (from_val, to_val, material) in enumerate(layers):
+        if to_val > NY:
+            raise ValueError(f"Row {i+1}: 'To' height ({to_val}) exceeds NY ({NY})")
+        if material not in materials_dict:
+            raise ValueError(f"Row {i+1}: unknown material '{material}'")
+        maximum_layer = max(to_val, maximum_layer)
+        minimum_layer = min(from_val, minimum_layer)
+
+    if maximum_layer < NY or minimum_layer > 0:
+        raise ValueError(f"All vertical layer height up to NY must have material specification.")
+
+
+def layer_profiles(layers, NY):
+    """VEL_P and VEL_S depth profiles (NY,) of a list of (from, to, material) layers"""
+    VEL_P = np.zeros(NY)
+    VEL_S = np.zeros(NY)
+    for (fromval, toval, material) in layers:
+        VEL_P[fromval:toval] = materials_dict[material][0]
+        VEL_S[fromval:toval] = materials_dict[material][1]
+    return VEL_P, VEL_S
@@ -0,0 +1,55 @@
+import numpy as np
+
+# Material properties (velocity, density, ...) are either a full (NX, NY) grid or, for
+# laterally homogeneous models, a single (1, NY) depth profile that broadcasts against
+# the (NX, NY) wave fields. The helpers below index both layouts the same way.
+
+
+def as_medium(values, NX, NY):
+    """
+    Material property as an array that broadcasts against (NX, NY) fields.
+    A depth profile (NY,) and a broadcast view of one (e.g. np.broadcast_to) become a
+    (1, NY) profile without copying, a laterally varying (NX, NY) grid is kept as is.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = values[np.newaxis, :]
+    elif values.shape[0] > 1 and values.strides[0] == 0:
+        values = values[:1]
+
+    if values.shape[1] != NY or values.shape[0] not in (1, NX):
+        raise ValueError(f"Material array of shape {values.shape} does not match the ({NX}, {NY}) grid")
+    return values
+
+
+def is_profile(values):
+    return values.shape[0] == 1
+
+
+def interior(values):
+    """values[1:-1, 1:-1], keeping the single row of a profile"""
+    return values[:, 1:-1] if is_profile(values) else values[1:-1, 1:-1]
+
+
+def block(values, x_start, x_end, y_start, y_end):
+    """values[x_start:x_end, y_start:y_end], keeping the single row of a profile"""
+    return values[:, y_start:y_end] if is_profile(values) else values[x_start:x_end, y_start:y_end]
+
+
+def value_at(values, x, y):
+    return values[0 if is_profile(values) else x, y]
+
+
+def values_at(values, xs, ys):
+    """Values at the grid indices (xs, ys)"""
+    return values[0, ys] if is_profile(values) else values[xs, ys]
+
+
+def column(values, x):
+    """Depth column at grid index x"""
+    return values[0 if is_profile(values) else x, :]
+
+
+def columns(values, xs):
+    """Depth columns at grid indices xs, a single (1, NY) row for a profile"""
+    return values if is_profile(values) else values[xs, :]
@@ -0,0 +1,186 @@
+"""
+Estimates of the peak memory and runtime of a simulation before it starts, so grids that
+cannot fit are refused (with a smaller grid or float32 suggested) instead of crashing.
+"""
+import os
+import time
+from functools import lru_cache
+import numpy as np
+
+# Peak number of (NX, NY) arrays of the solver dtype alive during a time step (fields,
+# stencil temporaries and the copies at the end of the step), measured with tracemalloc.
+FIELD_ARRAYS = {
+    "p_wave_disp": 11,
+    "p_wave_pressure": 9,
+    "s_wave": 16,
+}
+# laterally varying model: VEL_P, VEL_S, RHO plus the solver's coefficient grids, float64
+LATERAL_ARRAYS = 5
+# final fields kept per snapshot (cache, .npz output)
+SNAPSHOT_FIELDS = {"p_wave_disp": 2, "p_wave_pressure": 1, "s_wave": 3}
+# video: imshow keeps float copies of the shown fields, plus the figure itself
+RENDER_ARRAYS = {"p_wave_disp": 3, "p_wave_pressure": 2, "s_wave": 4}
+RENDER_BYTES = 64 * 2**20
+RENDER_SECONDS_PER_FRAME = 0.15  # drawing and encoding a 10x8 inch frame at 100 dpi, rough
+
+PLOT_EVERY = 5
+DT = 0.001
+
+WARN_FRACTION = 0.5  # of the budget
+WARN_RUNTIME_S = 3600
+BUDGET_ENV = "SEISMIC_MEMORY_BUDGET_MB"
+
+
+def solver_family(solver):
+    """p_wave_disp, p_wave_pressure, s_wave or seismogram for the solver names of cli.py"""
+    if solver.startswith("s_wave"):
+        return "s_wave"
+    if solver.startswith("seismogram"):
+        return "seismogram"
+    if solver in FIELD_ARRAYS:
+        return solver
+    raise ValueError(f"Unknown solver '{solver}'")
+
+
+def memory_budget():
+    """Bytes a run may use: SEISMIC_MEMORY_BUDGET_MB, else 80 % of the available memory"""
+    if os.environ.get(BUDGET_ENV):
+        return int(float(os.environ[BUDGET_ENV]) * 2**20)
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(int(line.split()[1]) * 1024 * 0.8)
+    except OSError:
+        pass
+    try:
+        return int(os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") * 0.8)
+    except (AttributeError, ValueError, OSError):
+        return None  # unknown, nothing is refused
+
+
+@lru_cache(maxsize=None)
+def measure_throughput(family, dtype):
+    """Cell updates per second of one solver family on this machine (short run, once per process)"""
+    from P_wave_disp import PWaveDisplacement
+    from P_wave_pressure import PWavePressure
+    from S_wave import SWave
+
+    NX = NY = 256
+    velocity, rho = np.full(NY, 2000.0), np.full(NY, 2000.0)
+    cls = {"p_wave_disp": PWaveDisplacement, "p_wave_pressure": PWavePressure, "s_wave": SWave}[family]
+    solver = cls(NX, NY, 0.0, 2000.0, 0.0, 2000.0, 0.05, velocity, rho, "plan", NX//4, NY//2, dtype=dtype)
+    solver.run_wavelet_eq()
+    step = solver.update_p_wave_only if family == "p_wave_disp" else solver.update_wave
+    step(0)  # warm up
+    start = time.perf_counter()
+    for n in range(1, 21):
+        step(n)
+    return 20 * NX * NY / (time.perf_counter() - start)
+
+
+def plan_run(solver, NX, NY, t_max, dtype="float64", lateral=False, video=True, snapshots=1, receivers=0,
+             budget=None, calibrate=True):
+    """
+    Estimated peak memory (bytes) and runtime (s) of one run, with its status against the
+    budget: "ok", "warn" (more than half the budget or over an hour) or "refuse".
+    receivers is the number of traces of a seismogram gather. Without calibrate the
+    runtime is left out (no test run).
+    """
+    family = solver_family(solver)
+    dtype = np.dtype(dtype).name
+    itemsize = np.dtype(dtype).itemsize
+    cells = NX * NY
+    NT = len(np.arange(0, t_max, DT))
+    frames = NT // PLOT_EVERY if video else 0
+
+    if family == "seismogram":
+        # depth profiles and a handful of NT long traces, one row per receiver for gathers
+        peak = (20 * NY + (8 + 6 * receivers) * NT) * 8 + cells * 8 * (3 if lateral else 0)
+        runtime = 0.0  # compute() takes milliseconds
+    else:
+        peak = cells * itemsize * (FIELD_ARRAYS[family] + SNAPSHOT_FIELDS[family] * snapshots)
+        if lateral:
+            peak += cells * 8 * LATERAL_ARRAYS
+        if video:
+            peak += cells * 8 * RENDER_ARRAYS[family]
+        runtime = NT * cells / measure_throughput(family, dtype) if calibrate else None
+    if video:
+        peak += RENDER_BYTES
+        if runtime is not None:
+            runtime += frames * RENDER_SECONDS_PER_FRAME
+
+    budget = memory_budget() if budget is None else budget
+    if budget is not None and peak > budget:
+        status = "refuse"
+    elif (budget is not None and peak > WARN_FRACTION * budget) or (runtime or 0) > WARN_RUNTIME_S:
+        status = "warn"
+    else:
+        status = "ok"
+    return {
+        "solver": solver, "NX": NX, "NY": NY, "NT": NT, "dtype": dtype, "lateral": lateral, "video": video,
+        "peak_bytes": int(peak), "runtime_s": runtime, "budget_bytes": budget, "status": status,
+    }
+
+
+def suggest(plan, max_factor=64):
+    """
+    Alternatives to a plan that fit its budget, closest first: the largest grid (every
+    factor-th point in x and y) that fits in float64 and in float32, float32 before float64
+    on the same grid.
+    """
+    settings = {key: plan[key] for key in ("lateral", "video")}
+    t_max = plan["NT"] * DT
+    options = []
+    if plan["dtype"] != "float32":
+        option = plan_run(plan["solver"], plan["NX"], plan["NY"], t_max, "float32", budget=plan["budget_bytes"], **settings)
+        if option["status"] != "refuse":
+            options.append(option)
+    for dtype in ("float64", "float32"):
+        for factor in range(2, max_factor + 1):
+            NX, NY = plan["NX"] // factor, plan["NY"] // factor
+            if NX < 3 or NY < 3:
+                break
+            option = plan_run(plan["solver"], NX, NY, t_max, dtype, budget=plan["budget_bytes"], **settings)
+            if option["status"] != "refuse":
+                options.append(option)
+                break
+    # the finest grid first, so options[0] is the closest setting that fits
+    options.sort(key=lambda option: (-option["NX"] * option["NY"], option["dtype"] != "float32"))
+    return options
+
+
+def format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+
+def format_seconds(s):
+    if s < 120:
+        return f"{s:.0f} s"
+    if s < 7200:
+        return f"{s / 60:.0f} min"
+    return f"{s / 3600:.1f} h"
+
+
+def describe(plan):
+    """One line summary, e.g. 'NX=200, NY=400 (float64): ~12 MB peak memory, ~1 min'"""
+    text = f"NX={plan['NX']}, NY={plan['NY']} ({plan['dtype']}): ~{format_bytes(plan['peak_bytes'])} peak memory"
+    if plan["runtime_s"] is not None:
+        text += f", ~{format_seconds(plan['runtime_s'])}"
+    if plan["status"] == "refuse":
+        text += f" (budget {format_bytes(plan['budget_bytes'])})"
+    return text
+
+
+if __name__ == "__main__":
+    # python memory_planner.py s_wave_displacement 20000 40000 4.0 [float32]
+    import sys
+    plan = plan_run(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), float(sys.argv[4]), *sys.argv[5:6])
+    print(f"{plan['status']}: {describe(plan)}")
+    if plan["status"] == "refuse":
+        for option in suggest(plan):
+            print(f"  fits: {describe(option)}")
@@ -0,0 +1,141 @@
+"""
+Two-level S-wave simulation: a fine patch around the source, `ratio` times finer in space
+and time, nested in the coarse grid of the whole domain. Per coarse step the coarse grid
+steps once and the patch `ratio` times, with its outer ring taken from the coarse fields
+(cubic in space, linear in time), then the patch is copied back onto the coarse nodes
+inside it. The source and rupture zone are sampled as finely as on a grid refined
+everywhere, for a fraction of the cell updates; `python benchmarks.py nested` compares
+traces on both axes against a grid refined everywhere.
+"""
+import numpy as np
+from S_wave import SWave
+from precompute import ricker_source
+from telemetry import NULL_TELEMETRY
+
+GHOST = 2  # rows of the patch edge set from the coarse grid, the stencil reaches two rows in
+ABL_WIDTH = 20  # the patch stays clear of the absorbing layer of the coarse grid
+MARGIN = 2  # coarse cells inside the patch edge that keep the coarse solution
+
+
+def sublattice_nearest(offsets, ratio):
+    """Coarse offsets nearest to the fine offsets / ratio that have the same parity"""
+    parity = offsets % 2
+    return 2 * np.floor((offsets / ratio - parity) / 2 + 0.5).astype(int) + parity
+
+
+def cubic_weights(t):
+    """Lagrange weights of the nodes -1, 0, 1, 2 at t in [0, 1)"""
+    return [-t * (t - 1) * (t - 2) / 6, (t + 1) * (t - 1) * (t - 2) / 2, -(t + 1) * t * (t - 2) / 2, (t + 1) * t * (t - 1) / 6]
+
+
+class NestedSWave(SWave):
+    def __init__(self, NX, NY, XMIN, XMAX, YMIN, YMAX, t_max, VEL_S, RHO, name, source_x, source_y,
+                 ratio=3, patch_radius=20, dtype=np.float64, reducers=None):
+        super().__init__(NX, NY, XMIN, XMAX, YMIN, YMAX, t_max, VEL_S, RHO, name, source_x, source_y, dtype=dtype)
+        if ratio % 2 == 0:
+            raise ValueError("ratio must be odd, so that the patch and the coarse grid share the points of every field")
+        self.ratio = ratio
+
+        # coarse index range [x0, x1] x [y0, y1] of the patch
+        lo, hi = ABL_WIDTH + 1, np.array([NX, NY]) - ABL_WIDTH - 2
+        self.x0, self.y0 = (max(lo, c - patch_radius) for c in (source_x, source_y))
+        self.x1, self.y1 = (min(h, c + patch_radius) for h, c in zip(hi, (source_x, source_y)))
+        # inside the part of the patch that replaces the coarse grid
+        if not (self.x0 + MARGIN <= source_x <= self.x1 - MARGIN and self.y0 + MARGIN <= source_y <= self.y1 - MARGIN):
+            raise ValueError(f"The source ({source_x}, {source_y}) must lie inside the refined patch, at least "
+                             f"{lo + MARGIN} points from the edges of the grid")
+        if self.x1 - self.x0 < 2 * MARGIN + 4 or self.y1 - self.y0 < 2 * MARGIN + 4:
+            raise ValueError(f"The source ({source_x}, {source_y}) is too close to the absorbing boundary for a refined patch")
+
+        NXf, NYf = (self.x1 - self.x0) * ratio + 1, (self.y1 - self.y0) * ratio + 1
+        fx, fy = np.arange(NXf) / ratio + self.x0, np.arange(NYf) / ratio + self.y0  # coarse coordinates
+        # The central differences of SWave leave every field on one sublattice of every
+        # other point (uy on the source's even/even offsets, ux on the odd/odd ones, the
+        # stress in between), the rest stays zero. A coarse point thus stands for the two
+        # cells around it, and every patch point takes the material of the nearest coarse
+        # point of its own sublattice: the patch sees layer boundaries where the coarse grid
+        # does, instead of up to a cell apart, which reflects waves at the patch edge.
+        fsx, fsy = (source_x - self.x0) * ratio, (source_y - self.y0) * ratio
+        nx = source_x + sublattice_nearest(np.arange(NXf) - fsx, ratio)
+        ny = source_y + sublattice_nearest(np.arange(NYf) - fsy, ratio)
+        VS_f = self.VS[:, ny] if self.VS.shape[0] == 1 else self.VS[nx][:, ny]
+        RHO_f = self.RHO[:, ny] if self.RHO.shape[0] == 1 else self.RHO[nx][:, ny]
+        self.fine = SWave(NXf, NYf, XMIN + self.x0 * self.DX, XMIN + self.x0 * self.DX + NXf * self.DX / ratio,
+                          YMIN + self.y0 * self.DY, YMIN + self.y0 * self.DY + NYf * self.DY / ratio,
+                          self.NT * self.DT, VS_f, RHO_f, name + " fine", fsx, fsy, dtype=dtype, DT=self.DT / ratio)
+        self.fine.damping = 1.0  # no absorbing layer inside the patch
+        self.fine.telemetry = NULL_TELEMETRY  # timed as the "refinement" phase of the coarse grid
+
+        # The ring is interpolated (cubic) between the coarse points of the sublattice of
+        # each field, 2 DX apart, and only set on the patch points of the same sublattice.
+        ring = np.ones((NXf, NYf), bool)
+        ring[GHOST:-GHOST, GHOST:-GHOST] = False
+        self.rings = {}
+        for field, odd in (("ux", 1), ("uy", 0)):
+            live = ring.copy()
+            live[(np.arange(NXf) - fsx + odd) % 2 == 1, :] = False
+            live[:, (np.arange(NYf) - fsy + odd) % 2 == 1] = False
+            points = np.nonzero(live)
+            X, Y = fx[points[0]], fy[points[1]]
+            px, py = (source_x + odd) % 2, (source_y + odd) % 2
+            i, j = px + 2 * np.floor((X - px) / 2).astype(int), py + 2 * np.floor((Y - py) / 2).astype(int)
+            wx, wy = cubic_weights((X - i) / 2), cubic_weights((Y - j) / 2)
+            steps = range(-2, 6, 2)
+            index = np.stack([(i + a) * NY + j + b for a in steps for b in steps])
+            weight = np.stack([u * v for u in wx for v in wy]).astype(dtype)
+            self.rings[field] = (points, index, weight)
+
+        # updated after the patch is copied back, not by SWave.update_wave
+        self.patch_reducers = list(reducers or [])
+        for reducer in self.patch_reducers:
+            reducer.start(self)
+
+    def run_wavelet_eq(self, f0=15.0):
+        # the source lives on the patch; the same force on ratio^2 times smaller cells
+        self.source_amp = np.zeros(0)
+        self.fine.source_amp = ricker_source(self.fine.NT, self.fine.DT, f0) * self.ratio**2
+
+    def coarse_ring(self):
+        """The coarse fields at the ring of the patch, {field: values}"""
+        return {field: np.sum(np.take(getattr(self, field), index) * weight, axis=0)
+                for field, (points, index, weight) in self.rings.items()}
+
+    def update_wave(self, n):
+        ring_old = self.coarse_ring()
+        super().update_wave(n)
+
+        self.telemetry.begin()
+        ring_new = self.coarse_ring()
+        fine = self.fine
+        for k in range(self.ratio):
+            fine.update_wave(n * self.ratio + k)
+            theta = (k + 1) / self.ratio  # linear in time between the two coarse steps
+            for field, (points, index, weight) in self.rings.items():
+                getattr(fine, field)[points] = (1 - theta) * ring_old[field] + theta * ring_new[field]
+
+        # the patch replaces the coarse solution on the coarse points inside it, except the
+        # MARGIN cells along its edge: those carry the interpolation error of the ring and
+        # would feed it back into the coarse grid
+        m, r = MARGIN, self.ratio
+        inner = np.s_[self.x0 + m:self.x1 + 1 - m, self.y0 + m:self.y1 + 1 - m]
+        patch = np.s_[r * m:fine.NX - r * m:r, r * m:fine.NY - r * m:r]
+        self.ux[inner] = fine.ux[patch]
+        self.uy[inner] = fine.uy[patch]
+        self.telemetry.lap("refinement")
+        if self.patch_reducers:
+            for reducer in self.patch_reducers:
+                reducer.update(self, n)
+            self.telemetry.lap("diagnostics")
+
+    def cell_updates(self):
+        """Grid point updates of the whole run, coarse and fine"""
+        return self.NT * (self.NX * self.NY + self.ratio * self.fine.NX * self.fine.NY)
+
+    def release(self):
+        super().release()
+        self.fine.release()
+
+    def get_seismic_moment(self, rupture_radius=5):
+        # the rupture zone on the patch, the same physical size with ratio times more points
+        self.M0 = self.fine.get_seismic_moment(rupture_radius * self.ratio)
+        return self.M0
@@ -0,0 +1,127 @@
+"""
+Depth-stretched grids for layered models. The depth spacing follows the local velocity,
+so every depth gets the same number of points per wavelength: fine where the material is
+slow (sediments, water) and coarse in the fast crust and mantle, with far fewer cells than
+a uniform grid that resolves the slowest layer everywhere.
+
+    nodes = matching_uniform(rdp.depth_combined, rdp.vs_combined, 0, YMAX, NY, f_max=40)
+    rdp.calculate(y_nodes=nodes)
+    wave = SWave(NX, len(nodes), XMIN, XMAX, 0, YMAX, t_max, rdp.VEL_S, rdp.RHO, name,
+                 rdp.source_x, rdp.source_y, y_nodes=nodes)
+"""
+import numpy as np
+
+MAX_RATIO = 1.1  # largest change of the spacing from one cell to the next
+PROFILE_SAMPLES = 20001  # velocity samples the spacing is chosen from
+DISPLAY_ROWS = 1000  # at most, rows of the uniform image a stretched field is resampled to
+
+
+def target_spacing(depths, velocity, YMIN, YMAX, f_max, points_per_wavelength):
+    """
+    Largest spacing allowed at PROFILE_SAMPLES depths from YMIN to YMAX, graded so that
+    neighbouring cells differ by at most MAX_RATIO. Zero velocities (S-waves in water)
+    use the slowest non-zero one.
+    """
+    depths, velocity = np.asarray(depths, float), np.asarray(velocity, float)
+    velocity = np.where(velocity > 0, velocity, velocity[velocity > 0].min())
+    y = np.linspace(YMIN, YMAX, PROFILE_SAMPLES)
+    spacing = np.interp(y, depths, velocity) / (f_max * points_per_wavelength)
+    # min over y' of spacing(y') + (MAX_RATIO - 1) |y - y'|, as one pass from each side
+    slope = (MAX_RATIO - 1) * y
+    spacing = np.minimum(
+        np.minimum.accumulate(spacing - slope) + slope,
+        (np.minimum.accumulate((spacing + slope)[::-1]) - slope[::-1])[::-1],
+    )
+    return y, spacing
+
+
+def stretched_nodes(depths, velocity, YMIN, YMAX, f_max, points_per_wavelength=10):
+    """
+    Depth nodes from YMIN to YMAX with points_per_wavelength nodes per shortest wavelength
+    (velocity / f_max) everywhere. depths and velocity sample the model, e.g.
+    RealDataProcess.depth_combined with its vs_combined (S-wave) or vp_combined.
+    """
+    y, spacing = target_spacing(depths, velocity, YMIN, YMAX, f_max, points_per_wavelength)
+    nodes = [YMIN]
+    while nodes[-1] < YMAX:
+        start = np.searchsorted(y, nodes[-1])
+        dy = spacing[min(start, len(y) - 1)]
+        # no larger than the spacing allowed anywhere inside the new cell
+        end = np.searchsorted(y, nodes[-1] + dy, side="right")
+        dy = min(dy, spacing[start:end].min()) if end > start else dy
+        nodes.append(nodes[-1] + dy)
+    nodes = np.array(nodes)
+    # the last cell overshoots YMAX, shrink all cells slightly to end on it
+    return YMIN + (nodes - YMIN) * (YMAX - YMIN) / (nodes[-1] - YMIN)
+
+
+def matching_uniform(depths, velocity, YMIN, YMAX, NY, f_max):
+    """
+    Stretched nodes as fine as a uniform NY point grid in the slowest layer, so as accurate
+    as that grid where it matters and coarser everywhere else
+    """
+    velocity = np.asarray(velocity, float)
+    slowest = velocity[velocity > 0].min()
+    points_per_wavelength = slowest / (f_max * (YMAX - YMIN) / NY)
+    return stretched_nodes(depths, velocity, YMIN, YMAX, f_max, points_per_wavelength)
+
+
+class DepthAxis():
+    """
+    The y axis of a solver: uniform with spacing DY, or the given (NY,) node depths.
+    d1 and d2 are the central differences along the last axis at the interior nodes, the
+    three point stencils of a non-uniform grid when nodes are given.
+    """
+    def __init__(self, YMIN, YMAX, NY, nodes=None, dtype=np.float64):
+        self.nodes = None
+        self.DY = (YMAX - YMIN) / NY
+        self.heights = self.DY  # height of the cell around every node
+        if nodes is None:
+            return
+
+        self.nodes = np.asarray(nodes, float)
+        if self.nodes.shape != (NY,):
+            raise ValueError(f"y_nodes has {self.nodes.size} depths, the grid has NY={NY}")
+        h = np.diff(self.nodes)
+        if np.any(h <= 0):
+            raise ValueError("y_nodes must be strictly increasing")
+        self.DY = float(h.min())  # the smallest spacing, for the CFL number
+        self.heights = np.concatenate([[h[0] / 2], (h[:-1] + h[1:]) / 2, [h[-1] / 2]])
+
+        up, down = h[:-1], h[1:]  # spacing to the shallower / deeper neighbour of an interior node
+        self.d1_weights = [w.astype(dtype) for w in (
+            -down / (up * (up + down)),
+            (down - up) / (up * down),
+            up / (down * (up + down)),
+        )]
+        self.d2_weights = [w.astype(dtype) for w in (
+            2 / (up * (up + down)),
+            -2 / (up * down),
+            2 / (down * (up + down)),
+        )]
+
+        # uniform rows for display, as linear interpolation between the nodes
+        rows = min(DISPLAY_ROWS, int(round((self.nodes[-1] - self.nodes[0]) / self.DY)) + 1)
+        display_y = np.linspace(self.nodes[0], self.nodes[-1], rows)
+        self.display_index = np.clip(np.searchsorted(self.nodes, display_y, side="right") - 1, 0, NY - 2)
+        self.display_weight = ((display_y - self.nodes[self.display_index]) / h[self.display_index]).astype(dtype)
+
+    def d1(self, f):
+        """df/dy, shape f[..., 1:-1]"""
+        if self.nodes is None:
+            return (f[..., 2:] - f[..., :-2]) / (2*self.DY)
+        w_up, w_center, w_down = self.d1_weights
+        return w_up * f[..., :-2] + w_center * f[..., 1:-1] + w_down * f[..., 2:]
+
+    def d2(self, f):
+        """d2f/dy2, shape f[..., 1:-1]"""
+        if self.nodes is None:
+            return (f[..., 2:] - 2*f[..., 1:-1] + f[..., :-2]) / self.DY**2
+        w_up, w_center, w_down = self.d2_weights
+        return w_up * f[..., :-2] + w_center * f[..., 1:-1] + w_down * f[..., 2:]
+
+    def display(self, field):
+        """A (NX, NY) field on evenly spaced depths, for imshow; uniform fields as they are"""
+        if self.nodes is None:
+            return field
+        return field[:, self.display_index] * (1 - self.display_weight) + field[:, self.display_index + 1] * self.display_weight
@@ -0,0 +1,35 @@
+from functools import lru_cache
+import numpy as np
+
+# Arrays that only depend on the grid or the source settings, shared by every solver
+# instance (and every run of a sweep) with the same settings. They are read-only, so
+# sharing one copy is safe.
+
+
+@lru_cache(maxsize=2)  # full (NX, NY) grids: only the current grid (and a nested patch) are kept
+def damping_mask(NX, NY, ABL_WIDTH=20, dtype=np.float64):
+    """Absorbing boundary factors: 0.9 at the edges rising to 1.0 over ABL_WIDTH points"""
+    damping = np.ones((NX, NY))
+    damping[:ABL_WIDTH, :] = np.linspace(0.9, 1.0, ABL_WIDTH)[:, np.newaxis]
+    damping[-ABL_WIDTH:, :] = np.linspace(1.0, 0.9, ABL_WIDTH)[:, np.newaxis]
+
+    # preserve the strongest damping when overlapping in left and right edge
+    damping[:, :ABL_WIDTH] = np.minimum(damping[:, :ABL_WIDTH], np.linspace(0.9, 1.0, ABL_WIDTH))
+    damping[:, -ABL_WIDTH:] = np.minimum(damping[:, -ABL_WIDTH:], np.linspace(1.0, 0.9, ABL_WIDTH))
+    damping = damping.astype(dtype, copy=False)
+    damping.flags.writeable = False
+    return damping
+
+
+def ricker(t, f0, scale=1e6):
+    """Ricker wavelet peaking at t = 0"""
+    return (1.0 - 2.0*(np.pi*f0*t)**2) * np.exp(-(np.pi*f0*t)**2) * scale
+
+
+@lru_cache(maxsize=32)
+def ricker_source(NT, DT, f0, delay=0.1, scale=1e6):
+    """Ricker wavelet source amplitude for every time step, peaking at t = delay"""
+    t = np.arange(NT) * DT - delay
+    amp = ricker(t, f0, scale)
+    amp.flags.writeable = False
+    return amp
@@ -1,15 +1,34 @@
-import netCDF4 as nc
 import numpy as np
 from obspy.taup import TauPyModel
 from geopy.distance import geodesic
 from math import cos
 from scipy.interpolate import interp1d
+from crust_index import get_crust_index
+
+_iasp91_profile = None
+
+
+def get_iasp91_profile():
+    """IASP91 layer tops (m) with vp, vs (m/s) and Gardner density (kg/m^3), built once per process"""
+    global _iasp91_profile
+    if _iasp91_profile is None:
+        layers = TauPyModel("iasp91").model.s_mod.v_mod.layers
+        depths = layers['top_depth'] * 1000
+        vp = layers['top_p_velocity'] * 1000
+        vs = layers['top_s_velocity'] * 1000
+
+        # Rough density estimate via Gardner's Equation
+        rho = 0.31 * (vp ** 0.25) * 1000
+
+        for arr in (depths, vp, vs, rho):
+            arr.flags.writeable = False  # shared between every event
+        _iasp91_profile = (depths, vp, vs, rho)
+    return _iasp91_profile
+
 
 class RealDataProcess():
     def __init__(self, latitude, longitude, real_depth, NX, NY, XMIN, XMAX, YMIN, YMAX):
-        self.vp_dataset = nc.Dataset('CRUST1.0-vp.r0.1.nc')
-        self.vs_dataset = nc.Dataset('CRUST1.0-vs.r0.1.nc')
-        self.rho_dataset = nc.Dataset('CRUST1.0-rho.r0.1.nc')
+        self.crust = get_crust_index()
 
         self.latitude = latitude
         self.longitude = longitude
@@ -23,84 +42,55 @@ class RealDataProcess():
         self.YMIN = YMIN
         self.YMAX = YMAX
 
-        self.latitudes = self.vp_dataset.variables['latitude'][:]
-        self.longitudes = self.vp_dataset.variables['longitude'][:]
-        self.lat_idx = np.abs(self.latitudes - latitude).argmin()
-        self.lon_idx = np.abs(self.longitudes - longitude).argmin()
-
-        # layers and average thickness
-        self.layers = [
-            ("water_vp", "water_vs", "water_rho", 3000),
-            ("ice_vp", "ice_vs", "ice_rho", 2000),
-            ("upper_sediments_vp", "upper_sediments_vs", "upper_sediments_rho", 2000),
-            ("middle_sediments_vp", "middle_sediments_vs", "middle_sediments_rho", 3000),
-            ("lower_sediments_vp", "lower_sediments_vs", "lower_sediments_rho", 5000),
-            ("upper_crust_vp", "upper_crust_vs", "upper_crust_rho", 10000),
-            ("middle_crust_vp", "middle_crust_vs", "middle_crust_rho", 15000),
-            ("lower_crust_vp", "lower_crust_vs", "lower_crust_rho", 20000)
-        ]
+        self.lat_idx, self.lon_idx = self.crust.cell(latitude, longitude)
     
     def process(self):
-        crust_depths = []
-        crust_vp = []
-        crust_vs = []
-        crust_rho = []
-
-        depth = 0  
-        for vp_layer, vs_layer, rho_layer, thickness in self.layers:
-            vp = self.vp_dataset.variables.get(vp_layer, None)
-            vs = self.vs_dataset.variables.get(vs_layer, None)
-            rho = self.rho_dataset.variables.get(rho_layer, None)
-
-            # convert to m/s for vp and vs and to kg/m^3 for rho
-            vp_val = float(vp[self.lat_idx, self.lon_idx]) * 1000 if vp is not None else np.nan
-            vs_val = float(vs[self.lat_idx, self.lon_idx]) * 1000 if vs is not None else np.nan
-            rho_val = float(rho[self.lat_idx, self.lon_idx]) * 1000 if rho is not None else np.nan
-
-            crust_depths.append(depth)
-            crust_vp.append(vp_val)
-            crust_vs.append(vs_val)
-            crust_rho.append(rho_val)
-
-            depth += thickness
-
-        crust_depths = np.array(crust_depths)
-        crust_vp = np.array(crust_vp)
-        crust_vs = np.array(crust_vs)
-        crust_rho = np.array(crust_rho)
-
-        # The IASP91 model
-        model = TauPyModel("iasp91")
-        iasp_depths = []
-        iasp_vp = []
-        iasp_vs = []
-        iasp_rho = []  
-
-        for layer in model.model.s_mod.v_mod.layers:
-            d = layer[0] * 1000
-            if d <= crust_depths[-1]:
-                continue  # skip shallow layers
-
-            iasp_depths.append(d)
-            iasp_vp.append(layer[2] * 1000)
-            iasp_vs.append(layer[3] * 1000)
-
-            # Rough density estimate via Gardner's Equation
-            rho_est = 0.31 * ((layer[2] * 1000) ** (0.25))  
-            iasp_rho.append(rho_est * 1000)
-
-        iasp_depths = np.array(iasp_depths)
-        iasp_vp = np.array(iasp_vp)
-        iasp_vs = np.array(iasp_vs)
-        iasp_rho = np.array(iasp_rho)
-
+        # all CRUST1.0 layers of the cell in one read, converted to m/s and kg/m^3
+        crust_values = self.crust.values(self.lat_idx, self.lon_idx)
+        crust_depths = self.crust.layer_tops
+        crust_vp = crust_values[:, 0]
+        crust_vs = crust_values[:, 1]
+        crust_rho = crust_values[:, 2]
+
+        # The IASP91 model below the crust (shared, built once per process)
+        iasp_depths, iasp_vp, iasp_vs, iasp_rho = get_iasp91_profile()
+        deep = iasp_depths > crust_depths[-1]  # skip shallow layers
+        iasp_depths = iasp_depths[deep]
+        iasp_vp = iasp_vp[deep]
+        iasp_vs = iasp_vs[deep]
+        iasp_rho = iasp_rho[deep]
 
         self.depth_combined = np.concatenate([crust_depths, iasp_depths])
         self.vp_combined = np.concatenate([crust_vp, iasp_vp])
         self.vs_combined = np.concatenate([crust_vs, iasp_vs])
         self.rho_combined = np.concatenate([crust_rho, iasp_rho])
     
-    def calculate(self):
+    def calculate_section(self, azimuth=90.0):
+        """
+        Laterally varying VEL_P/VEL_S/RHO: CRUST1.0 sampled with bilinear interpolation at
+        the NX grid columns laid along the great circle through the epicenter (azimuth in
+        degrees clockwise from north), combined with IASP91 below, in one batched lookup.
+        """
+        self.calculate()  # source position, and the 1D model at the epicenter
+
+        DX = (self.XMAX - self.XMIN) / self.NX
+        distances = (np.arange(self.NX) - self.source_x) * DX
+        self.section_lat, self.section_lon = great_circle_points(self.latitude, self.longitude, azimuth, distances)
+
+        crust_values = self.crust.bilinear(self.section_lat, self.section_lon)
+        depth_combined, vp_combined, vs_combined, rho_combined = combine_with_iasp91(crust_values, self.crust.layer_tops)
+
+        depth_target = np.linspace(0, self.YMAX, self.NY)  # in meters
+        idx, weight = interpolation_weights(depth_target, depth_combined)
+        self.VEL_P = vp_combined[:, idx] * (1 - weight) + vp_combined[:, idx + 1] * weight
+        self.VEL_S = vs_combined[:, idx] * (1 - weight) + vs_combined[:, idx + 1] * weight
+        self.RHO = rho_combined[:, idx] * (1 - weight) + rho_combined[:, idx + 1] * weight
+
+    def calculate(self, y_nodes=None):
+        """
+        Source position and the model on the grid; y_nodes are the depths of a stretched
+        grid (nonuniform_grid.py) to sample instead of NY evenly spaced ones
+        """
         DX = (self.XMAX - self.XMIN) / self.NX
         DY = (self.YMAX - self.YMIN) / self.NY
 
@@ -116,9 +106,12 @@ class RealDataProcess():
 
         # Convert to grid index
         self.source_x = min(max(int(x_meters / DX), 0), self.NX - 20)
-        self.source_y = min(max(int(self.depth / DY), 0), self.NY - 20)
-
-        depth_target = np.linspace(0, self.YMAX, self.NY)  # in meters
+        if y_nodes is None:
+            self.source_y = min(max(int(self.depth / DY), 0), self.NY - 20)
+            depth_target = np.linspace(0, self.YMAX, self.NY)  # in meters
+        else:
+            depth_target = np.asarray(y_nodes)
+            self.source_y = min(max(int(np.searchsorted(depth_target, self.depth, side='right')) - 1, 0), len(depth_target) - 20)
 
         vp_interp = interp1d(self.depth_combined, self.vp_combined, bounds_error=False, fill_value="extrapolate")
         vs_interp = interp1d(self.depth_combined, self.vs_combined, bounds_error=False, fill_value="extrapolate")
@@ -128,7 +121,124 @@ class RealDataProcess():
         vs_profile = vs_interp(depth_target)
         rho_profile = rho_interp(depth_target)
 
-        # Assign to full grid
-        self.VEL_P = np.tile(vp_profile, (self.NX, 1))
-        self.VEL_S = np.tile(vs_profile, (self.NX, 1))
-        self.RHO = np.tile(rho_profile, (self.NX, 1))
+        # Same profile for every x: read-only NX x NY views, nothing is copied
+        self.VEL_P = np.broadcast_to(vp_profile, (self.NX, len(depth_target)))
+        self.VEL_S = np.broadcast_to(vs_profile, (self.NX, len(depth_target)))
+        self.RHO = np.broadcast_to(rho_profile, (self.NX, len(depth_target)))
+
+
+def interpolation_weights(x, xp):
+    """
+    Left neighbour index and weight to linearly interpolate samples given at sorted xp
+    onto x, extrapolating past both ends like interp1d(fill_value="extrapolate").
+    """
+    idx = np.clip(np.searchsorted(xp, x, side='right') - 1, 0, len(xp) - 2)
+    weight = (x - xp[idx]) / (xp[idx + 1] - xp[idx])
+    return idx, weight
+
+
+def combine_with_iasp91(crust_values, crust_depths):
+    """
+    Stack (n, layer, {vp, vs, rho}) crust values of n columns on top of the shared IASP91
+    profile. The layer depths are the same for every column, only the values differ:
+    returns depths (L,) and vp, vs, rho as (n, L).
+    """
+    iasp_depths, iasp_vp, iasp_vs, iasp_rho = get_iasp91_profile()
+    deep = iasp_depths > crust_depths[-1]
+    shape = (len(crust_values), int(deep.sum()))
+
+    depths = np.concatenate([crust_depths, iasp_depths[deep]])
+    vp = np.hstack([crust_values[:, :, 0], np.broadcast_to(iasp_vp[deep], shape)])
+    vs = np.hstack([crust_values[:, :, 1], np.broadcast_to(iasp_vs[deep], shape)])
+    rho = np.hstack([crust_values[:, :, 2], np.broadcast_to(iasp_rho[deep], shape)])
+    return depths, vp, vs, rho
+
+
+def great_circle_points(latitude, longitude, azimuth, distances):
+    """Latitudes/longitudes (degrees) at signed distances (m) along a great circle on a sphere"""
+    radius = 6371000.0
+    phi1, lambda1, theta = np.radians(latitude), np.radians(longitude), np.radians(azimuth)
+    delta = np.asarray(distances, dtype=float) / radius
+
+    phi2 = np.arcsin(np.sin(phi1) * np.cos(delta) + np.cos(phi1) * np.sin(delta) * np.cos(theta))
+    lambda2 = lambda1 + np.arctan2(np.sin(theta) * np.sin(delta) * np.cos(phi1),
+                                   np.cos(delta) - np.sin(phi1) * np.sin(phi2))
+    return np.degrees(phi2), (np.degrees(lambda2) + 180) % 360 - 180
+
+
+def parallel_distance(latitude, delta_longitude):
+    """
+    Vectorized distance (m) between two points on the same parallel, on a sphere with
+    the WGS84 prime vertical radius of curvature; within a few meters of geodesic()
+    for the grid sizes used here.
+    """
+    a, e2 = 6378137.0, 6.69437999014e-3
+    phi = np.radians(latitude)
+    radius = a / np.sqrt(1 - e2 * np.sin(phi)**2)
+    half = np.radians(delta_longitude) / 2
+    return 2 * radius * np.arcsin(np.minimum(np.abs(np.cos(phi) * np.sin(half)), 1.0))
+
+
+class RealDataBatch():
+    """
+    Velocity models of many events (e.g. a whole catalog dataframe) built in one
+    vectorized pass. Profiles are kept per event as (n_events, NY) arrays; use
+    model(i) to get NX x NY views for a single simulation.
+    """
+    def __init__(self, latitudes, longitudes, real_depths, NX, NY, XMIN, XMAX, YMIN, YMAX):
+        self.crust = get_crust_index()
+
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self.depths = np.asarray(real_depths, dtype=float) * 1000
+        self.NX = NX
+        self.NY = NY
+        self.XMIN = XMIN
+        self.XMAX = XMAX
+        self.YMIN = YMIN
+        self.YMAX = YMAX
+
+        self.lat_idx, self.lon_idx = self.crust.cell(self.latitudes, self.longitudes)
+
+    @classmethod
+    def from_dataframe(cls, dataframe, NX, NY, XMIN, XMAX, YMIN, YMAX):
+        """Batch for the rows of a catalog dataframe (from get_summary_data_frame)"""
+        batch = cls(dataframe['latitude'].to_numpy(), dataframe['longitude'].to_numpy(), dataframe['depth'].to_numpy(),
+                    NX, NY, XMIN, XMAX, YMIN, YMAX)
+        batch.ids = dataframe['id'].to_numpy()
+        return batch
+
+    def process(self):
+        # (n_events, layer, {vp, vs, rho}) in one fancy-indexed read
+        crust_values = self.crust.values(self.lat_idx, self.lon_idx)
+        self.depth_combined, self.vp_combined, self.vs_combined, self.rho_combined = \
+            combine_with_iasp91(crust_values, self.crust.layer_tops)
+
+    def calculate(self):
+        DX = (self.XMAX - self.XMIN) / self.NX
+        DY = (self.YMAX - self.YMIN) / self.NY
+
+        # same origin construction as RealDataProcess.calculate, for every event at once
+        longitudes = np.where(self.longitudes < 0, self.longitudes + 360, self.longitudes)
+        deg_per_meter_lat = 1 / 111000
+        deg_per_meter_lon = 1 / (111000 * np.cos(self.latitudes))
+        origin_lat = self.latitudes - (self.YMAX / 2) * deg_per_meter_lat
+        origin_lon = longitudes - (self.XMAX / 2) * deg_per_meter_lon
+        x_meters = parallel_distance(origin_lat, longitudes - origin_lon)
+
+        # Convert to grid index
+        self.source_x = np.minimum(np.maximum((x_meters / DX).astype(np.int64), 0), self.NX - 20)
+        self.source_y = np.minimum(np.maximum((self.depths / DY).astype(np.int64), 0), self.NY - 20)
+
+        # one set of interpolation weights shared by every event
+        depth_target = np.linspace(0, self.YMAX, self.NY)  # in meters
+        idx, weight = interpolation_weights(depth_target, self.depth_combined)
+        self.vp = self.vp_combined[:, idx] * (1 - weight) + self.vp_combined[:, idx + 1] * weight
+        self.vs = self.vs_combined[:, idx] * (1 - weight) + self.vs_combined[:, idx + 1] * weight
+        self.rho = self.rho_combined[:, idx] * (1 - weight) + self.rho_combined[:, idx + 1] * weight
+
+    def model(self, i):
+        """(VEL_P, VEL_S, RHO, source_x, source_y) of event i, grids as read-only NX x NY views"""
+        shape = (self.NX, self.NY)
+        return (np.broadcast_to(self.vp[i], shape), np.broadcast_to(self.vs[i], shape),
+                np.broadcast_to(self.rho[i], shape), int(self.source_x[i]), int(self.source_y[i]))
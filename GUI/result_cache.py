@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+import numpy as np
+
+# Bump this whenever a solver changes its numerical output, so that old
+# cache entries stop matching new runs
+SOLVER_VERSION = "4"
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "SEISMIC_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "earthquake_simulator")
+)
+DEFAULT_MAX_BYTES = int(float(os.environ.get("SEISMIC_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+
+
+def _update_hash(h, value):
+    # arrays are hashed by dtype, shape and raw bytes, containers recursively
+    if isinstance(value, np.ndarray):
+        arr = np.ascontiguousarray(value)
+        h.update(b"ndarray")
+        h.update(str(arr.dtype).encode())
+        h.update(str(arr.shape).encode())
+        h.update(arr.tobytes())
+    elif isinstance(value, dict):
+        h.update(b"dict")
+        for k in sorted(value):
+            h.update(str(k).encode())
+            _update_hash(h, value[k])
+    elif isinstance(value, (list, tuple)):
+        h.update(b"seq")
+        for v in value:
+            _update_hash(h, v)
+    elif isinstance(value, np.generic):
+        _update_hash(h, value.item())
+    else:
+        h.update(type(value).__name__.encode())
+        h.update(repr(value).encode())
+    h.update(b";")
+
+
+def hash_inputs(kind, inputs):
+    """Content hash of a run: solver kind, solver version and every input"""
+    h = hashlib.sha256()
+    _update_hash(h, (kind, SOLVER_VERSION, inputs))
+    return h.hexdigest()
+
+
+class ResultCache():
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir if cache_dir is not None else DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else DEFAULT_MAX_BYTES
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _read_meta(self, entry_dir):
+        try:
+            with open(os.path.join(entry_dir, "meta.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, entry_dir, meta):
+        tmp_path = os.path.join(entry_dir, "meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(entry_dir, "meta.json"))
+
+    def get(self, key):
+        """Return the stored entry for key (and mark it as recently used), or None"""
+        entry_dir = self._entry_dir(key)
+        meta = self._read_meta(entry_dir)
+        if meta is None:
+            return None
+
+        files = {name: os.path.join(entry_dir, base) for name, base in meta["files"].items()}
+        if not all(os.path.exists(path) for path in files.values()):
+            # incomplete entry (e.g. a file was removed by hand)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+
+        arrays = {}
+        if meta["arrays"]:
+            with np.load(os.path.join(entry_dir, "arrays.npz")) as data:
+                arrays = {name: data[name] for name in data.files}
+
+        meta["last_access"] = time.time()
+        self._write_meta(entry_dir, meta)
+        return {"key": key, "values": meta["values"], "arrays": arrays, "files": files}
+
+    def put(self, key, values=None, arrays=None, files=None):
+        """Store run outputs: JSON values, numpy arrays and output files (copied)"""
+        values = values or {}
+        arrays = arrays or {}
+        files = files or {}
+
+        # build the entry in a temporary directory and move it in place at the end,
+        # so a crash never leaves a half written entry behind
+        tmp_dir = os.path.join(self.cache_dir, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        try:
+            stored_files = {}
+            for name, path in files.items():
+                base = f"{name}{os.path.splitext(path)[1]}"
+                shutil.copy2(path, os.path.join(tmp_dir, base))
+                stored_files[name] = base
+
+            if arrays:
+                np.savez(os.path.join(tmp_dir, "arrays.npz"), **arrays)
+
+            size = sum(os.path.getsize(os.path.join(tmp_dir, f)) for f in os.listdir(tmp_dir))
+            now = time.time()
+            meta = {
+                "key": key,
+                "version": SOLVER_VERSION,
+                "created": now,
+                "last_access": now,
+                "size": size,
+                "values": values,
+                "files": stored_files,
+                "arrays": bool(arrays),
+            }
+            self._write_meta(tmp_dir, meta)
+
+            entry_dir = self._entry_dir(key)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        self.evict(keep=key)
+        return self.get(key)
+
+    def entries(self):
+        """List of (key, size, last_access) for every complete entry"""
+        result = []
+        for name in os.listdir(self.cache_dir):
+            if name.startswith("."):
+                continue
+            meta = self._read_meta(self._entry_dir(name))
+            if meta is not None:
+                result.append((name, meta["size"], meta["last_access"]))
+        return result
+
+    def total_size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        entries = sorted(self.entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        for key, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+
+    def run(self, kind, inputs, compute):
+        """
+        Return the cached outputs of (kind, inputs), calling compute() on a miss.
+        compute must return a dict with optional "values", "arrays" and "files" keys.
+        """
+        key = hash_inputs(kind, inputs)
+        entry = self.get(key)
+        if entry is not None:
+            print(f"Cache hit for {kind} ({key[:12]})")
+            return entry
+
+        outputs = compute()
+        return self.put(key, outputs.get("values"), outputs.get("arrays"), outputs.get("files"))
@@ -1,78 +1,123 @@
-from matplotlib import animation
-from matplotlib.animation import FuncAnimation
 import numpy as np
-import matplotlib.pyplot as plt
+from scipy.signal import fftconvolve
+from medium import as_medium, column, columns
+from telemetry import telemetry_for
 
 class Seismogram():
-    def __init__(self, NX, NY, XMIN, XMAX, t_max, VEL_P, VEL_S, RHO, name, source_x):
+    def __init__(self, NX, NY, XMIN, XMAX, t_max, VEL_P, VEL_S, RHO, name, source_x, incremental=True):
         self.name =name
         self.NX = NX
         self.NY = NY
         self.XMIN = XMIN
         self.XMAX = XMAX
         self.PLOT_EVERY = 5
+        # draw each frame from a trace decimated to the pixel width of the axes, so a
+        # frame costs the same no matter how many samples have been revealed
+        self.incremental = incremental
 
         self.DX = (XMAX - XMIN) / NX
         self.DT = 0.001
         self.time = np.arange(0, t_max, self.DT)
         self.NT = len(self.time)
         self.frames = len(self.time) // self.PLOT_EVERY
-        self.VEL_P = VEL_P
-        self.VEL_S = VEL_S
-        self.RHO = RHO
+        self.VEL_P = as_medium(VEL_P, NX, NY)
+        self.VEL_S = as_medium(VEL_S, NX, NY)
+        self.RHO = as_medium(RHO, NX, NY)
 
         self.source_x = source_x
-        self.vp_profile = self.VEL_P[self.source_x, :]
-        self.vs_profile = self.VEL_S[self.source_x, :]
-        self.rho_profile = self.RHO[self.source_x, :]
+        self.vp_profile = column(self.VEL_P, self.source_x)
+        self.vs_profile = column(self.VEL_S, self.source_x)
+        self.rho_profile = column(self.RHO, self.source_x)
+        self.telemetry = telemetry_for(name + " seismogram")
 
     def compute_reflection_coeffs(self, vel_profile, rho_profile):
-        rc = []
-        for i in range(len(vel_profile) - 1):
-            # Skip if either current or next layer has Vs=0 (air/water)
-            if vel_profile[i] == 0 or vel_profile[i+1] == 0:
-                rc.append(0)  # No reflection
-                continue
-                
-            z1 = rho_profile[i] * vel_profile[i]
-            z2 = rho_profile[i+1] * vel_profile[i+1]
-            r = (z2 - z1) / (z2 + z1)
-            rc.append(r)
-        return np.array(rc)
+        vel_profile = np.asarray(vel_profile, dtype=float)
+        rho_profile = np.asarray(rho_profile, dtype=float)
+
+        # acoustic impedance contrast between consecutive samples (along the last axis)
+        z1 = rho_profile[..., :-1] * vel_profile[..., :-1]
+        z2 = rho_profile[..., 1:] * vel_profile[..., 1:]
+
+        # No reflection if either current or next layer has V=0 (air/water for S-wave)
+        valid = (vel_profile[..., :-1] != 0) & (vel_profile[..., 1:] != 0)
+        rc = np.zeros(z1.shape)
+        np.divide(z2 - z1, z2 + z1, out=rc, where=valid)
+        return rc
     
     def compute_twt(self, vel_profile, dy):
-        twt = [0.0]
-        for i in range(1, len(vel_profile)):
-            if vel_profile[i] == 0:  # Skip S-wave in air/water
-                twt.append(np.inf)   # Infinite travel time (never arrives)
-                continue
-            avg_v = (vel_profile[i-1] + vel_profile[i]) / 2
-            dt_depth = 2 * dy / avg_v
-            twt.append(twt[-1] + dt_depth)
-        return np.array(twt)
+        vel_profile = np.asarray(vel_profile, dtype=float)
+
+        # two-way time through each depth step, using the average velocity of the step
+        avg_v = (vel_profile[..., :-1] + vel_profile[..., 1:]) / 2
+        dt_depth = np.full(avg_v.shape, np.inf)  # V=0 -> infinite travel time (never arrives)
+        np.divide(2 * dy, avg_v, out=dt_depth, where=vel_profile[..., 1:] != 0)
+
+        # cumulative sum, the first infinite step makes every deeper sample infinite too
+        twt = np.zeros(vel_profile.shape)
+        np.cumsum(dt_depth, axis=-1, out=twt[..., 1:])
+        return twt
     
     def create_reflectivity_series(self, rc, twt, time, dt):
-        series = np.zeros_like(time)
-        for i, t in enumerate(twt[:-1]):
-            if np.isinf(t):  # Skip if travel time is infinite
-                continue
-            idx = int(t / dt)
-            if 0 <= idx < len(series):
-                series[idx] = rc[i]
+        # reflector i sits at the time the wave reaches depth sample i
+        return self.scatter_reflectivity(rc, np.asarray(twt, dtype=float)[..., :-1], time, dt)
+
+    def scatter_reflectivity(self, amplitudes, times, time, dt):
+        """Spike series on the time axis with each amplitude at its (same shaped) arrival time"""
+        amplitudes = np.asarray(amplitudes, dtype=float)
+        times = np.broadcast_to(np.asarray(times, dtype=float), amplitudes.shape)
+        series = np.zeros(amplitudes.shape[:-1] + (len(time),))
+
+        # Skip samples whose travel time is infinite or falls outside the time axis
+        valid = np.isfinite(times)
+        idx = (np.where(valid, times, 0.0) / dt).astype(np.int64)
+        valid &= (idx < len(time)) & (amplitudes != 0)
+
+        # scatter every reflector into its time sample (flattened to 2D so a single
+        # trace and a batch of traces share the same code), coincident reflectors add up
+        rows, cols = np.nonzero(valid.reshape(-1, valid.shape[-1]))
+        np.add.at(
+            series.reshape(-1, len(time)),
+            (rows, idx.reshape(-1, idx.shape[-1])[rows, cols]),
+            amplitudes.reshape(-1, amplitudes.shape[-1])[rows, cols]
+        )
         return series
     
     def ricker_wavelet(self, t, f0=20.0):
         return (1.0 - 2.0*(np.pi*f0*t)**2) * np.exp(-(np.pi*f0*t)**2)
+
+    def convolve_wavelet(self, series, wavelet):
+        """Same-length convolution of every trace (last axis) of series with the wavelet"""
+        n_samples = series.shape[-1]
+        flat = series.reshape(-1, n_samples)
+        rows, cols = np.nonzero(flat)
+
+        if len(rows) * len(wavelet) >= flat.size * 4:
+            # dense reflectivity: batched FFT convolution, wavelet broadcast over the traces
+            wavelet = wavelet.reshape((1,) * (series.ndim - 1) + (-1,))
+            return fftconvolve(series, wavelet, mode='same', axes=-1)
+
+        # sparse reflectivity (layered models): add one shifted, scaled wavelet per
+        # reflector, which is much cheaper than transforming every trace
+        taps = np.arange(len(wavelet)) - (len(wavelet) - 1) // 2
+        positions = cols[:, np.newaxis] + taps
+        keep = (positions >= 0) & (positions < n_samples)
+        flat_idx = rows[:, np.newaxis] * n_samples + positions
+        weights = flat[rows, cols][:, np.newaxis] * wavelet
+        result = np.bincount(flat_idx[keep], weights=weights[keep], minlength=flat.size)
+        return result.astype(float, copy=False).reshape(series.shape)
     
-    def compute(self):
-        rc_p = self.compute_reflection_coeffs(self.vp_profile, self.rho_profile)
-        rc_s = self.compute_reflection_coeffs(self.vs_profile, self.rho_profile)
+    def compute_traces(self, vp, vs, rho):
+        """Zero offset P and S traces for depth columns along the last axis (one or many)"""
+        self.telemetry.begin()
+        rc_p = self.compute_reflection_coeffs(vp, rho)
+        rc_s = self.compute_reflection_coeffs(vs, rho)
 
-        twt_p = self.compute_twt(self.vp_profile, self.DX)
-        twt_s = self.compute_twt(self.vs_profile, self.DX)
+        twt_p = self.compute_twt(vp, self.DX)
+        twt_s = self.compute_twt(vs, self.DX)
 
         reflectivity_p = self.create_reflectivity_series(rc_p, twt_p, self.time, self.DT)
         reflectivity_s = self.create_reflectivity_series(rc_s, twt_s, self.time, self.DT)
+        self.telemetry.lap("reflectivity")
 
         f0_p = 20.0
         f0_s = 15.0
@@ -80,14 +125,173 @@ class Seismogram():
         wavelet_p = self.ricker_wavelet(t_wavelet, f0_p)
         wavelet_s = self.ricker_wavelet(t_wavelet, f0_s)
 
-        self.seismogram_p = np.convolve(reflectivity_p, wavelet_p, mode='same')
-        self.seismogram_s = np.convolve(reflectivity_s, wavelet_s, mode='same')
-        self.seismogram_s *= 1.5  # Amplify S-wave
-        self.seismogram_s = np.roll(self.seismogram_s, int(0.2 / self.DT))  # Phase shift
+        seismogram_p = self.convolve_wavelet(reflectivity_p, wavelet_p)
+        seismogram_s = self.convolve_wavelet(reflectivity_s, wavelet_s)
+        seismogram_s *= 1.5  # Amplify S-wave
+        seismogram_s = np.roll(seismogram_s, int(0.2 / self.DT), axis=-1)  # Phase shift
+        self.telemetry.lap("convolution")
+        return seismogram_p, seismogram_s
 
+    def compute(self):
+        self.seismogram_p, self.seismogram_s = self.compute_traces(self.vp_profile, self.vs_profile, self.rho_profile)
         self.combined_seismogram = self.seismogram_p + self.seismogram_s
+
+    def compute_section(self, step=1):
+        """
+        Zero offset traces for every step-th x column, computed in one batch.
+        Results are (len(section_x), NT) arrays: section_p, section_s and section.
+        """
+        self.section_x = np.arange(0, self.NX, step)
+        # profile media contribute a single row, so identical columns are computed only once
+        section_p, section_s = self.compute_traces(
+            columns(self.VEL_P, self.section_x), columns(self.VEL_S, self.section_x), columns(self.RHO, self.section_x)
+        )
+        shape = (len(self.section_x), len(self.time))
+        self.section_p = np.broadcast_to(section_p, shape)
+        self.section_s = np.broadcast_to(section_s, shape)
+        self.section = self.section_p + self.section_s
+        return self.section
+
+    def compute_gather(self, offsets, max_angle=60.0):
+        """
+        P-wave common midpoint gather at source_x for the given source-receiver offsets (m).
+        Travel times follow the hyperbolic moveout with the RMS velocity above every
+        reflector, amplitudes the Aki-Richards AVO approximation, which is muted beyond
+        max_angle (degrees) where it stops being valid. Result: (len(offsets), NT).
+        """
+        offsets = np.asarray(offsets, dtype=float)
+        vp, vs, rho = self.vp_profile, self.vs_profile, self.rho_profile
+
+        # zero offset time and RMS velocity of every reflector (interface i between samples i, i+1)
+        avg_v = (vp[:-1] + vp[1:]) / 2
+        dt_depth = np.full(avg_v.shape, np.inf)
+        np.divide(2 * self.DX, avg_v, out=dt_depth, where=vp[1:] != 0)
+        t0 = self.compute_twt(vp, self.DX)[:-1]
+        finite = np.where(np.isfinite(dt_depth), dt_depth, 0.0)
+        sum_v2t = np.concatenate([[0.0], np.cumsum(avg_v**2 * finite)[:-1]])
+        v_rms = np.full(t0.shape, vp[0])
+        np.divide(sum_v2t, t0, out=v_rms, where=t0 > 0)
+        np.sqrt(v_rms, out=v_rms, where=t0 > 0)
+
+        # hyperbolic moveout for all offsets x reflectors at once
+        x = offsets[:, np.newaxis]
+        times = np.sqrt(t0**2 + (x / v_rms)**2)
+
+        # ray parameter from the moveout slope dt/dx, then incidence angle at each reflector
+        p = np.zeros(times.shape)
+        np.divide(x, v_rms**2 * times, out=p, where=times > 0)
+        alpha, beta = (vp[:-1] + vp[1:]) / 2, (vs[:-1] + vs[1:]) / 2
+        sin2 = (p * alpha)**2
+        cos2 = 1.0 - sin2
+
+        d_alpha, d_beta, d_rho = vp[1:] - vp[:-1], vs[1:] - vs[:-1], rho[1:] - rho[:-1]
+        rho_avg = (rho[:-1] + rho[1:]) / 2
+        beta_term = np.zeros(beta.shape)
+        np.divide(d_beta, beta, out=beta_term, where=beta != 0)
+
+        # Aki-Richards gradient relative to normal incidence, added to the exact normal
+        # incidence coefficient so the zero offset trace matches compute()
+        k = 4 * p**2 * beta**2
+        gradient = (
+            -0.5 * k * d_rho / rho_avg
+            + d_alpha / (2 * alpha) * (1.0 / np.where(cos2 > 0, cos2, 1.0) - 1.0)
+            - k * beta_term
+        )
+        rc = self.compute_reflection_coeffs(vp, rho) + gradient
+
+        # no reflection into zero velocity layers, mute beyond max_angle (and the critical angle)
+        rc[:, (vp[:-1] == 0) | (vp[1:] == 0)] = 0.0
+        rc[sin2 > np.sin(np.radians(max_angle))**2] = 0.0
+
+        reflectivity = self.scatter_reflectivity(rc, times, self.time, self.DT)
+        t_wavelet = np.linspace(-0.1, 0.1, int(0.2 / self.DT))
+        self.gather_offsets = offsets
+        self.gather = self.convolve_wavelet(reflectivity, self.ricker_wavelet(t_wavelet, 20.0))
+        return self.gather
+
+    def save_panel(self, data, positions, title, xlabel, filename, style='image', max_wiggles=60):
+        """Save traces (rows of data, at the given x positions) as an image panel or wiggle plot"""
+        import matplotlib.pyplot as plt  # only needed for rendering
+
+        fig, ax = plt.subplots(figsize=(10, 8))
+
+        if style == 'image':
+            clip = np.max(np.abs(data))
+            clip = clip if clip > 0 else 1.0
+            img = ax.imshow(data.T, extent=[positions[0], positions[-1], self.time[-1], 0],
+                            aspect='auto', cmap='seismic', vmin=-clip, vmax=clip)
+            plt.colorbar(img, label='Amplitude')
+        else:
+            # plot at most max_wiggles traces, scaled to the spacing between them
+            every = max(1, int(np.ceil(len(positions) / max_wiggles)))
+            traces = data[::every]
+            positions = positions[::every]
+            spacing = positions[1] - positions[0] if len(positions) > 1 else 1.0
+            peak = np.max(np.abs(traces))
+            scale = spacing / peak if peak > 0 else 0.0
+            for x, trace in zip(positions, traces):
+                wiggle = x + trace * scale
+                ax.plot(wiggle, self.time, color='black', linewidth=0.5)
+                ax.fill_betweenx(self.time, x, wiggle, where=wiggle > x, color='black', linewidth=0)
+            ax.set_xlim(positions[0] - spacing, positions[-1] + spacing)
+            ax.set_ylim(self.time[-1], 0)
+
+        ax.set_title(title)
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel('Time (s)')
+        fig.savefig(filename)
+        plt.close(fig)
+
+    def create_section_figure(self, style='image'):
+        """Save the section (see compute_section)"""
+        x_positions = self.XMIN + self.section_x * self.DX
+        self.save_panel(self.section, x_positions, 'Synthetic Seismic Section (P + S)', 'Distance (m)',
+                        self.name + '_section_seismogram.png', style)
+
+    def create_gather_figure(self, style='wiggle'):
+        """Save the CMP gather (see compute_gather)"""
+        self.save_panel(self.gather, self.gather_offsets, 'CMP Gather (P-wave)', 'Offset (m)',
+                        self.name + '_cmp_gather.png', style)
     
+    def decimate_trace(self, trace, width_px):
+        """
+        Reduce trace to (at most) a min and a max point per pixel column of the axes.
+        Returns (t, y, bin_size): bin_size samples of trace map to each pixel column.
+        """
+        bin_size = max(1, int(np.ceil(len(trace) / max(1, width_px))))
+        if bin_size == 1:
+            return self.time, trace, 1
+
+        n_bins = len(trace) // bin_size
+        bins = trace[:n_bins * bin_size].reshape(n_bins, bin_size)
+        i_min = np.argmin(bins, axis=1)
+        i_max = np.argmax(bins, axis=1)
+
+        # keep the min and the max of each bin in time order so the line stays continuous
+        first = np.minimum(i_min, i_max)
+        second = np.maximum(i_min, i_max)
+        offsets = np.arange(n_bins) * bin_size
+        idx = np.stack([offsets + first, offsets + second], axis=1).ravel()
+        return self.time[idx], trace[idx], bin_size
+
+    def display_prefix(self, decimated, trace, idx):
+        """Points to draw for trace[:idx]: whole decimated bins plus the raw samples after them"""
+        t_dec, y_dec, bin_size = decimated
+        if bin_size == 1:
+            return self.time[:idx], trace[:idx]
+        full = idx // bin_size
+        start = full * bin_size
+        return (np.concatenate([t_dec[:2 * full], self.time[start:idx]]),
+                np.concatenate([y_dec[:2 * full], trace[start:idx]]))
+
+    def axes_width_px(self, ax):
+        return int(ax.get_window_extent().width)
+
     def create_combined_figure(self):
+        import matplotlib.pyplot as plt  # only needed for rendering
+        from matplotlib.animation import FuncAnimation
+        import matplotlib.animation as animation
+
         fig, ax = plt.subplots(figsize=(10, 4))
         self.line, = ax.plot([], [], color='purple', label='Combined Seismogram')
         ax.set_xlim(0, self.time[-1])
@@ -98,20 +302,33 @@ class Seismogram():
         ax.grid(True)
         ax.legend()
 
+        if self.incremental:
+            self.combined_display = self.decimate_trace(self.combined_seismogram, self.axes_width_px(ax))
+
         ani = FuncAnimation(fig, self.update_combined, frames=self.frames, init_func=self.init_combined, interval=20, blit=True)
-        ffmpeg_writer = animation.FFMpegWriter(fps=20)
+        ffmpeg_writer = self.telemetry.writer(animation.FFMpegWriter(fps=20))
         ani.save(self.name+'_combined_seismogram.mp4', writer=ffmpeg_writer)
+        self.telemetry.finish()
 
     def init_combined(self):
         self.line.set_data([], [])
         return self.line,
 
     def update_combined(self,frame):
+        self.telemetry.begin()
         idx = min(frame * self.PLOT_EVERY, len(self.time) - 1)  # Ensure we don't exceed array bounds
-        self.line.set_data(self.time[:idx], self.combined_seismogram[:idx])
+        if self.incremental:
+            self.line.set_data(*self.display_prefix(self.combined_display, self.combined_seismogram, idx))
+        else:
+            self.line.set_data(self.time[:idx], self.combined_seismogram[:idx])
+        self.telemetry.lap("artists")
         return self.line,
 
     def create_separated_figure(self):
+        import matplotlib.pyplot as plt  # only needed for rendering
+        from matplotlib.animation import FuncAnimation
+        import matplotlib.animation as animation
+
         fig, ax = plt.subplots(figsize=(10, 4))
         self.line_p, = ax.plot([], [], color='blue', label='P-wave')
         self.line_s, = ax.plot([], [], color='red', label='S-wave', linestyle='--')
@@ -127,9 +344,15 @@ class Seismogram():
         ax.grid(True)
         ax.legend(loc='lower left')
 
+        if self.incremental:
+            width_px = self.axes_width_px(ax)
+            self.p_display = self.decimate_trace(self.seismogram_p, width_px)
+            self.s_display = self.decimate_trace(self.seismogram_s, width_px)
+
         ani = FuncAnimation(fig, self.update_separated, frames=self.frames, init_func=self.init_separated, interval=20, blit=True)
-        ffmpeg_writer = animation.FFMpegWriter(fps=20)
+        ffmpeg_writer = self.telemetry.writer(animation.FFMpegWriter(fps=20))
         ani.save(self.name+'_separated_seismogram.mp4', writer=ffmpeg_writer)
+        self.telemetry.finish()
 
     def init_separated(self):
         self.line_p.set_data([], [])
@@ -137,12 +360,13 @@ class Seismogram():
         return self.line_p, self.line_s
 
     def update_separated(self,frame):
+        self.telemetry.begin()
         idx = min(frame * self.PLOT_EVERY, len(self.time) - 1)
-        self.line_p.set_data(self.time[:idx], self.seismogram_p[:idx])
-        self.line_s.set_data(self.time[:idx], self.seismogram_s[:idx])
+        if self.incremental:
+            self.line_p.set_data(*self.display_prefix(self.p_display, self.seismogram_p, idx))
+            self.line_s.set_data(*self.display_prefix(self.s_display, self.seismogram_s, idx))
+        else:
+            self.line_p.set_data(self.time[:idx], self.seismogram_p[:idx])
+            self.line_s.set_data(self.time[:idx], self.seismogram_s[:idx])
+        self.telemetry.lap("artists")
         return self.line_p, self.line_s
-
-
-
-
-
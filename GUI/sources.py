@@ -0,0 +1,66 @@
+"""
+Sources made of many sub-sources, e.g. a finite fault rupturing over time. The amplitudes
+of every sub-source and time step are computed once, so injecting them is one scatter per
+step whatever their number. Pass one to a solver as source=...; source_x, source_y then
+only mark the hypocenter (rupture zone, diagnostics).
+
+    NT = len(np.arange(0, t_max, 0.001))
+    fault = line_fault((40, 60), (80, 90), NT, 0.001, DX, DY)
+    wave = SWave(NX, NY, XMIN, XMAX, YMIN, YMAX, t_max, VEL_S, RHO, name, 40, 60, source=fault)
+"""
+import numpy as np
+from precompute import ricker, ricker_source
+
+DELAY = 0.1  # s, peak of the wavelet of the first sub-source, as for the point sources
+
+
+class SourceArray():
+    """
+    n sub-sources at the grid indices (xs, ys), with amplitudes[n_step, i] the amplitude of
+    sub-source i at that time step (the units of the solvers' Ricker sources). Indices may
+    repeat, their amplitudes add up.
+    """
+    def __init__(self, xs, ys, amplitudes):
+        self.xs = np.asarray(xs, dtype=np.intp)
+        self.ys = np.asarray(ys, dtype=np.intp)
+        self.amplitudes = np.asarray(amplitudes)
+        if self.xs.shape != self.ys.shape or self.amplitudes.ndim != 2 or self.amplitudes.shape[1] != self.xs.size:
+            raise ValueError(f"{self.xs.size} sub-sources need an (NT, {self.xs.size}) amplitude matrix, got {self.amplitudes.shape}")
+
+    def __len__(self):
+        return self.xs.size
+
+    def scaled(self, scale, dtype=np.float64):
+        """The source with its amplitudes times scale (a number or one per sub-source), in dtype"""
+        return SourceArray(self.xs, self.ys, (self.amplitudes * scale).astype(dtype))
+
+    def check_grid(self, NX, NY):
+        if len(self) and (self.xs.min() < 0 or self.xs.max() >= NX or self.ys.min() < 0 or self.ys.max() >= NY):
+            raise ValueError(f"Sub-sources outside the ({NX}, {NY}) grid")
+
+    def inject(self, field, n):
+        """Add the amplitudes of step n to field"""
+        if n < len(self.amplitudes):
+            np.add.at(field, (self.xs, self.ys), self.amplitudes[n])
+
+
+def point_source(x, y, NT, DT, f0=15.0):
+    """The Ricker point source of the solvers as a SourceArray"""
+    return SourceArray([x], [y], ricker_source(NT, DT, f0)[:, np.newaxis])
+
+
+def line_fault(start, end, NT, DT, DX, DY, f0=15.0, rupture_velocity=2500.0, hypocenter=None):
+    """
+    Sub-sources at every grid point of the straight fault from start to end (grid indices),
+    rupturing outwards from the hypocenter (default start) at rupture_velocity (m/s): each
+    fires the Ricker wavelet delayed by its distance / rupture_velocity. The amplitude of
+    one point source is split evenly over the fault.
+    """
+    (x0, y0), (x1, y1) = start, end
+    n = max(abs(x1 - x0), abs(y1 - y0)) + 1
+    xs = np.rint(np.linspace(x0, x1, n)).astype(np.intp)
+    ys = np.rint(np.linspace(y0, y1, n)).astype(np.intp)
+    hx, hy = start if hypocenter is None else hypocenter
+    delays = DELAY + np.hypot((xs - hx) * DX, (ys - hy) * DY) / rupture_velocity
+    t = np.arange(NT)[:, np.newaxis] * DT - delays
+    return SourceArray(xs, ys, ricker(t, f0) / n)
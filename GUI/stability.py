@@ -0,0 +1,68 @@
+import numpy as np
+
+# Cheap check for numerical blow up: every CHECK_EVERY steps the largest absolute field
+# value is compared with the previous check. Once the source has faded, physical waves
+# only spread and get absorbed, so a field that grows by more than GROWTH_LIMIT between
+# two checks (or is no longer finite) is unstable and the run is aborted.
+CHECK_EVERY = 50
+GROWTH_LIMIT = 10.0
+SOURCE_DURATION = 0.2  # s, the Ricker source peaks at 0.1 s and has faded by then
+
+
+class SimulationUnstable(RuntimeError):
+    """Raised by a solver whose fields blow up, with the step and CFL number"""
+    def __init__(self, message, step, cfl):
+        super().__init__(message)
+        self.step = step
+        self.cfl = cfl
+
+
+def wave_speed(solver):
+    """Largest wave speed (m/s) of a solver's model"""
+    if hasattr(solver, "VS"):
+        velocity = solver.VS
+    elif hasattr(solver, "K"):
+        velocity = np.sqrt(solver.K / solver.RHO)  # the P-wave displacement solver is driven by K
+    else:
+        velocity = solver.VEL
+    return float(np.nanmax(velocity))
+
+
+def cfl_number(velocity, DT, DX, DY):
+    """Courant number of the 2D explicit scheme, stable below 1"""
+    return velocity * DT * np.sqrt(1 / DX**2 + 1 / DY**2)
+
+
+class StabilityMonitor():
+    def __init__(self, solver, fields, every=CHECK_EVERY, growth_limit=GROWTH_LIMIT):
+        self.fields = fields  # names of the solver's field attributes to watch
+        self.every = every
+        self.growth_limit = growth_limit
+        self.quiet_step = int(SOURCE_DURATION / solver.DT)
+        self.velocity = wave_speed(solver)
+        self.cfl = cfl_number(self.velocity, solver.DT, solver.DX, solver.DY)
+        self.last_norm = None
+
+    def check(self, solver, n):
+        if n % self.every:
+            return
+        norm = 0.0
+        for name in self.fields:
+            field = getattr(solver, name)
+            # max |field| without allocating a temporary; checked per field, max() drops NaNs
+            field_norm = max(float(field.max()), -float(field.min()))
+            if not np.isfinite(field_norm):
+                self.abort(solver, n, f"{name} is no longer finite")
+            norm = max(norm, field_norm)
+        if n >= self.quiet_step and self.last_norm and norm > self.growth_limit * self.last_norm:
+            self.abort(solver, n, f"max |field| grew {norm / self.last_norm:.3g}x in {self.every} steps")
+        self.last_norm = norm
+
+    def abort(self, solver, n, what):
+        if self.cfl >= 1:
+            cause = (f"CFL number {self.cfl:.2f} >= 1: DT = {solver.DT} s is too large for "
+                     f"{self.velocity:.0f} m/s on a {solver.DX:.1f} m x {solver.DY:.1f} m grid, "
+                     f"use a coarser grid or slower materials")
+        else:
+            cause = f"CFL number {self.cfl:.2f} is below 1, check the material values (e.g. zero density)"
+        raise SimulationUnstable(f"Simulation unstable at step {n} (t = {n * solver.DT:.3f} s): {what}. {cause}", n, self.cfl)
@@ -0,0 +1,187 @@
+"""
+Parameter sweeps of the S-wave simulation (seismic moment, magnitude, energy).
+Run from the GUI folder:
+    python sweep.py sweep.json --workers 4 --out sweep.csv
+
+sweep.json has a "base" config (same keys as cli.py) and a "parameters" grid, e.g.
+    {"base": {"grid": {...}, "layers": [[0, 400, "Granite"]]},
+     "parameters": {"material": ["Granite", "Basalt", "Water"], "f0": [10, 15, 20],
+                    "source_depth": [1000, 2000]}}
+Every combination of the parameter values is a case. Parameters: the grid keys (NX, NY,
+XMIN, XMAX, YMIN, YMAX, t_max), material (one material for the whole depth), layers,
+density, f0 (Ricker frequency), source_x (grid index) and source_depth (m).
+"""
+import argparse
+import copy
+import itertools
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+
+from cli import ConfigError, GRID_KEYS, build_model, load_config, parse_grid
+from result_cache import ResultCache, hash_inputs
+from S_wave import SWave
+
+RESULT_COLUMNS = ["run", "M0", "Mw", "energy", "runtime_s", "status"]
+
+
+def expand_grid(parameters):
+    """Every combination of the parameter value lists, as a list of {name: value}"""
+    names = list(parameters)
+    return [dict(zip(names, values)) for values in itertools.product(*(parameters[name] for name in names))]
+
+
+def case_config(base, case):
+    """The base config with the values of one case applied"""
+    config = copy.deepcopy(base)
+    config.setdefault("grid", {})
+    # grid first, the other parameters depend on NX/NY
+    for name, value in case.items():
+        if name in GRID_KEYS:
+            config["grid"][name] = value
+    grid = parse_grid(config)
+    NX, NY, XMIN, XMAX, YMIN, YMAX, t_max = grid
+
+    for name, value in case.items():
+        if name in GRID_KEYS:
+            continue
+        elif name == "material":
+            config["layers"] = [[0, NY, value]]
+            config.pop("event", None)
+        elif name == "layers":
+            config["layers"] = value
+            config.pop("event", None)
+        elif name in ("density", "f0"):
+            config[name] = value
+        elif name == "source_x":
+            config["source"] = [value, config.get("source", [NX//4, NY//2])[1]]
+        elif name == "source_depth":
+            DY = (YMAX - YMIN) / NY
+            config["source"] = [config.get("source", [NX//4, NY//2])[0], int(value / DY)]
+        else:
+            raise ConfigError(f"Unknown sweep parameter '{name}'")
+    return config
+
+
+def prepare_run(config):
+    """Grid, model and source wavelet of one case, and the key identifying its result"""
+    grid = parse_grid(config)
+    NX, NY = grid[:2]
+    VEL_P, VEL_S, RHO, source_x, source_y = build_model(config, grid)
+    if "density" in config:
+        RHO = np.full((1, NY), float(config["density"]))
+    f0 = float(config.get("f0", 15.0))
+    # only what SWave uses, so e.g. all fluids (VS = 0) with the same density share a run
+    inputs = {"grid": grid, "VEL_S": VEL_S, "RHO": RHO, "source": (source_x, source_y), "f0": f0}
+    return {"key": hash_inputs("s_wave_sweep", inputs), **inputs}
+
+
+def run_group(runs):
+    """
+    Run cases that share one grid in this worker one after the other, so the damping
+    mask and source wavelets (precompute.py) are built once for all of them.
+    """
+    results = []
+    for run in runs:
+        start = time.perf_counter()
+        try:
+            NX, NY, XMIN, XMAX, YMIN, YMAX, t_max = run["grid"]
+            source_x, source_y = run["source"]
+            wave = SWave(NX, NY, XMIN, XMAX, YMIN, YMAX, t_max, run["VEL_S"], run["RHO"], "sweep", source_x, source_y)
+            wave.run_wavelet_eq(f0=run["f0"])
+            wave.run()
+            M0 = wave.get_seismic_moment()
+            Mw = wave.get_moment_magnitude_scale() if M0 > 0 else math.nan
+            energy = wave.get_energy_released() if M0 > 0 else math.nan
+            result = {"M0": M0, "Mw": Mw, "energy": energy, "runtime_s": time.perf_counter() - start, "status": "ok"}
+        except Exception as e:
+            # one failing case (e.g. SimulationUnstable) is reported in its row, the others still run
+            result = {"M0": math.nan, "Mw": math.nan, "energy": math.nan,
+                      "runtime_s": time.perf_counter() - start, "status": f"error: {e}"}
+        results.append((run["key"], result))
+    return results
+
+
+def run_sweep(base, parameters, workers=None, cache=None, on_row=None):
+    """
+    Run every case of the parameter grid and return a table with one row per case
+    (its parameter values, the run id and the results, or the error of an invalid case).
+    Identical models run once; runs are grouped by grid and spread over a process pool.
+    on_row(row) is called for every case as soon as its result is known.
+    """
+    cases = expand_grid(parameters)
+    runs = {}
+    rows = []
+    rows_by_key = {}
+    for case in cases:
+        try:
+            run = prepare_run(case_config(base, case))
+        except ConfigError as e:
+            # e.g. a source depth below the grid: reported in its row, the valid cases still run
+            row = {**case, "run": None, "M0": math.nan, "Mw": math.nan, "energy": math.nan,
+                   "runtime_s": math.nan, "status": f"error: {e}"}
+            rows.append(row)
+            if on_row is not None:
+                on_row(row)
+            continue
+        runs.setdefault(run["key"], run)
+        row = {**case, "run": run["key"][:12]}
+        rows.append(row)
+        rows_by_key.setdefault(run["key"], []).append(row)
+
+    def finish(key, result):
+        for row in rows_by_key[key]:
+            row.update(result)
+            if on_row is not None:
+                on_row(row)
+
+    pending = []
+    for key, run in runs.items():
+        entry = cache.get(key) if cache is not None else None
+        if entry is not None:
+            finish(key, {"status": "ok", **entry["values"]})  # entries from before the status column
+        else:
+            pending.append(run)
+
+    # same grid runs together, in chunks so that every worker gets some
+    workers = workers or os.cpu_count()
+    groups = {}
+    for run in pending:
+        groups.setdefault(run["grid"], []).append(run)
+    chunk = max(1, math.ceil(len(pending) / workers))
+    tasks = [group[i:i + chunk] for group in groups.values() for i in range(0, len(group), chunk)]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_group, task): task for task in tasks}
+        for future in as_completed(futures):
+            try:
+                results = future.result()
+            except Exception as e:
+                # the worker itself died (e.g. killed for memory), every run of its task failed
+                results = [(run["key"], {"runtime_s": math.nan, "status": f"error: {e}"}) for run in futures[future]]
+            for key, result in results:
+                if cache is not None and result["status"] == "ok":
+                    cache.put(key, values=result)
+                finish(key, result)
+
+    return pd.DataFrame(rows, columns=list(parameters) + RESULT_COLUMNS)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parameter sweep of the S-wave simulation")
+    parser.add_argument("sweep", help="JSON or TOML file with 'base' and 'parameters'")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--out", default="sweep_results.csv")
+    parser.add_argument("--no-cache", action="store_true", help="rerun cases that were simulated before")
+    args = parser.parse_args()
+
+    sweep = load_config(args.sweep)
+    cache = None if args.no_cache else ResultCache()
+    table = run_sweep(sweep.get("base", {}), sweep["parameters"], args.workers, cache,
+                      on_row=lambda row: print(json.dumps({k: v for k, v in row.items() if k != "layers"}, default=str)))
+    table.to_csv(args.out, index=False)
+    print(f"{len(table)} cases ({table['run'].nunique()} distinct runs) written to {args.out}")
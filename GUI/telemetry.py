@@ -0,0 +1,174 @@
+import contextlib
+import json
+import os
+import sys
+import time
+
+# Profiling of a run, switched on with the SEISMIC_PROFILE environment variable:
+#   SEISMIC_PROFILE=1            per-run summary (time per phase, counters, steps/s) on stderr
+#   SEISMIC_PROFILE=runs.jsonl   the summary plus JSON lines with the step throughput over time
+# When it is not set every hook is a no-op.
+PROFILE_ENV = "SEISMIC_PROFILE"
+PROFILE_EVERY = 100  # time steps between two throughput records
+
+
+class Telemetry():
+    """Phase timers, counters and step throughput of one run"""
+    enabled = True
+
+    def __init__(self, name, cells=None, path=None, every=PROFILE_EVERY):
+        self.name = name
+        self.cells = cells  # grid points updated per step, for Mcell-updates/s
+        self.path = path
+        self.every = every
+        self.phases = {}  # phase -> [calls, seconds]
+        self.counters = {}
+        self.steps = 0
+        self.start = self.mark = self.lap_mark = time.perf_counter()
+        self.mark_steps = 0
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = self.phases.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += time.perf_counter() - start
+
+    def begin(self):
+        """Start the split timer of lap()"""
+        self.lap_mark = time.perf_counter()
+
+    def lap(self, name):
+        """Add the time since begin() or the previous lap to phase name"""
+        now = time.perf_counter()
+        entry = self.phases.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += now - self.lap_mark
+        self.lap_mark = now
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def step(self):
+        """Mark the end of a time step, with a throughput record every `every` steps"""
+        self.steps += 1
+        if self.steps - self.mark_steps >= self.every:
+            now = time.perf_counter()
+            rate = (self.steps - self.mark_steps) / (now - self.mark)
+            self.emit({"event": "progress", "step": self.steps, "elapsed_s": now - self.start,
+                       **self.throughput(rate)})
+            self.mark, self.mark_steps = now, self.steps
+
+    def throughput(self, steps_per_s):
+        values = {"steps_per_s": steps_per_s}
+        if self.cells:
+            values["mcell_updates_per_s"] = steps_per_s * self.cells / 1e6
+        return values
+
+    def writer(self, writer):
+        """
+        Time a matplotlib movie writer: "frame" is drawing a frame and piping it to
+        ffmpeg (which stalls when encoding falls behind), "encode" is waiting for ffmpeg
+        to finish. The CPU time ffmpeg used overall is counted as encode_cpu_s.
+        """
+        grab_frame, finish = writer.grab_frame, writer.finish
+
+        def timed_grab_frame(**savefig_kwargs):
+            with self.phase("frame"):
+                grab_frame(**savefig_kwargs)
+            self.count("frames")
+
+        def timed_finish():
+            before = children_cpu_time()
+            with self.phase("encode"):
+                finish()
+            self.count("encode_cpu_s", children_cpu_time() - before)
+
+        writer.grab_frame, writer.finish = timed_grab_frame, timed_finish
+        return writer
+
+    def summary(self):
+        wall = time.perf_counter() - self.start
+        return {
+            "event": "summary",
+            "wall_s": wall,
+            "steps": self.steps,
+            **(self.throughput(self.steps / wall) if self.steps else {}),
+            "phases": {
+                name: {"calls": calls, "seconds": seconds, "share": seconds / wall}
+                for name, (calls, seconds) in sorted(self.phases.items(), key=lambda item: -item[1][1])
+            },
+            "counters": self.counters,
+        }
+
+    def finish(self):
+        """Report the summary of the run (stderr, and the JSON lines file if set)"""
+        summary = self.summary()
+        self.emit(summary)
+        lines = [f"[profile] {self.name}: {summary['wall_s']:.2f} s, {self.steps} steps"]
+        if self.steps:
+            lines[0] += f", {summary['steps_per_s']:.1f} steps/s"
+            if "mcell_updates_per_s" in summary:
+                lines[0] += f", {summary['mcell_updates_per_s']:.1f} Mcell-updates/s"
+        for name, phase in summary["phases"].items():
+            lines.append(f"  {name:<12} {phase['seconds']:>9.3f} s {phase['share']:>6.1%} {phase['calls']:>8} calls")
+        for name, value in self.counters.items():
+            lines.append(f"  {name:<12} {value:>9.6g}")
+        print("\n".join(lines), file=sys.stderr)
+        return summary
+
+    def emit(self, record):
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"name": self.name, "time": time.time(), **record}) + "\n")
+
+
+class NullTelemetry():
+    """Telemetry that records nothing, the default when profiling is off"""
+    enabled = False
+    _phase = contextlib.nullcontext()
+
+    def phase(self, name):
+        return self._phase
+
+    def begin(self):
+        pass
+
+    def lap(self, name):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    def step(self):
+        pass
+
+    def writer(self, writer):
+        return writer
+
+    def finish(self):
+        return None
+
+
+NULL_TELEMETRY = NullTelemetry()
+
+
+def children_cpu_time():
+    """User + system CPU time of finished child processes (ffmpeg), 0 where unsupported"""
+    try:
+        import resource  # Unix only
+    except ImportError:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def telemetry_for(name, cells=None):
+    """Telemetry of one run as configured by SEISMIC_PROFILE, a no-op when it is not set"""
+    setting = os.environ.get(PROFILE_ENV, "")
+    if setting in ("", "0"):
+        return NULL_TELEMETRY
+    return Telemetry(name, cells, path=None if setting == "1" else setting)